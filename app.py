@@ -1,7 +1,21 @@
 import json
 import math
+import os
+import re
+from bisect import bisect_left, bisect_right
 from collections import defaultdict
 
+import counters
+import memory_profile
+from binary_output import write_binary_output
+from drilling import optimize_drilling
+from input_stream import map_file, parse_layers
+from parallel import allocate_ids, map_chunks
+from profiling import design_hash, profiled
+from render_payload import write_render_payload
+from rules import DEFAULT_RULES, resolve_rules
+from vocab import EDGE_FACES, LEFT_RIGHT_FACES, MAIN_FACES, SYSTEMATIC_HOLE_TYPES, TOP_BOTTOM_FACES, TOP_HOLE_TYPES
+
 # ============================================================================
 # CONFIGURATION SYSTEM - MAKES CODE WORK FOR ANY INPUT
 # ============================================================================
@@ -33,13 +47,13 @@ PANEL_PATTERNS = [
     "table"      # English
 ]
 
-# Template thickness options (configurable)
-TEMPLATE_THICKNESSES = [17, 20, 25, 30]
+# Both pattern lists in one matcher, compiled once; the optional lookaheads test every position,
+# so a name matches a kind exactly when it contains one of its patterns (as a substring test would)
+PIECE_NAME_MATCHER = re.compile("(?=(?P<leg>{}))?(?=(?P<panel>{}))?".format(
+    "|".join(map(re.escape, LEG_PATTERNS)), "|".join(map(re.escape, PANEL_PATTERNS))))
 
-# Default values (configurable)
-DEFAULT_TEMPLATE_THICKNESS = 20
-DEFAULT_CONNECTION_AREA_WIDTH = 20
-DEFAULT_CONNECTION_AREA_HEIGHT = 200
+# Template thicknesses, default connection area size and hole spacing distances come from the
+# rule profile (rules.RuleProfile), kept on every piece as piece["rules"]
 
 # ============================================================================
 # STEP 1-2: INPUT DATA PREPROCESSING & DIMENSIONS
@@ -107,7 +121,7 @@ def extrair_views_por_peca(data):
 # STEP 3: MAP PIECES IN 3D SPACE
 # ============================================================================
 
-def construir_peca_3d(nome, views):
+def construir_peca_3d(nome, views, rules=DEFAULT_RULES):
     """Step 3: Create 3D piece with bounding boxes and coordinate system - WORKS WITH ANY VIEW NAMES"""
     # Use flexible view mapping
     sup = views.get("top") 
@@ -132,6 +146,7 @@ def construir_peca_3d(nome, views):
     dims = determine_dimensions([length, height, thickness])
 
     print(f"Built piece {nome}: L={dims['length']}, H={dims['height']}, T={dims['thickness']}")
+    is_leg, is_panel = classify_piece(nome, dims["length"], dims["height"])
 
     # Step 3: Establish coordinate system for each face (Person Metaphor)
     return {
@@ -141,6 +156,9 @@ def construir_peca_3d(nome, views):
         "height": dims["height"],
         "thickness": dims["thickness"],
         "half_thickness": dims["half_thickness"],
+        "is_leg": is_leg,      # Piece type, classified once (see classify_piece)
+        "is_panel": is_panel,
+        "rules": rules,        # Rule profile of the run (not part of the output)
         "faces": {
             "main": {"holes": [], "connectionAreas": [], "dimensions": {"width": dims["length"], "height": dims["height"]}},           # Front face
             "other_main": {"holes": [], "connectionAreas": [], "dimensions": {"width": dims["length"], "height": dims["height"]}},     # Back face
@@ -167,71 +185,97 @@ def criar_hole(x, y, tipo, target_type, ferragem, connection_id=None, depth=None
     if connection_id is not None:
         hole["connectionId"] = connection_id
     if depth is not None:
-        hole["depth"] = depth
+        hole["depth"] = format_number(depth)
     if diameter is not None:
-        hole["diameter"] = diameter
+        hole["diameter"] = format_number(diameter)
     return hole
 
-def is_leg_piece(piece):
-    """Universal leg detection - WORKS WITH ANY NAMING CONVENTION"""
-    name_lower = piece["name"].lower()
+def classify_piece(name, length, height):
+    """Step 3: Classify a piece as leg and/or panel - WORKS WITH ANY NAMING CONVENTION
     
-    # Check if name contains any leg pattern
-    for pattern in LEG_PATTERNS:
-        if pattern in name_lower:
-            return True
+    Name patterns decide first; otherwise square-ish small pieces are legs and everything
+    else is a panel. Returns (is_leg, is_panel).
+    """
+    kinds = set()
+    for match in PIECE_NAME_MATCHER.finditer(name.lower()):
+        if match.lastindex:
+            kinds.update(kind for kind, text in match.groupdict().items() if text)
     
     # Fallback: dimensional analysis (square-ish and small pieces are likely legs)
-    length_height_diff = abs(piece["length"] - piece["height"])
-    max_dimension = max(piece["length"], piece["height"])
-    
-    return length_height_diff < 50 and max_dimension < 250
+    is_leg = "leg" in kinds or (abs(length - height) < 50 and max(length, height) < 250)
+    # Fallback: dimensional analysis (large, flat pieces are likely panels)
+    is_panel = "panel" in kinds or not is_leg
+    return is_leg, is_panel
+
+def is_leg_piece(piece):
+    """Universal leg detection (classified once when the piece is built)"""
+    return piece["is_leg"]
 
 def is_panel_piece(piece):
-    """Universal panel detection - WORKS WITH ANY NAMING CONVENTION"""
-    name_lower = piece["name"].lower()
-    
-    # Check if name contains any panel pattern
-    for pattern in PANEL_PATTERNS:
-        if pattern in name_lower:
-            return True
-    
-    # Fallback: dimensional analysis (large, flat pieces are likely panels)
-    return not is_leg_piece(piece)
+    """Universal panel detection (classified once when the piece is built)"""
+    return piece["is_panel"]
 
-def get_template_thickness(thickness):
+def get_template_thickness(thickness, rules=DEFAULT_RULES):
     """Step 8: Select closest standard template thickness - CONFIGURABLE"""
-    return min(TEMPLATE_THICKNESSES, key=lambda x: abs(x - thickness))
+    return min(rules.template_thicknesses, key=lambda x: abs(x - thickness))
 
-def adicionar_holes_sistematicos(peca, template_thickness):
-    """Step 4: Add systematic holes on all faces according to guide rules"""
+def adicionar_holes_sistematicos(peca, template_thickness, clip_to_areas=False):
+    """Step 4: Add systematic holes on all faces according to guide rules
+    
+    With clip_to_areas (lazy mode, connection areas already created), faces without connection
+    areas are skipped and panel holes that cannot survive cleaning or affect hole mapping are
+    not allocated. Dedup still sees every grid position, so the final output is unchanged.
+    """
     h = peca["height"]
     l = peca["length"]
     t = peca["thickness"]
     ft = peca["half_thickness"]
+    
+    rules = peca["rules"]
+    is_leg = is_leg_piece(peca)
+    # Leg top holes are all used as hole-mapping sources, so they are never clipped
+    clip_holes = clip_to_areas and not is_leg
+    
+    # Rounded positions of every grid hole per face (kept or clipped), used for dedup
+    placed_positions = defaultdict(list)
 
-    def add_hole_if_not_exists(face_holes, x, y, hole_type, hardware, depth=None, diameter=None, connection_id=None):
+    def add_hole_if_not_exists(face_name, x, y, hole_type, hardware, depth=None, diameter=None, connection_id=None):
         """Add hole only if no hole exists at this position"""
-        for existing_hole in face_holes:
-            if abs(existing_hole["x"] - x) < 8.0 and abs(existing_hole["y"] - y) < 8.0:
+        for existing_x, existing_y in placed_positions[face_name]:
+            if abs(existing_x - x) < rules.hole_dedup_distance and abs(existing_y - y) < rules.hole_dedup_distance:
+                counters.count("hole_rejected", face_name)
                 return  # Hole already exists at this position
         
+        position = (arredondar(x), arredondar(y))
+        placed_positions[face_name].append(position)
+        if clip_holes and not hole_may_survive_cleaning(peca["faces"][face_name]["connectionAreas"], *position,
+                                                        margin=rules.mapped_hole_dedup_distance):
+            counters.count("hole_clipped", face_name)
+            return
+        
         # Add the hole
         hole = criar_hole(x, y, hole_type, template_thickness, hardware, connection_id=connection_id, depth=depth, diameter=diameter)
-        face_holes.append(hole)
+        peca["faces"][face_name]["holes"].append(hole)
+        counters.count("hole_created", face_name)
     
-    def add_intermediate_holes_if_needed(face_holes, hole1_pos, hole2_pos, hole_type, hardware, depth=None, diameter=None):
-        """Step 4: Add intermediate holes when distance > 200mm between two holes"""
+    def add_intermediate_holes_if_needed(face_name, hole1_pos, hole2_pos, hole_type, hardware, depth=None, diameter=None):
+        """Step 4: Add intermediate holes when two holes are further apart than the maximum hole spacing"""
         distance = ((hole2_pos[0] - hole1_pos[0])**2 + (hole2_pos[1] - hole1_pos[1])**2)**0.5
-        if distance > 200:
+        if distance > rules.max_hole_spacing:
             # Add intermediate hole at midpoint
             mid_x = (hole1_pos[0] + hole2_pos[0]) / 2
             mid_y = (hole1_pos[1] + hole2_pos[1]) / 2
-            add_hole_if_not_exists(face_holes, mid_x, mid_y, hole_type, hardware, depth=depth, diameter=diameter)
+            add_hole_if_not_exists(face_name, mid_x, mid_y, hole_type, hardware, depth=depth, diameter=diameter)
+    
+    def skip_face(face_name):
+        """Lazy mode: faces without connection areas lose all their holes during cleaning"""
+        return clip_to_areas and not peca["faces"][face_name]["connectionAreas"]
     
     # Determine piece type using universal detection
-    if is_leg_piece(peca):
+    if is_leg:
         # For legs: ONLY 2 top_corner holes on top face as client expects
+        if skip_face("top"):
+            return
         face = peca["faces"]["top"]
         
         # Add exactly 2 corner holes as the client expects "2 pro leg"
@@ -267,7 +311,7 @@ def adicionar_holes_sistematicos(peca, template_thickness):
         for x, y, hole_type in corner_positions:
             # Connection ID will be set later when connections are detected
             # For now, create holes without connection ID
-            add_hole_if_not_exists(face["holes"], x, y, hole_type, "glue", depth=20)
+            add_hole_if_not_exists("top", x, y, hole_type, "glue", depth=rules.hole_depth_top)
         
     else:
         # For panels: Follow guide rules exactly
@@ -275,6 +319,8 @@ def adicionar_holes_sistematicos(peca, template_thickness):
         # Main and other_main faces: flap_corner holes at four corners
         # Step 4: "Main and other_main faces: flap_corner holes at four corners"
         for face_name in ["main", "other_main"]:
+            if skip_face(face_name):
+                continue
             face = peca["faces"][face_name]
             
             # Four corner positions: (half_thickness, half_thickness), (half_thickness, height-half_thickness), etc.
@@ -287,7 +333,7 @@ def adicionar_holes_sistematicos(peca, template_thickness):
             
             # Add all four corner holes
             for x, y, hole_type in corner_positions:
-                add_hole_if_not_exists(face["holes"], x, y, hole_type, "dowel_M_with_glue", depth=10, diameter=8)
+                add_hole_if_not_exists(face_name, x, y, hole_type, "dowel_M_with_glue", depth=rules.hole_depth_main, diameter=rules.hole_diameter)
             
             # Step 4: "Add intermediate holes when necessary"
             # Check distances between corner holes and add intermediate holes if needed
@@ -298,21 +344,23 @@ def adicionar_holes_sistematicos(peca, template_thickness):
             # Check horizontal pairs
             if len(holes_added) >= 2:
                 # Bottom pair
-                add_intermediate_holes_if_needed(face["holes"], holes_added[0], holes_added[2], "flap_central", "dowel_M_with_glue", depth=10, diameter=8)
+                add_intermediate_holes_if_needed(face_name, holes_added[0], holes_added[2], "flap_central", "dowel_M_with_glue", depth=rules.hole_depth_main, diameter=rules.hole_diameter)
                 # Top pair  
-                add_intermediate_holes_if_needed(face["holes"], holes_added[1], holes_added[3], "flap_central", "dowel_M_with_glue", depth=10, diameter=8)
+                add_intermediate_holes_if_needed(face_name, holes_added[1], holes_added[3], "flap_central", "dowel_M_with_glue", depth=rules.hole_depth_main, diameter=rules.hole_diameter)
                 # Left pair
-                add_intermediate_holes_if_needed(face["holes"], holes_added[0], holes_added[1], "flap_central", "dowel_M_with_glue", depth=10, diameter=8)
+                add_intermediate_holes_if_needed(face_name, holes_added[0], holes_added[1], "flap_central", "dowel_M_with_glue", depth=rules.hole_depth_main, diameter=rules.hole_diameter)
                 # Right pair
-                add_intermediate_holes_if_needed(face["holes"], holes_added[2], holes_added[3], "flap_central", "dowel_M_with_glue", depth=10, diameter=8)
+                add_intermediate_holes_if_needed(face_name, holes_added[2], holes_added[3], "flap_central", "dowel_M_with_glue", depth=rules.hole_depth_main, diameter=rules.hole_diameter)
         
         # Top, bottom, left and right faces: top_corner holes at corners
         # Step 4: "Top, bottom, left and right faces: top_corner holes at corners"
         for face_name in ["top", "bottom", "left", "right"]:
+            if skip_face(face_name):
+                continue
             face = peca["faces"][face_name]
             
             # Determine face dimensions
-            if face_name in ["top", "bottom"]:
+            if face_name in TOP_BOTTOM_FACES:
                 face_width, face_height = l, t
             else:  # left, right
                 face_width, face_height = t, h
@@ -327,7 +375,7 @@ def adicionar_holes_sistematicos(peca, template_thickness):
             
             # Add all four corner holes
             for x, y, hole_type in corner_positions:
-                add_hole_if_not_exists(face["holes"], x, y, hole_type, "glue", depth=20)
+                add_hole_if_not_exists(face_name, x, y, hole_type, "glue", depth=rules.hole_depth_top)
             
             # Step 4: "Add intermediate holes when necessary"
             # Check distances between corner holes and add intermediate holes if needed
@@ -337,13 +385,25 @@ def adicionar_holes_sistematicos(peca, template_thickness):
             
             if len(holes_added) >= 2:
                 # Bottom pair
-                add_intermediate_holes_if_needed(face["holes"], holes_added[0], holes_added[1], "top_central", "glue", depth=20)
+                add_intermediate_holes_if_needed(face_name, holes_added[0], holes_added[1], "top_central", "glue", depth=rules.hole_depth_top)
                 # Top pair
-                add_intermediate_holes_if_needed(face["holes"], holes_added[2], holes_added[3], "top_central", "glue", depth=20)
+                add_intermediate_holes_if_needed(face_name, holes_added[2], holes_added[3], "top_central", "glue", depth=rules.hole_depth_top)
                 # Left pair
-                add_intermediate_holes_if_needed(face["holes"], holes_added[0], holes_added[2], "top_central", "glue", depth=20)
+                add_intermediate_holes_if_needed(face_name, holes_added[0], holes_added[2], "top_central", "glue", depth=rules.hole_depth_top)
                 # Right pair
-                add_intermediate_holes_if_needed(face["holes"], holes_added[1], holes_added[3], "top_central", "glue", depth=20)
+                add_intermediate_holes_if_needed(face_name, holes_added[1], holes_added[3], "top_central", "glue", depth=rules.hole_depth_top)
+
+def hole_may_survive_cleaning(connection_areas, x, y, margin=DEFAULT_RULES.mapped_hole_dedup_distance):
+    """Step 4 (lazy mode): Whether a systematic hole at (x, y) can still matter after hole mapping
+    
+    Holes outside every connection area are removed in Step 13, but until then they can block
+    mapped holes placed within the mapped-hole dedup distance of them, so areas are widened by it.
+    """
+    for area in connection_areas:
+        if (area["x_min"] - margin <= x <= area["x_max"] + margin and
+            area["y_min"] - margin <= y <= area["y_max"] + margin):
+            return True
+    return False
 
 # ============================================================================
 # STEP 5: INFER CONNECTIONS BETWEEN PIECES
@@ -406,6 +466,12 @@ def map_piece_points(piece):
     }
     return points
 
+# Normal axis of each face (0 = x, 1 = y, 2 = z); faces only touch faces with the same normal
+FACE_NORMAL_AXIS = {'main': 1, 'other_main': 1, 'top': 2, 'bottom': 2, 'left': 0, 'right': 0}
+
+# In-plane cell size (mm) of the face index
+FACE_INDEX_CELL_SIZE = 100.0
+
 def find_proximity_points(piece1, piece2, tolerance=5.0):
     """Step 5: Find points between two pieces that are close to each other"""
     points1 = map_piece_points(piece1)
@@ -415,7 +481,11 @@ def find_proximity_points(piece1, piece2, tolerance=5.0):
     
     # Check face-to-face proximity (faces that are close/touching) - MAIN FOCUS
     for face1_name, bounds1 in points1['face_bounds'].items():
+        axis = FACE_NORMAL_AXIS[face1_name]
         for face2_name, bounds2 in points2['face_bounds'].items():
+            # Only parallel faces on nearby planes can touch
+            if FACE_NORMAL_AXIS[face2_name] != axis or abs(bounds1['min'][axis] - bounds2['min'][axis]) > tolerance:
+                continue
             # Check if faces are parallel and close
             face_distance = calculate_face_to_face_distance(bounds1, bounds2, face1_name, face2_name)
             if face_distance is not None and face_distance <= tolerance:
@@ -432,6 +502,34 @@ def find_proximity_points(piece1, piece2, tolerance=5.0):
     
     return proximities
 
+def build_face_index(pieces, piece_indices, tolerance=5.0, cell_size=FACE_INDEX_CELL_SIZE):
+    """Step 5: Bucket the face rectangles of pieces by normal axis, plane coordinate and in-plane cell"""
+    face_index = {"plane_size": max(tolerance, 1.0), "cell_size": cell_size, "cells": defaultdict(list)}
+    for piece_index in piece_indices:
+        for face_name, bounds in map_piece_points(pieces[piece_index])['face_bounds'].items():
+            for key in face_index_keys(face_index, face_name, bounds):
+                face_index["cells"][key].append(piece_index)
+    return face_index
+
+def face_index_keys(face_index, face_name, bounds, plane_offset=0):
+    """Grid cells covered by a face rectangle (plane cell shifted by plane_offset)"""
+    axis = FACE_NORMAL_AXIS[face_name]
+    plane_cell = math.floor(bounds['min'][axis] / face_index["plane_size"]) + plane_offset
+    bounds2d = face_2d_bounds(bounds, face_name)
+    cell_size = face_index["cell_size"]
+    for u_cell in range(math.floor(bounds2d['x_min'] / cell_size), math.floor(bounds2d['x_max'] / cell_size) + 1):
+        yield (axis, plane_cell, u_cell)
+
+def nearby_pieces(face_index, piece):
+    """Indexed pieces with a face on a nearby parallel plane overlapping a face of piece (contact candidates)"""
+    found = set()
+    cells = face_index["cells"]
+    for face_name, bounds in map_piece_points(piece)['face_bounds'].items():
+        for plane_offset in (-1, 0, 1):
+            for key in face_index_keys(face_index, face_name, bounds, plane_offset):
+                found.update(cells.get(key, ()))
+    return found
+
 def calculate_face_to_face_distance(bounds1, bounds2, face1_name, face2_name):
     """Step 5: Calculate distance between two faces if they are parallel and close"""
     # Determine face orientations
@@ -492,33 +590,32 @@ def calculate_face_to_face_distance(bounds1, bounds2, face1_name, face2_name):
     
     return None
 
+def face_2d_bounds(bounds, face_name):
+    """Step 5: 2D bounds of a face projected onto its plane"""
+    if face_name in MAIN_FACES:
+        # X-Z plane (length × height)
+        return {
+            'x_min': bounds['min'][0], 'x_max': bounds['max'][0],
+            'y_min': bounds['min'][2], 'y_max': bounds['max'][2]
+        }
+    elif face_name in TOP_BOTTOM_FACES:
+        # X-Y plane (length × thickness)  
+        return {
+            'x_min': bounds['min'][0], 'x_max': bounds['max'][0],
+            'y_min': bounds['min'][1], 'y_max': bounds['max'][1]
+        }
+    elif face_name in LEFT_RIGHT_FACES:
+        # Y-Z plane (thickness × height)
+        return {
+            'x_min': bounds['min'][1], 'x_max': bounds['max'][1],
+            'y_min': bounds['min'][2], 'y_max': bounds['max'][2]
+        }
+
 def calculate_face_overlap(bounds1, bounds2, face1_name, face2_name):
     """Step 5: Calculate overlap area between two parallel faces"""
     # Project both faces onto their shared plane and calculate 2D overlap
-    
-    # Get the 2D bounds for each face
-    def get_2d_bounds(bounds, face_name):
-        if face_name in ['main', 'other_main']:
-            # X-Z plane (length × height)
-            return {
-                'x_min': bounds['min'][0], 'x_max': bounds['max'][0],
-                'y_min': bounds['min'][2], 'y_max': bounds['max'][2]
-            }
-        elif face_name in ['top', 'bottom']:
-            # X-Y plane (length × thickness)  
-            return {
-                'x_min': bounds['min'][0], 'x_max': bounds['max'][0],
-                'y_min': bounds['min'][1], 'y_max': bounds['max'][1]
-            }
-        elif face_name in ['left', 'right']:
-            # Y-Z plane (thickness × height)
-            return {
-                'x_min': bounds['min'][1], 'x_max': bounds['max'][1],
-                'y_min': bounds['min'][2], 'y_max': bounds['max'][2]
-            }
-    
-    bounds2d_1 = get_2d_bounds(bounds1, face1_name)
-    bounds2d_2 = get_2d_bounds(bounds2, face2_name)
+    bounds2d_1 = face_2d_bounds(bounds1, face1_name)
+    bounds2d_2 = face_2d_bounds(bounds2, face2_name)
     
     # Calculate 2D overlap
     x_overlap = max(0, min(bounds2d_1['x_max'], bounds2d_2['x_max']) - max(bounds2d_1['x_min'], bounds2d_2['x_min']))
@@ -535,10 +632,20 @@ def calculate_face_overlap(bounds1, bounds2, face1_name, face2_name):
     
     return None
 
-def detect_connections_by_proximity(pieces):
-    """Step 5: Detect connections using ACTUAL SPATIAL POSITIONING from input JSON"""
+def find_touching_legs(panels, pieces, face_index):
+    """Step 5: (panel index, touching leg indices in original order) for a chunk of panels"""
+    return [(panel_idx, [leg_idx for leg_idx in sorted(nearby_pieces(face_index, pieces[panel_idx]))
+                         if leg_idx != panel_idx and find_proximity_points(pieces[leg_idx], pieces[panel_idx])])
+            for panel_idx in panels]
+
+def detect_connections_by_proximity(pieces, workers=None, parallel_mode="thread"):
+    """Step 5: Detect connections using ACTUAL SPATIAL POSITIONING from input JSON
+
+    Contacts are found per panel in chunks (see parallel.map_chunks). Connection IDs follow the
+    (panel, leg) pair order, each panel starting at the prefix sum of the earlier panels' contacts,
+    so serial and parallel runs number them the same.
+    """
     connections = []
-    conn_id = 1
     
     # Use universal piece detection functions
     legs = [i for i, piece in enumerate(pieces) if is_leg_piece(piece)]
@@ -546,27 +653,28 @@ def detect_connections_by_proximity(pieces):
     
     print(f"DEBUG: Found {len(legs)} legs and {len(panels)} panels")
     
-    # Keep legs in their ORIGINAL order to maintain connection ID consistency
-    # Don't sort by position - this preserves the original connection ID assignment
-    leg_info = []
-    for leg_idx in legs:
-        leg_piece = pieces[leg_idx]
-        leg_info.append((leg_idx, leg_piece['position']['x'], leg_piece))
+    # Only legs with a face touching the panel are connected; the face index keeps the exact
+    # test to legs with a face on a nearby parallel plane
+    face_index = build_face_index(pieces, legs)
+    touching = map_chunks(find_touching_legs, panels, pieces, face_index, workers=workers, mode=parallel_mode)
+    first_ids, _ = allocate_ids([len(touching_legs) for _, touching_legs in touching])
     
-    print(f"DEBUG: Legs in original order: {[(pieces[idx]['name'], x_pos) for idx, x_pos, _ in leg_info]}")
-    
-    # Create spatial position mapping but preserve original connection order
-    leg_positions_for_spatial = sorted(leg_info, key=lambda x: x[1])  # Sort by X for spatial calculation
-    spatial_mapping = {}
-    for spatial_index, (orig_leg_idx, x_pos, leg_piece) in enumerate(leg_positions_for_spatial):
-        spatial_mapping[orig_leg_idx] = spatial_index
-    
-    # Connect each leg to each panel using ORIGINAL ORDER for connection IDs
-    for panel_idx in panels:
+    # Connect each panel to its touching legs, keeping the legs in their ORIGINAL order for connection IDs
+    for (panel_idx, touching_legs), first_id in zip(touching, first_ids):
         panel_piece = pieces[panel_idx]
+        leg_info = [(leg_idx, pieces[leg_idx]['position']['x'], pieces[leg_idx]) for leg_idx in touching_legs]
+        
+        print(f"DEBUG: Legs touching {panel_piece['name']} in original order: {[(pieces[idx]['name'], x_pos) for idx, x_pos, _ in leg_info]}")
+        
+        # Create spatial position mapping but preserve original connection order
+        leg_positions_for_spatial = sorted(leg_info, key=lambda x: x[1])  # Sort by X for spatial calculation
+        spatial_mapping = {}
+        for spatial_index, (orig_leg_idx, x_pos, leg_piece) in enumerate(leg_positions_for_spatial):
+            spatial_mapping[orig_leg_idx] = spatial_index
         
         for original_index, (leg_idx, leg_x_pos, leg_piece) in enumerate(leg_info):
             spatial_index = spatial_mapping[leg_idx]  # Get spatial position for area calculation
+            conn_id = first_id + original_index
             
             # Create connection between leg top and panel main face
             connections.append({
@@ -578,7 +686,6 @@ def detect_connections_by_proximity(pieces):
                 'overlap_area': create_spatial_overlap_area(leg_piece, panel_piece, spatial_index, len(leg_info))
             })
             print(f"DEBUG: Connection {conn_id} created between {leg_piece['name']} (original order {original_index+1}, spatial position {spatial_index+1}) and {panel_piece['name']} main")
-            conn_id += 1
     
     return connections
 
@@ -635,9 +742,6 @@ def map_holes_between_pieces(pieces, connections, template_thickness):
     
     # Clear existing holes in connection areas ONLY on panel faces to avoid duplicates
     # Keep leg holes intact for mapping
-    def is_leg_piece(piece):
-        return ("perna" in piece["name"].lower()) or (abs(piece["length"] - piece["height"]) < 50 and max(piece["length"], piece["height"]) < 250)
-    
     for piece in pieces:
         if not is_leg_piece(piece):  # Only clear holes on panel pieces, not legs
             for face_name, face in piece["faces"].items():
@@ -653,6 +757,7 @@ def map_holes_between_pieces(pieces, connections, template_thickness):
                                 break
                         if not is_in_connection_area:
                             holes_to_keep.append(hole)
+                    counters.count("hole_cleaned", face_name, len(face["holes"]) - len(holes_to_keep))
                     face["holes"] = holes_to_keep
                     print(f"DEBUG: Cleared existing holes in connection areas on {piece['name']} {face_name}")
     
@@ -730,19 +835,19 @@ def convert_proximity_overlap_to_face_coordinates(piece, face_name, overlap_area
     """Step 7: Convert global overlap area into face-local coordinates, preserving actual position and using correct face dimensions."""
     pos = piece["position"]
     # Determine local face dimensions and axis mapping
-    if face_name in ["main", "other_main"]:
+    if face_name in MAIN_FACES:
         max_x = piece["length"]  # along X
         max_y = piece["height"]  # along Z but becomes local Y on the X-Z plane
         # Global → local mapping for a point on this face
         def to_local(gx, gy):
             # gy here is actually global Z coordinate
             return gx - pos["x"], gy - pos["z"]
-    elif face_name in ["top", "bottom"]:
+    elif face_name in TOP_BOTTOM_FACES:
         max_x = piece["length"]  # along X
         max_y = piece["height"]  # Use board height to span full depth for stripes
         def to_local(gx, gy):
             return gx - pos["x"], gy - pos["y"]
-    elif face_name in ["left", "right"]:
+    elif face_name in LEFT_RIGHT_FACES:
         max_x = piece["height"]   # along Y becomes local X
         max_y = piece["height"] if False else piece["thickness"]  # this axis is Z
         # For left/right faces: overlap x == global Y, y == global Z
@@ -796,7 +901,7 @@ def create_simple_connection_area(piece, face_name, area_size):
   
     ft = piece["half_thickness"]
     
-    if face_name in ["main", "other_main"]:
+    if face_name in MAIN_FACES:
         # Create area in a corner but not overlapping with holes
         x_start = max(ft + 25, 30)  # Away from corner holes
         y_start = max(ft + 25, 30)
@@ -815,7 +920,7 @@ def create_simple_connection_area(piece, face_name, area_size):
             'x_max': x_end,
             'y_max': y_end
         }
-    elif face_name in ["top", "bottom"]:
+    elif face_name in TOP_BOTTOM_FACES:
         x_start = max(ft + 25, 30)
         y_start = max(ft + 2, 5)  # Small offset for thickness faces
         x_end = min(piece["length"] - ft, x_start + area_size)
@@ -833,7 +938,7 @@ def create_simple_connection_area(piece, face_name, area_size):
             'x_max': x_end,
             'y_max': y_end
         }
-    elif face_name in ["left", "right"]:
+    elif face_name in LEFT_RIGHT_FACES:
         x_start = max(ft + 2, 5)
         y_start = max(ft + 25, 30)
         x_end = min(piece["thickness"] - ft, x_start + min(area_size, piece["thickness"] - 10))
@@ -862,7 +967,7 @@ def classify_hole_type(x, y, piece, face_name):
     """Step 8: Classify hole type based on exact position on face"""
     ft = piece["half_thickness"]
     
-    if face_name in ["main", "other_main"]:
+    if face_name in MAIN_FACES:
         # Length x Height faces
         length = piece["length"]
         height = piece["height"]
@@ -880,9 +985,9 @@ def classify_hole_type(x, y, piece, face_name):
         else:
             return "face_central"
             
-    elif face_name in ["top", "bottom", "left", "right"]:
+    elif face_name in EDGE_FACES:
         # Thickness faces - determine dimensions based on face
-        if face_name in ["top", "bottom"]:
+        if face_name in TOP_BOTTOM_FACES:
             width = piece["length"]
             height = piece["thickness"]
         else:  # left, right
@@ -1018,7 +1123,7 @@ def map_leg_holes_to_top_panel(leg_piece, top_piece, leg_face, top_face, conn_id
             
             # Use properties from leg hole
             hardware = leg_hole.get("ferragemSymbols", ["glue"])[0]
-            depth = leg_hole.get("depth", 20)
+            depth = leg_hole.get("depth", top_piece["rules"].hole_depth_top)
             diameter = leg_hole.get("diameter")
             
             # Create mapped hole with connection ID based on connection area
@@ -1034,9 +1139,10 @@ def map_leg_holes_to_top_panel(leg_piece, top_piece, leg_face, top_face, conn_id
             
             # Check if hole already exists at this position before adding
             hole_exists = False
+            dedup_distance = top_piece["rules"].mapped_hole_dedup_distance
             for existing_hole in top_piece["faces"][top_face]["holes"]:
-                if (abs(existing_hole["x"] - hole_x) < 5.0 and 
-                    abs(existing_hole["y"] - hole_y) < 5.0):
+                if (abs(existing_hole["x"] - hole_x) < dedup_distance and 
+                    abs(existing_hole["y"] - hole_y) < dedup_distance):
                     hole_exists = True
                     print(f"DEBUG: Hole already exists at ({hole_x:.1f}, {hole_y:.1f}), skipping duplicate")
                     break
@@ -1044,8 +1150,10 @@ def map_leg_holes_to_top_panel(leg_piece, top_piece, leg_face, top_face, conn_id
             if not hole_exists:
                 # Add to top panel face
                 top_piece["faces"][top_face]["holes"].append(mapped_hole)
+                counters.count("hole_created", top_face)
                 print(f"Created mapped hole: {leg_piece['name']} -> ({hole_x:.1f}, {hole_y:.1f}) in area {area_connection_id}")
             else:
+                counters.count("hole_deduped", top_face)
                 print(f"Skipped duplicate hole: {leg_piece['name']} -> ({hole_x:.1f}, {hole_y:.1f})")
         else:
             print(f"WARNING: No suitable connection area found for hole at ({leg_hole['x']}, {leg_hole['y']}) on {leg_piece['name']}")
@@ -1062,7 +1170,7 @@ def transform_leg_to_top_coordinates(leg_piece, top_piece, leg_face, top_face, l
         # This is a fallback for when connection areas aren't available yet
         
         # For leg top to panel main/other_main connection:
-        if leg_face == "top" and top_face in ["main", "other_main"]:
+        if leg_face == "top" and top_face in MAIN_FACES:
             # Map leg top coordinates to panel main/other_main coordinates
             # The leg's top face (length x thickness) maps to panel's main face (length x height)
             
@@ -1124,7 +1232,7 @@ def _should_create_conn_area(piece, face_name):
     # Bottom face should only have structural stripes (200/20mm) per client feedback
     if is_leg_piece(piece) and face_name == "top":
         return True
-    elif not is_leg_piece(piece) and face_name in ["main", "other_main"]:
+    elif not is_leg_piece(piece) and face_name in MAIN_FACES:
         return True
     else:
         return False
@@ -1158,7 +1266,7 @@ def create_aligned_connection_areas(pieces, connections):
 
 def create_spatial_connection_area(piece, face_name, connection, all_connections):
     """Create connection areas based on actual spatial positioning from input JSON"""
-    if face_name in ["main", "other_main"]:
+    if face_name in MAIN_FACES:
         # For panel main faces - use spatial positioning from leg connections
         if not is_leg_piece(piece):  # This is a panel
             create_panel_connection_areas_from_spatial_data(piece, face_name, all_connections)
@@ -1193,7 +1301,7 @@ def create_panel_connection_areas_from_spatial_data(piece, face_name, connection
             "x_min": int(leg_x - 10),  # 20mm wide area centered on leg
             "x_max": int(leg_x + 10),
             "y_min": 0,
-            "y_max": DEFAULT_CONNECTION_AREA_HEIGHT,
+            "y_max": piece["rules"].default_connection_area_height,
             "fill": "black",
             "opacity": 0.05,
             "connectionId": 1
@@ -1228,13 +1336,13 @@ def create_hole_aligned_connection_area(piece, face_name, conn_id):
         return
     
     # Calculate connection area dimensions based on face type
-    if face_name in ["main", "other_main"]:
+    if face_name in MAIN_FACES:
         max_x = piece["length"]
         max_y = piece["height"]
-    elif face_name in ["top", "bottom"]:
+    elif face_name in TOP_BOTTOM_FACES:
         max_x = piece["length"]
         max_y = piece["height"]  # Use height for full depth
-    elif face_name in ["left", "right"]:
+    elif face_name in LEFT_RIGHT_FACES:
         max_x = piece["height"]
         max_y = piece["thickness"]
     else:
@@ -1244,7 +1352,7 @@ def create_hole_aligned_connection_area(piece, face_name, conn_id):
     # Step 10: "Respect real limits of overlap area"
     
     # Create connection areas according to client specifications
-    if face_name in ["top", "bottom"]:
+    if face_name in TOP_BOTTOM_FACES:
         # Check if this is a leg piece or top panel - using universal detection
         
         if is_leg_piece(piece):
@@ -1274,13 +1382,13 @@ def create_hole_aligned_connection_area(piece, face_name, conn_id):
                 # No fallback squares - only vertical stripes will be created by ensure_all_pieces_have_connection_areas
                 pass
     
-    elif face_name in ["main", "other_main"]:
+    elif face_name in MAIN_FACES:
         # For main faces: rectangular connection areas as specified by client
         # Client specifications: areas should be positioned at specific coordinates
         # and have height of 200mm, not full panel height
         
-        connection_area_width = DEFAULT_CONNECTION_AREA_WIDTH
-        connection_area_height = DEFAULT_CONNECTION_AREA_HEIGHT
+        connection_area_width = piece["rules"].default_connection_area_width
+        connection_area_height = piece["rules"].default_connection_area_height
         
         # SMART DYNAMIC POSITIONING - Maintains client's expected positioning logic
         # Calculate positions that match client's requirements without hardcoding
@@ -1317,7 +1425,7 @@ def create_hole_aligned_connection_area(piece, face_name, conn_id):
         }
         piece["faces"][face_name]["connectionAreas"].append(right_area)
     
-    elif face_name in ["left", "right"]:
+    elif face_name in LEFT_RIGHT_FACES:
         # For left/right faces: horizontal stripes
         stripe_height = piece["thickness"]  # Use piece thickness for stripe height
         spacing = piece["length"] * 0.8  # Dynamic spacing based on piece length
@@ -1382,13 +1490,13 @@ def ensure_all_pieces_have_connection_areas(pieces, connections):
 
 def create_simple_connection_area_for_piece(piece, face_name, conn_id):
     """Step 12: Create a simple connection area on a face for a piece"""
-    if face_name in ["main", "other_main"]:
+    if face_name in MAIN_FACES:
         max_x = piece["length"]
         max_y = piece["height"]
     elif face_name == "top":
         max_x = piece["length"]
         max_y = piece["thickness"]
-    elif face_name in ["left", "right"]:
+    elif face_name in LEFT_RIGHT_FACES:
         max_x = piece["thickness"]
         max_y = piece["height"]
     else:
@@ -1451,13 +1559,13 @@ def create_simple_connection_area_for_piece(piece, face_name, conn_id):
             }
             piece["faces"][face_name]["connectionAreas"].append(right_stripe)
     
-    elif face_name in ["main", "other_main"]:
+    elif face_name in MAIN_FACES:
         # For main faces: rectangular connection areas as specified by client
         # Client specifications: areas should be positioned at specific coordinates
         # and have height of 200mm, not full panel height
         
-        connection_area_width = DEFAULT_CONNECTION_AREA_WIDTH
-        connection_area_height = DEFAULT_CONNECTION_AREA_HEIGHT
+        connection_area_width = piece["rules"].default_connection_area_width
+        connection_area_height = piece["rules"].default_connection_area_height
         
         # SMART DYNAMIC POSITIONING - Maintains client's expected positioning logic
         # Calculate positions that match client's requirements without hardcoding
@@ -1494,7 +1602,7 @@ def create_simple_connection_area_for_piece(piece, face_name, conn_id):
         }
         piece["faces"][face_name]["connectionAreas"].append(right_area)
     
-    elif face_name in ["left", "right"]:
+    elif face_name in LEFT_RIGHT_FACES:
         # For left/right faces: horizontal stripes
         stripe_height = piece["thickness"]  # Use piece thickness for stripe height
         spacing = piece["length"] * 0.8  # Dynamic spacing based on piece length
@@ -1537,7 +1645,7 @@ def clean_holes_outside_connection_areas(pieces):
             for hole in face["holes"]:
                 # Check if hole is inside any connection area OR is a systematic hole
                 is_inside_connection_area = False
-                is_systematic_hole = hole["type"] in ["flap_corner", "flap_central", "top_corner", "top_central", "face_central"]
+                is_systematic_hole = hole["type"] in SYSTEMATIC_HOLE_TYPES
                 
                 # Check if hole is within any connection area
                 for area in connection_areas:
@@ -1553,15 +1661,24 @@ def clean_holes_outside_connection_areas(pieces):
                 else:
                     print(f"DEBUG: Removing hole at ({hole['x']}, {hole['y']}) on {piece['name']} {face_name} - outside connection areas or on non-connected face")
             
+            counters.count("hole_cleaned", face_name, len(face["holes"]) - len(cleaned_holes))
             face["holes"] = cleaned_holes
 
 # ============================================================================
 # STEP 14: ENSURE ALL PIECES HAVE FACES WITH SINGER HOLES
 # ============================================================================
 
-def ensure_all_pieces_have_faces(pieces, template_thickness):
-    """Step 14: Ensure every piece has at least main faces with singer holes for reinforcement"""
+def ensure_all_pieces_have_faces(pieces, template_thickness, skip_legs_and_panels=False):
+    """Step 14: Ensure every piece has at least main faces with singer holes for reinforcement
+    
+    Legs and panels of designs that have both were tested for contacts in Step 5; with
+    skip_legs_and_panels set (decided on the whole design, not on the pieces passed in) the ones
+    that touch nothing are left without holes instead of getting orphan singer holes.
+    """
     for piece in pieces:
+        if skip_legs_and_panels and (is_leg_piece(piece) or is_panel_piece(piece)):
+            continue
+        
         # Check if piece has any faces with content
         has_faces_with_content = any(
             face["holes"] or face["connectionAreas"] 
@@ -1600,6 +1717,10 @@ def mirror_connection_areas_with_singer_holes(piece, source_face_name, target_fa
     source_face = piece["faces"][source_face_name]
     target_face = piece["faces"][target_face_name]
     
+    # Mirror and classify every source hole once, and index the target holes once, for all areas
+    mirrored_holes = mirror_source_holes(piece, source_face_name, target_face_name)
+    hole_grid = build_hole_grid(target_face["holes"], piece["rules"].singer_hole_min_distance)
+    
     for conn_area in source_face["connectionAreas"]:
         # Mirror the connection area coordinates (same dimensions, no coordinate transformation needed)
         mirrored_area = {
@@ -1617,59 +1738,77 @@ def mirror_connection_areas_with_singer_holes(piece, source_face_name, target_fa
         print(f"DEBUG: Added mirrored connection area to {target_face_name}: {mirrored_area['x_min']}-{mirrored_area['x_max']} x {mirrored_area['y_min']}-{mirrored_area['y_max']}")
         
         # Add singer holes within the mirrored area
-        add_singer_holes_in_area(piece, source_face_name, target_face_name, mirrored_area, template_thickness)
+        add_singer_holes_in_area(piece, source_face_name, target_face_name, mirrored_area, template_thickness,
+                                 mirrored_holes=mirrored_holes, hole_grid=hole_grid)
 
-def add_singer_holes_in_area(piece, source_face_name, target_face_name, area, template_thickness):
-    """Step 7: Add singer holes by mirroring actual holes from source face across center axis"""
-    source_face = piece["faces"][source_face_name]
-    target_face = piece["faces"][target_face_name]
-    
+def mirror_source_holes(piece, source_face_name, target_face_name):
+    """Step 7: Mirror all source face holes across the center axis and classify them, sorted by source X"""
     # Get piece dimensions for center axis calculation
     piece_height = piece["height"]  # For main/other_main faces
     center_y = piece_height / 2
     
-    # Find all holes in the source face that fall within this connection area
-    source_holes_in_area = []
-    for hole in source_face["holes"]:
-        if (area["x_min"] <= hole["x"] <= area["x_max"] and 
-            area["y_min"] <= hole["y"] <= area["y_max"]):
-            source_holes_in_area.append(hole)
-    
-    print(f"DEBUG: Found {len(source_holes_in_area)} holes in source area to mirror")
-    
-    # Mirror each hole across the center axis
-    for source_hole in source_holes_in_area:
+    mirrored_holes = []
+    for order, source_hole in enumerate(piece["faces"][source_face_name]["holes"]):
         # Calculate mirrored Y position: mirror_y = 2 * center_y - original_y
         mirror_x = source_hole["x"]  # X stays the same
         mirror_y = 2 * center_y - source_hole["y"]  # Mirror across center axis
-        
-        # Determine singer hole type based on position and proximity
         singer_type = determine_singer_hole_type(piece, mirror_x, mirror_y, target_face_name)
-        
+        mirrored_holes.append((source_hole["x"], source_hole["y"], order, mirror_x, mirror_y, singer_type))
+    
+    mirrored_holes.sort(key=lambda entry: entry[0])
+    return {"x": [entry[0] for entry in mirrored_holes], "holes": mirrored_holes}
+
+def add_singer_holes_in_area(piece, source_face_name, target_face_name, area, template_thickness, mirrored_holes=None, hole_grid=None):
+    """Step 7: Add singer holes by mirroring actual holes from source face across center axis"""
+    target_face = piece["faces"][target_face_name]
+    
+    if mirrored_holes is None:
+        mirrored_holes = mirror_source_holes(piece, source_face_name, target_face_name)
+    if hole_grid is None:
+        hole_grid = build_hole_grid(target_face["holes"], piece["rules"].singer_hole_min_distance)
+    
+    # Find all holes in the source face that fall within this connection area (in source order)
+    start = bisect_left(mirrored_holes["x"], area["x_min"])
+    end = bisect_right(mirrored_holes["x"], area["x_max"])
+    source_holes_in_area = sorted(
+        (entry for entry in mirrored_holes["holes"][start:end]
+         if area["y_min"] <= entry[1] <= area["y_max"]),
+        key=lambda entry: entry[2]
+    )
+    
+    print(f"DEBUG: Found {len(source_holes_in_area)} holes in source area to mirror")
+    
+    # Mirror each hole across the center axis
+    for source_x, source_y, _, mirror_x, mirror_y, singer_type in source_holes_in_area:
         # Only add if the mirrored position doesn't overlap with existing holes
-        if not hole_exists_near_position(target_face["holes"], mirror_x, mirror_y, min_distance=8.0):
+        if hole_exists_in_grid(hole_grid, mirror_x, mirror_y, min_distance=piece["rules"].singer_hole_min_distance):
+            counters.count("hole_deduped", target_face_name)
+        else:
             singer_hole = criar_hole(
                 mirror_x, mirror_y, 
                 singer_type, 
                 template_thickness, 
                 "singer_dowel", 
-                depth=30
+                depth=piece["rules"].hole_depth_singer_dowel
             )
             target_face["holes"].append(singer_hole)
-            print(f"DEBUG: Mirrored hole from ({source_hole['x']}, {source_hole['y']}) to ({mirror_x}, {mirror_y}) as {singer_type}")
+            add_hole_to_grid(hole_grid, singer_hole)
+            counters.count("hole_created", target_face_name)
+            print(f"DEBUG: Mirrored hole from ({source_x}, {source_y}) to ({mirror_x}, {mirror_y}) as {singer_type}")
 
 def determine_singer_hole_type(piece, x, y, face_name):
     """Step 7: Determine singer hole type based on position and proximity to edges"""
     ft = piece["half_thickness"]
     
-    if face_name in ["main", "other_main"]:
+    if face_name in MAIN_FACES:
         l = piece["length"]
         h = piece["height"]
         
         # singer_central: somewhere in the middle of the face, without proximity to edges
         # Check if hole is in the middle Y zone (not near top or bottom edges)
-        near_top = y > (h - 50)    # Within 50mm of top edge
-        near_bottom = y < 50       # Within 50mm of bottom edge
+        edge_distance = piece["rules"].singer_min_distance
+        near_top = y > (h - edge_distance)    # Within singer_min_distance (50mm) of top edge
+        near_bottom = y < edge_distance       # Within singer_min_distance (50mm) of bottom edge
         in_middle_y = not (near_top or near_bottom)
         
         # Also check distance from left/right edges
@@ -1690,7 +1829,7 @@ def determine_singer_hole_type(piece, x, y, face_name):
         # singer_flap: near any edge or not in middle zone
         return "singer_flap"
             
-    elif face_name in ["top", "bottom", "left", "right"]:
+    elif face_name in EDGE_FACES:
         # singer_channel: when the hole is on a slat or top face
         return "singer_channel"
     
@@ -1704,6 +1843,29 @@ def hole_exists_near_position(face_holes, x, y, min_distance=5.0):
             return True
     return False
 
+def build_hole_grid(face_holes, cell_size):
+    """Bucket face holes into a uniform grid so proximity checks only visit neighbouring cells"""
+    hole_grid = {"cell_size": cell_size, "cells": defaultdict(list)}
+    for hole in face_holes:
+        add_hole_to_grid(hole_grid, hole)
+    return hole_grid
+
+def add_hole_to_grid(hole_grid, hole):
+    """Register a hole in its grid cell"""
+    cell_size = hole_grid["cell_size"]
+    hole_grid["cells"][(math.floor(hole["x"] / cell_size), math.floor(hole["y"] / cell_size))].append(hole)
+
+def hole_exists_in_grid(hole_grid, x, y, min_distance=5.0):
+    """Grid-backed equivalent of hole_exists_near_position (min_distance must not exceed the cell size)"""
+    cell_size = hole_grid["cell_size"]
+    cell_x = math.floor(x / cell_size)
+    cell_y = math.floor(y / cell_size)
+    for dx in (-1, 0, 1):
+        for dy in (-1, 0, 1):
+            if hole_exists_near_position(hole_grid["cells"].get((cell_x + dx, cell_y + dy), ()), x, y, min_distance):
+                return True
+    return False
+
 def add_singer_holes_to_face(piece, face_name, template_thickness):
     """Step 15: Add singer holes to a specific face"""
     face = piece["faces"][face_name]
@@ -1717,7 +1879,7 @@ def add_singer_holes_to_face(piece, face_name, template_thickness):
                 return True
         return False
     
-    if face_name in ["main", "other_main"]:
+    if face_name in MAIN_FACES:
         h = piece["height"]
         l = piece["length"]
         
@@ -1733,28 +1895,32 @@ def add_singer_holes_to_face(piece, face_name, template_thickness):
         
         # Only add singer holes if they don't overlap with existing holes
         for x, y, singer_type in singer_positions:
-            # Check minimum 8mm distance from any existing hole to avoid overlap
-            if not hole_exists_near_position(face["holes"], x, y, min_distance=8.0):
-                singer_hole = criar_hole(x, y, singer_type, template_thickness, "dowel_G_with_glue", depth=40)
+            # Check the minimum singer distance from any existing hole to avoid overlap
+            if not hole_exists_near_position(face["holes"], x, y, min_distance=piece["rules"].singer_hole_min_distance):
+                singer_hole = criar_hole(x, y, singer_type, template_thickness, "dowel_G_with_glue",
+                                         depth=piece["rules"].hole_depth_other_main)
                 face["holes"].append(singer_hole)
+                counters.count("hole_created", face_name)
+            else:
+                counters.count("hole_deduped", face_name)
 
 # ============================================================================
 # STEP 16: SELECT MODEL TEMPLATE
 # ============================================================================
 
-def select_model_template(pieces):
+def select_model_template(pieces, rules=DEFAULT_RULES):
     """Step 16: Select model template based on thickness with most top holes"""
     thickness_hole_count = defaultdict(int)
     
     for piece in pieces:
         for face_name in ["top", "bottom", "left", "right"]:
             for hole in piece["faces"][face_name]["holes"]:
-                if hole["type"] in ["top_corner", "top_central"]:
+                if hole["type"] in TOP_HOLE_TYPES:
                     thickness = int(float(hole["targetType"]))
                     thickness_hole_count[thickness] += 1
     
     if not thickness_hole_count:
-        return 20  # Default
+        return rules.default_template_thickness  # Default
     
     # Find thickness with most holes, prefer smaller in case of tie
     max_count = max(thickness_hole_count.values())
@@ -1765,23 +1931,22 @@ def select_model_template(pieces):
 # STEP 17: PROCESS JSON INPUT
 # ============================================================================
 
-def processar_json_entrada(input_path, output_path):
-    """Main processing function following the guide's step-by-step flow"""
-    
-    # ============================================================================
-    # STEP 1-2: INPUT DATA PREPROCESSING & DIMENSIONS
-    # ============================================================================
+def decodificar_json_entrada(raw, source="<bytes>", compact=False):
+    """Step 1: Parse raw input bytes (or any buffer), trying the encodings exported by the drawing tools
     
+    With compact, the buffer is decoded in chunks and items are extracted one at a time keeping
+    only the fields the pipeline reads (see input_stream.parse_layers), instead of decoding the
+    whole text and building the full JSON tree.
+    """
     # Try different encodings to handle the special characters
     encodings = ['utf-8', 'latin-1', 'cp1252', 'iso-8859-1']
     data = None
     
     for encoding in encodings:
         try:
-            with open(input_path, "r", encoding=encoding) as f:
-                data = json.load(f)
-                print(f"Successfully loaded file with {encoding} encoding")
-                break
+            data = parse_layers(raw, encoding) if compact else json.loads(str(raw, encoding))
+            print(f"Successfully loaded file with {encoding} encoding")
+            break
         except UnicodeDecodeError:
             continue
         except json.JSONDecodeError as e:
@@ -1789,7 +1954,98 @@ def processar_json_entrada(input_path, output_path):
             continue
     
     if data is None:
-        raise ValueError(f"Could not decode {input_path} with any supported encoding")
+        raise ValueError(f"Could not decode {source} with any supported encoding")
+    return data
+
+def carregar_json_entrada(input_path, mapped=False):
+    """Step 1: Load the input JSON file
+    
+    With mapped, the file is memory-mapped, decoded in chunks and parsed with streaming item
+    extraction, so neither the raw bytes, the full text nor the full JSON tree are held on the heap
+    (for large whole-project exports).
+    """
+    if mapped:
+        with map_file(input_path) as buffer:
+            return decodificar_json_entrada(buffer, input_path, compact=True)
+    with open(input_path, "rb") as f:
+        return decodificar_json_entrada(f.read(), input_path)
+
+def construir_peca_json(p):
+    """Output JSON for one piece: dimensions and the faces that have holes or connection areas"""
+    peca_json = {
+        "name": p["name"],
+        "length": format_number(p["length"]),
+        "height": format_number(p["height"]),
+        "thickness": format_number(p["thickness"]),
+        "quantity": 1,
+        "faces": []
+    }
+    
+    for face_name, face_data in p["faces"].items():
+        # Include faces that have holes OR connection areas (not requiring both)
+        if face_data["holes"] or face_data["connectionAreas"]:
+            peca_json["faces"].append({
+                "faceSide": face_name,
+                "holes": face_data["holes"],
+                "connectionAreas": face_data["connectionAreas"]
+            })
+
+    return peca_json
+
+def finalizar_pecas(pecas_3d, template_thickness, add_missing_faces, skip_legs_and_panels=False):
+    """Per-piece finishing steps for a chunk of pieces; returns their output JSON in order.
+    
+    Every step here only reads and writes the piece it works on, so chunks can run in
+    parallel (see parallel.map_chunks) and their results concatenated.
+    """
+    # ============================================================================
+    # STEP 13: CLEAN HOLES OUTSIDE CONNECTION AREAS
+    # ============================================================================
+    
+    # Clean holes outside connection areas and unconnected holes
+    counters.set_step("clean_holes")
+    clean_holes_outside_connection_areas(pecas_3d)
+    
+    # ============================================================================
+    # STEP 7: ADD SINGER REINFORCEMENT HOLES
+    # ============================================================================
+    
+    # Step 7: Add singer holes on opposite faces to mirror connection areas
+    counters.set_step("singer_holes")
+    add_singer_holes_step7(pecas_3d, template_thickness)
+    
+    # ============================================================================
+    # STEP 14: ENSURE ALL PIECES HAVE FACES
+    # ============================================================================
+    
+    # Ensure all pieces have at least the systematic holes we defined
+    if add_missing_faces:
+        counters.set_step("ensure_faces")
+        ensure_all_pieces_have_faces(pecas_3d, template_thickness, skip_legs_and_panels)
+    
+    # ============================================================================
+    # STEP 17: STRUCTURE FINAL JSON
+    # ============================================================================
+    
+    return [construir_peca_json(p) for p in pecas_3d]
+
+def processar_dados(data, profile_dir=None, lazy_holes=False, workers=None, parallel_mode="thread", rules=None):
+    """Run the pipeline on already-loaded input data and return the output JSON structure.
+    
+    When profile_dir is set, the run is profiled and written there tagged with the design hash.
+    With lazy_holes, connections and connection areas are created first and systematic holes are
+    only generated on faces with connection areas, clipped to them (same output, fewer holes allocated).
+    With workers > 1, contact detection and the per-piece finishing steps run on chunks across a thread or
+    process pool (parallel_mode) and are merged in piece order (same output as a serial run).
+    rules is the rule profile (a rules.RuleProfile or a profile file path; default: the guide's values).
+    """
+    rules = resolve_rules(rules)
+    if profile_dir:
+        with profiled(f"app-{design_hash(data)}", profile_dir):
+            return processar_dados(data, lazy_holes=lazy_holes, workers=workers, parallel_mode=parallel_mode, rules=rules)
+    counters.reset()
+    memory_profile.reset()
+    memory_profile.mark("build_pieces")
 
     # ============================================================================
     # STEP 3: MAP PIECES IN 3D SPACE
@@ -1800,7 +2056,7 @@ def processar_json_entrada(input_path, output_path):
     
     # Build 3D pieces with bounding boxes and coordinate system
     for nome, v in views.items():
-        peca = construir_peca_3d(nome, v)
+        peca = construir_peca_3d(nome, v, rules)
         if peca:
             pecas_3d.append(peca)
 
@@ -1811,9 +2067,9 @@ def processar_json_entrada(input_path, output_path):
     # ============================================================================
     
     # Select template thickness based on thickness with most top holes
-    template_thickness = select_model_template(pecas_3d)
+    template_thickness = select_model_template(pecas_3d, rules)
     if not template_thickness:
-        template_thickness = DEFAULT_TEMPLATE_THICKNESS
+        template_thickness = rules.default_template_thickness
     
     print(f"Using template thickness: {template_thickness}")
     
@@ -1822,15 +2078,21 @@ def processar_json_entrada(input_path, output_path):
     # ============================================================================
     
     # Add systematic holes to all pieces (avoiding connection areas)
-    for peca in pecas_3d:
-        adicionar_holes_sistematicos(peca, template_thickness)
+    # In lazy mode this happens after connection areas are known (see below)
+    if not lazy_holes:
+        counters.set_step("systematic_holes")
+        memory_profile.mark("systematic_holes", pecas_3d)
+        for peca in pecas_3d:
+            adicionar_holes_sistematicos(peca, template_thickness)
     
     # ============================================================================
     # STEP 5: INFER CONNECTIONS BETWEEN PIECES
     # ============================================================================
     
     # Detect connections between pieces using proximity detection
-    connections = detect_connections_by_proximity(pecas_3d)
+    counters.set_step("connections")
+    memory_profile.mark("connections", pecas_3d)
+    connections = detect_connections_by_proximity(pecas_3d, workers=workers, parallel_mode=parallel_mode)
     print(f"Found {len(connections)} connections")
     
     # ============================================================================
@@ -1838,6 +2100,8 @@ def processar_json_entrada(input_path, output_path):
     # ============================================================================
     
     # First pass: Create connection areas so we know where to place holes
+    counters.set_step("connection_areas")
+    memory_profile.mark("connection_areas", pecas_3d)
     create_aligned_connection_areas(pecas_3d, connections)
     
     # ============================================================================
@@ -1848,72 +2112,86 @@ def processar_json_entrada(input_path, output_path):
     ensure_all_pieces_have_connection_areas(pecas_3d, connections)
     
     # ============================================================================
-    # STEP 6: MAP HOLES BETWEEN CONNECTED PIECES
+    # STEP 4 (LAZY MODE): ALLOCATE OBJECTIVE HOLES ONLY WHERE CONNECTION AREAS EXIST
     # ============================================================================
     
-    # Second pass: Map holes between connected pieces inside connection areas
-    map_holes_between_pieces(pecas_3d, connections, template_thickness)
+    if lazy_holes:
+        counters.set_step("systematic_holes")
+        memory_profile.mark("systematic_holes", pecas_3d)
+        for peca in pecas_3d:
+            adicionar_holes_sistematicos(peca, template_thickness, clip_to_areas=True)
     
     # ============================================================================
-    # STEP 13: CLEAN HOLES OUTSIDE CONNECTION AREAS
+    # STEP 6: MAP HOLES BETWEEN CONNECTED PIECES
     # ============================================================================
     
-    # Clean holes outside connection areas and unconnected holes
-    clean_holes_outside_connection_areas(pecas_3d)
+    # Second pass: Map holes between connected pieces inside connection areas
+    counters.set_step("map_holes")
+    memory_profile.mark("map_holes", pecas_3d)
+    map_holes_between_pieces(pecas_3d, connections, template_thickness)
     
     # ============================================================================
-    # STEP 7: ADD SINGER REINFORCEMENT HOLES
+    # STEPS 13, 7, 14, 17: PER-PIECE FINISHING (OPTIONALLY ACROSS A POOL)
     # ============================================================================
     
-    # Step 7: Add singer holes on opposite faces to mirror connection areas
-    add_singer_holes_step7(pecas_3d, template_thickness)
+    # Don't add extra singer holes for simple models
+    add_missing_faces = len(pecas_3d) > 3  # Only for complex models
+    # Decided on the whole design here, since each pooled chunk only sees its own pieces
+    skip_legs_and_panels = (any(is_leg_piece(p) for p in pecas_3d)
+                            and any(is_panel_piece(p) for p in pecas_3d))
+    memory_profile.mark("finish_pieces", pecas_3d)
+    output = {"pieces": map_chunks(finalizar_pecas, pecas_3d, template_thickness, add_missing_faces,
+                                   skip_legs_and_panels, workers=workers, mode=parallel_mode)}
+    memory_profile.mark(None, output["pieces"])
+
+    if counters.is_enabled():
+        output["counters"] = counters.report()
+    if memory_profile.is_enabled():
+        output["memory"] = memory_profile.report()
+    return output
+
+def processar_json_entrada(input_path, output_path, profile_dir=None, lazy_holes=False, workers=None, parallel_mode="thread",
+                           mapped_input=False, render_path=None, drilling_budget=None, binary_path=None, rules=None):
+    """Main processing function following the guide's step-by-step flow"""
     
     # ============================================================================
-    # STEP 14: ENSURE ALL PIECES HAVE FACES
+    # STEP 1-2: INPUT DATA PREPROCESSING & DIMENSIONS
     # ============================================================================
     
-    # Ensure all pieces have at least the systematic holes we defined
-    # Don't add extra singer holes for simple models
-    if len(pecas_3d) > 3:  # Only for complex models
-        ensure_all_pieces_have_faces(pecas_3d, template_thickness)
-
-    # ============================================================================
-    # STEP 17: STRUCTURE FINAL JSON
-    # ============================================================================
+    data = carregar_json_entrada(input_path, mapped=mapped_input)
+    output = processar_dados(data, profile_dir=profile_dir, lazy_holes=lazy_holes,
+                             workers=workers, parallel_mode=parallel_mode, rules=rules)
     
-    # Build output JSON
-    output = {"pieces": []}
-    for p in pecas_3d:
-        peca_json = {
-            "name": p["name"],
-            "length": format_number(p["length"]),
-            "height": format_number(p["height"]),
-            "thickness": format_number(p["thickness"]),
-            "quantity": 1,
-            "faces": []
-        }
-        
-        for face_name, face_data in p["faces"].items():
-            # Include faces that have holes OR connection areas (not requiring both)
-            if face_data["holes"] or face_data["connectionAreas"]:
-                peca_json["faces"].append({
-                    "faceSide": face_name,
-                    "holes": face_data["holes"],
-                    "connectionAreas": face_data["connectionAreas"]
-                })
-        
-        output["pieces"].append(peca_json)
+    # Optional CNC post-processing: order holes per face and tool to shorten spindle travel
+    if drilling_budget:
+        output["drilling"] = optimize_drilling(output, drilling_budget)
+        print(f"Drilling travel saved: {output['drilling']['travel_saved']}mm ({output['drilling']['saved_percent']}%)")
 
     print(f"Writing output with {len(output['pieces'])} pieces")
     with open(output_path, "w", encoding='utf-8') as f:
         json.dump(output, f, indent=2, ensure_ascii=False)
     
     print(f"Output written to {output_path}")
+    
+    # Optional compact binary copy of the output (binary_output.read_binary_output reads it back)
+    if binary_path:
+        write_binary_output(output, binary_path)
+        print(f"Binary output written to {binary_path}")
+    
+    # Optional compact render payload for assembled_view.html
+    if render_path:
+        write_render_payload(output, render_path)
+        print(f"Render payload written to {render_path}")
 
 # ============================================================================
 # MAIN EXECUTION
 # ============================================================================
 
 
-# Test with input1.json to verify no changes to working output
-processar_json_entrada("input1.json", "output.json")
+if __name__ == "__main__":
+    # Test with input1.json to verify no changes to working output
+    # Set FURNITURE_PROFILE_DIR to capture a cProfile/flamegraph profile of the run
+    # and FURNITURE_RULES to a rule profile file to override the guide's values
+    processar_json_entrada("input1.json", "output.json", profile_dir=os.environ.get("FURNITURE_PROFILE_DIR"),
+                           rules=os.environ.get("FURNITURE_RULES"))
+
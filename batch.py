@@ -0,0 +1,237 @@
+import argparse
+import json
+import os
+from concurrent.futures import Future, ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import app
+import binary_output
+import counters
+import drilling
+import legs
+import memory_profile
+from rules import load_rule_profile
+from render_payload import write_render_payload
+
+# ============================================================================
+# BATCH RUNNER - PROCESS MANY DESIGNS ACROSS WORKER PROCESSES
+# ============================================================================
+#
+# A jobs file is a JSON list of jobs:
+#   [{"engine": "app", "input": "input1.json", "output": "out1.json", "profile": true}, ...]
+# "engine" is "app" (app.py pipeline) or "legs" (legs.py process_illustrator_data).
+# "profile" is optional and enables cProfile/flamegraph output for that job only.
+# "counters" is optional and adds the hot-path counters report to that job's output.
+# "memory" is optional and adds the per-step memory report (memory_profile.py) to that job's output.
+# "lazy_holes" is optional (app engine only) and generates systematic holes after connection areas.
+# "piece_workers" is optional and runs the per-piece stages of that job across a pool of that size;
+# "piece_pool" picks "thread" (default) or "process" for it.
+# "mapped_input" is optional and parses the input with streaming item extraction (memory-mapped when
+# loaded from file), keeping only the fields the engines read.
+# "render" is optional: a path where the compact render payload for assembled_view.html is written.
+# "binary_output" is optional: a path where the output is also written in the compact binary format.
+# "drilling" is optional and reorders each face's holes to shorten spindle travel (drilling.py),
+# adding the travel report as output["drilling"]; "drilling_budget" sets its time budget in seconds.
+# "rules" is optional: a rule profile file (rules.py) for that job. Each file is loaded and validated
+# once in the parent and the frozen profile is sent to the workers, so jobs with different profiles
+# share one pool; the job status reports the profile hash for keying cached results.
+# A job whose input cannot be read or whose rules file is invalid fails on its own (ok: False in its
+# status) without stopping the rest of the batch.
+#
+# run_batch pickles each parsed input to the workers and each result dict back. run_batch_shared
+# (--shared) instead stages all raw input files in one shared memory block, workers parse their
+# slice in place, and each result comes back as one compact binary payload (binary_output.py).
+# The parent decodes it and writes the JSON output, render payload and binary file. That keeps
+# IPC to one small message each way per job.
+
+DEFAULT_PROFILE_DIR = "profiles"
+
+def process_app(data, options):
+    return app.processar_dados(data, profile_dir=options.get("profile_dir"), lazy_holes=options.get("lazy_holes", False),
+                               workers=options.get("piece_workers"), parallel_mode=options.get("piece_pool", "thread"),
+                               rules=options.get("rules"))
+
+def process_legs(data, options):
+    return legs.process_illustrator_data(data, profile_dir=options.get("profile_dir"),
+                                         workers=options.get("piece_workers"), parallel_mode=options.get("piece_pool", "thread"),
+                                         rules=options.get("rules"))
+
+ENGINES = {
+    "app": {"load": app.carregar_json_entrada, "parse": app.decodificar_json_entrada, "process": process_app},
+    "legs": {"load": legs.load_input_data, "parse": legs.parse_input_data, "process": process_legs},
+}
+
+def job_options(job, profile_dir):
+    """Per-job engine options taken from the job entry"""
+    return {
+        "profile_dir": profile_dir if job.get("profile") else None,
+        "counters": job.get("counters", False),
+        "memory": job.get("memory", False),
+        "lazy_holes": job.get("lazy_holes", False),
+        "piece_workers": job.get("piece_workers"),
+        "piece_pool": job.get("piece_pool", "thread"),
+        "mapped_input": job.get("mapped_input", False),
+        "drilling": job.get("drilling", False),
+        "drilling_budget": job.get("drilling_budget", drilling.DEFAULT_TIME_BUDGET),
+        "rules": load_rule_profile(job["rules"]) if job.get("rules") else None,
+    }
+
+def job_status(job, **status):
+    """Status entry of a finished job (with the rule profile hash when the job sets a valid profile)"""
+    result = {"input": job["input"], "output": job["output"], **status}
+    if job.get("rules"):
+        try:
+            result["rules"] = load_rule_profile(job["rules"]).profile_hash()
+        except (OSError, ValueError):
+            pass  # The job failed on its profile; the error says why
+    return result
+
+def failed_future(error):
+    """Future already holding the error of a job that failed before it could be submitted"""
+    future = Future()
+    future.set_exception(error)
+    return future
+
+def run_job(engine, data, options):
+    """Run one parsed design through its engine (executed in a worker process)"""
+    # Instrumentation is switched on for this job only (and left alone when enabled for the whole process)
+    instruments = [module for module, option in ((counters, "counters"), (memory_profile, "memory"))
+                   if options.get(option) and not module.is_enabled()]
+    for module in instruments:
+        module.enable()
+    try:
+        output = ENGINES[engine]["process"](data, options)
+    finally:
+        for module in instruments:
+            module.disable()
+    if options.get("drilling"):
+        output["drilling"] = drilling.optimize_drilling(output, options.get("drilling_budget", drilling.DEFAULT_TIME_BUDGET))
+    return output
+
+def write_output(output, output_path):
+    """Write an engine result the same way the engines do"""
+    with open(output_path, "w", encoding="utf-8") as f:
+        json.dump(output, f, indent=2, ensure_ascii=False)
+
+def stage_inputs(jobs):
+    """Copy every job's raw input file into one shared memory block; returns (block, [(offset, size)])
+
+    A job whose input cannot be read gets the error instead of its span, so it fails alone.
+    """
+    spans = []
+    offset = 0
+    for job in jobs:
+        try:
+            size = os.path.getsize(job["input"])
+        except OSError as e:
+            spans.append(e)
+            continue
+        spans.append((offset, size))
+        offset += size
+
+    block = shared_memory.SharedMemory(create=True, size=max(offset, 1))
+    for index, (job, span) in enumerate(zip(jobs, spans)):
+        if isinstance(span, Exception):
+            continue
+        offset, size = span
+        try:
+            with open(job["input"], "rb") as f, block.buf[offset:offset + size] as view:
+                f.readinto(view)
+        except OSError as e:
+            spans[index] = e
+    return block, spans
+
+def run_shared_job(engine, block_name, offset, size, source, options):
+    """Parse one staged input from shared memory and run it (worker side)
+
+    Returns the output in the compact binary format; the parent renders every file from it.
+    """
+    block = shared_memory.SharedMemory(name=block_name)
+    try:
+        with block.buf[offset:offset + size] as view:
+            data = ENGINES[engine]["parse"](view, source, compact=options.get("mapped_input", False))
+    finally:
+        block.close()
+    return binary_output.encode(run_job(engine, data, options))
+
+def run_batch(jobs, workers=None, profile_dir=DEFAULT_PROFILE_DIR):
+    """Run all jobs in a process pool and write their outputs; returns one status dict per job"""
+    results = []
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = []
+        for job in jobs:
+            # A missing input or invalid rules file fails that job only
+            try:
+                data = ENGINES[job["engine"]]["load"](job["input"], mapped=job.get("mapped_input", False))
+                futures.append(executor.submit(run_job, job["engine"], data, job_options(job, profile_dir)))
+            except Exception as e:
+                futures.append(failed_future(e))
+
+        for job, future in zip(jobs, futures):
+            try:
+                output = future.result()
+                write_output(output, job["output"])
+                if job.get("render"):
+                    write_render_payload(output, job["render"])
+                if job.get("binary_output"):
+                    binary_output.write_binary_output(output, job["binary_output"])
+                results.append(job_status(job, ok=True))
+            except Exception as e:
+                print(f"ERROR: job {job['input']} failed: {e}")
+                results.append(job_status(job, ok=False, error=str(e)))
+    return results
+
+def run_batch_shared(jobs, workers=None, profile_dir=DEFAULT_PROFILE_DIR):
+    """Like run_batch, but inputs go through shared memory and results come back in the compact binary format"""
+    results = []
+    block, spans = stage_inputs(jobs)
+    try:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = []
+            for job, span in zip(jobs, spans):
+                # An unreadable input or invalid rules file fails that job only
+                try:
+                    if isinstance(span, Exception):
+                        raise span
+                    offset, size = span
+                    futures.append(executor.submit(run_shared_job, job["engine"], block.name, offset, size, job["input"],
+                                                   job_options(job, profile_dir)))
+                except Exception as e:
+                    futures.append(failed_future(e))
+
+            for job, future in zip(jobs, futures):
+                try:
+                    payload = future.result()
+                    output = binary_output.decode(payload)
+                    write_output(output, job["output"])
+                    if job.get("render"):
+                        write_render_payload(output, job["render"])
+                    if job.get("binary_output"):
+                        with open(job["binary_output"], "wb") as f:
+                            f.write(payload)
+                    results.append(job_status(job, ok=True))
+                except Exception as e:
+                    print(f"ERROR: job {job['input']} failed: {e}")
+                    results.append(job_status(job, ok=False, error=str(e)))
+    finally:
+        block.close()
+        block.unlink()
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description="Process a batch of furniture designs")
+    parser.add_argument("jobs", help="JSON file with the list of jobs")
+    parser.add_argument("--workers", type=int, default=None, help="number of worker processes")
+    parser.add_argument("--profile-dir", default=DEFAULT_PROFILE_DIR, help="where profiled jobs write .prof/.collapsed files")
+    parser.add_argument("--shared", action="store_true", help="stage inputs in shared memory and return encoded outputs")
+    args = parser.parse_args()
+
+    with open(args.jobs, "r", encoding="utf-8") as f:
+        jobs = json.load(f)
+    runner = run_batch_shared if args.shared else run_batch
+    results = runner(jobs, workers=args.workers, profile_dir=args.profile_dir)
+    failed = [r for r in results if not r["ok"]]
+    print(f"Processed {len(results)} jobs, {len(failed)} failed")
+
+if __name__ == "__main__":
+    main()
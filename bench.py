@@ -0,0 +1,190 @@
+import argparse
+import contextlib
+import copy
+import hashlib
+import io
+import json
+import math
+import os
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import app
+import legs
+
+# ============================================================================
+# GOLDEN-OUTPUT REGRESSION BENCHMARK
+# ============================================================================
+#
+# Runs the sample inputs and generated large designs through the engine entry points
+# (app.processar_json_entrada, legs.process_illustrator_data) and records per case:
+#   output_hash        sha256 of the JSON the entry point produces (the golden output)
+#   median_ms, p95_ms  wall time over the timed repeats (after one warm-up run); p95 is reported
+#                      only, since with a handful of repeats it is just the slowest run
+#   peak_alloc_kb      tracemalloc peak during one extra, untimed run
+#   retained_blocks    memory blocks still allocated after that run (growth hints at leaks/caches)
+# `--save` stores the results as the baseline; a normal run compares against it and exits with
+# status 1 when an output changes, a case's median time / peak allocation / retained blocks grow more
+# than the threshold allows, or the cases run and the baseline's cases differ (re-save after changing CASES).
+# Baselines are machine specific: save one on the machine that runs the gate.
+
+DEFAULT_BASELINE = "bench_baseline.json"
+DEFAULT_REPEAT = 7
+DEFAULT_THRESHOLD = 0.20      # Allowed relative regression (20%)
+MIN_SLACK_MS = 2.0            # Timing noise floor for the small samples
+MIN_SLACK_BLOCKS = 500        # Retained block noise floor (interpreter caches, interned strings)
+
+# Generated designs: the sample replicated side by side (copies of every piece, shifted in x)
+LARGE_DESIGN_COPIES = 25
+LARGE_DESIGN_SPACING = 60.0   # cm between copies
+
+CASES = [
+    ("app", "input1.json", 1), ("app", "input2.json", 1), ("app", "input3.json", 1),
+    ("app", "input2.json", LARGE_DESIGN_COPIES),
+    ("legs", "input1.json", 1), ("legs", "input2.json", 1), ("legs", "input3.json", 1),
+    ("legs", "input3.json", LARGE_DESIGN_COPIES),
+]
+
+def replicate_design(data, copies, spacing=LARGE_DESIGN_SPACING):
+    """Design with `copies` copies of every piece side by side (names suffixed with the copy index)"""
+    result = copy.deepcopy(data)
+    for index in range(1, copies):
+        for layer, source in zip(result["layers"], data["layers"]):
+            for item in source["items"]:
+                item = copy.deepcopy(item)
+                item["nome"] = f"{item['nome']} {index}"
+                if layer["name"] != "vista lateral":
+                    item["posicao"]["x"] += index * spacing
+                layer["items"].append(item)
+    return result
+
+def case_name(engine, input_path, copies):
+    name = f"{engine}:{os.path.splitext(os.path.basename(input_path))[0]}"
+    return name if copies == 1 else f"{name}x{copies}"
+
+def prepare_case(engine, input_path, copies, work_dir):
+    """Zero-argument callable running one case through its entry point and returning the output text"""
+    if engine == "app":
+        source = input_path
+        if copies > 1:
+            source = os.path.join(work_dir, f"{case_name(engine, input_path, copies).replace(':', '_')}.json")
+            with open(source, "w", encoding="latin-1") as f:
+                json.dump(replicate_design(app.carregar_json_entrada(input_path), copies), f, ensure_ascii=False)
+        output_path = os.path.join(work_dir, "output.json")
+
+        def run():
+            app.processar_json_entrada(source, output_path)
+            with open(output_path, "r", encoding="utf-8") as f:
+                return f.read()
+    else:
+        data = legs.load_input_data(input_path)
+        if copies > 1:
+            data = replicate_design(data, copies)
+
+        def run():
+            return json.dumps(legs.process_illustrator_data(data), indent=2, ensure_ascii=False)
+    return run
+
+def percentile(values, fraction):
+    """Nearest-rank percentile of a list of numbers"""
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, math.ceil(fraction * len(ordered)) - 1))]
+
+def measure(run, repeat):
+    """Benchmark one case"""
+    output = run()  # Warm-up (imports, caches) and golden output
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        run()
+        times.append((time.perf_counter() - start) * 1000)
+
+    tracemalloc.start()
+    blocks_before = sys.getallocatedblocks()
+    run()
+    _, peak = tracemalloc.get_traced_memory()
+    retained = sys.getallocatedblocks() - blocks_before
+    tracemalloc.stop()
+    return {
+        "output_hash": hashlib.sha256(output.encode("utf-8")).hexdigest(),
+        "median_ms": round(statistics.median(times), 2),
+        "p95_ms": round(percentile(times, 0.95), 2),
+        "peak_alloc_kb": round(peak / 1024, 1),
+        "retained_blocks": max(retained, 0),
+    }
+
+def run_benchmark(repeat=DEFAULT_REPEAT, cases=CASES):
+    """{case name: measurements} for every case (engine prints are discarded)"""
+    results = {}
+    with tempfile.TemporaryDirectory() as work_dir, contextlib.redirect_stdout(io.StringIO()):
+        for engine, input_path, copies in cases:
+            results[case_name(engine, input_path, copies)] = measure(prepare_case(engine, input_path, copies, work_dir), repeat)
+    return results
+
+def compare(results, baseline, threshold=DEFAULT_THRESHOLD):
+    """Regressions of results against the baseline, as messages (empty when the gate passes)"""
+    failures = [f"{name}: in baseline but not run" for name in baseline if name not in results]
+    for name, current in results.items():
+        previous = baseline.get(name)
+        if previous is None:
+            failures.append(f"{name}: not in baseline")
+            continue
+        if current["output_hash"] != previous["output_hash"]:
+            failures.append(f"{name}: output changed")
+        limit = max(previous["median_ms"] * (1 + threshold), previous["median_ms"] + MIN_SLACK_MS)
+        if current["median_ms"] > limit:
+            failures.append(f"{name}: median_ms {current['median_ms']} > {round(limit, 2)} (baseline {previous['median_ms']})")
+        limit = previous["peak_alloc_kb"] * (1 + threshold)
+        if current["peak_alloc_kb"] > limit:
+            failures.append(f"{name}: peak_alloc_kb {current['peak_alloc_kb']} > {round(limit, 1)} (baseline {previous['peak_alloc_kb']})")
+        limit = max(previous["retained_blocks"] * (1 + threshold), previous["retained_blocks"] + MIN_SLACK_BLOCKS)
+        if current["retained_blocks"] > limit:
+            failures.append(f"{name}: retained_blocks {current['retained_blocks']} > {round(limit)} (baseline {previous['retained_blocks']})")
+    return failures
+
+def print_table(results, baseline):
+    print(f"{'case':<18} {'median ms':>10} {'p95 ms':>10} {'peak KB':>10} {'blocks':>8}  vs baseline")
+    for name, current in results.items():
+        previous = baseline.get(name)
+        change = f"{100.0 * (current['median_ms'] / previous['median_ms'] - 1):+.1f}%" if previous and previous["median_ms"] else "new"
+        print(f"{name:<18} {current['median_ms']:>10} {current['p95_ms']:>10} {current['peak_alloc_kb']:>10} "
+              f"{current['retained_blocks']:>8}  {change}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Golden-output regression benchmark of the engine entry points")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="baseline file to compare against (or write with --save)")
+    parser.add_argument("--save", action="store_true", help="store this run as the baseline instead of comparing")
+    parser.add_argument("--repeat", type=int, default=DEFAULT_REPEAT, help="timed runs per case")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD, help="allowed relative regression (0.2 = 20%%)")
+    parser.add_argument("--report", help="also write this run's results here")
+    args = parser.parse_args()
+
+    results = run_benchmark(args.repeat)
+    if args.report:
+        with open(args.report, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+    if args.save:
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        print_table(results, {})
+        print(f"Baseline written to {args.baseline}")
+        return
+
+    if not os.path.exists(args.baseline):
+        sys.exit(f"No baseline at {args.baseline}; run with --save first")
+    with open(args.baseline, "r", encoding="utf-8") as f:
+        baseline = json.load(f)
+    print_table(results, baseline)
+    failures = compare(results, baseline, args.threshold)
+    if failures:
+        print(f"\nREGRESSION ({len(failures)}):")
+        for failure in failures:
+            print(f"  {failure}")
+        sys.exit(1)
+    print("\nNo regressions")
+
+if __name__ == "__main__":
+    main()
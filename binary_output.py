@@ -0,0 +1,215 @@
+import argparse
+import json
+import math
+import struct
+import zlib
+
+# ============================================================================
+# COMPACT BINARY OUTPUT FORMAT
+# ============================================================================
+#
+# Alternative encoding of the engine outputs for archives and machine controllers. Any JSON
+# value round-trips exactly (key order, int vs float, nested shapes), so decode() gives back
+# the same structure and json.dump of it the same text.
+#
+#   file   = MAGIC + zlib(body)
+#   body   = strings + shapes + value
+#   strings: varint count, then per string varint byte length + UTF-8 bytes (all keys and
+#            string values, each stored once)
+#   shapes : varint count, then per shape varint key count + key string ids (the key tuple of
+#            each distinct object layout, e.g. every hole with the same keys shares one shape)
+#   value  : tag byte + payload (see TAG_*); objects store their shape id and then only values
+#
+# Integral floats (10.0, 125.0) are stored as varints with their own tag, so the common
+# coordinates need one or two bytes instead of eight.
+
+MAGIC = b"FJB1"
+
+TAG_NULL = 0
+TAG_FALSE = 1
+TAG_TRUE = 2
+TAG_INT = 3          # zigzag varint
+TAG_INT_FLOAT = 4    # float with an integral value, zigzag varint
+TAG_FLOAT = 5        # float64, little endian
+TAG_STRING = 6       # varint string id
+TAG_ARRAY = 7        # varint length, values
+TAG_OBJECT = 8       # varint shape id, values in key order
+
+FLOAT64 = struct.Struct("<d")
+
+def write_varint(out, value):
+    while value > 0x7F:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+
+def zigzag(value):
+    return value * 2 if value >= 0 else -value * 2 - 1
+
+def unzigzag(value):
+    return value >> 1 if not value & 1 else -((value + 1) >> 1)
+
+def is_integral_float(value):
+    """Floats stored exactly as integers (not -0.0, nan or inf)"""
+    return math.isfinite(value) and value == int(value) and not (value == 0 and math.copysign(1.0, value) < 0)
+
+class Encoder:
+    """Collects interned strings and object shapes while encoding one value"""
+
+    def __init__(self):
+        self.strings = {}
+        self.shapes = {}
+        self.values = bytearray()
+
+    def string_id(self, text):
+        return self.strings.setdefault(text, len(self.strings))
+
+    def shape_id(self, keys):
+        shape = self.shapes.get(keys)
+        if shape is None:
+            shape = self.shapes[keys] = len(self.shapes)
+            for key in keys:
+                self.string_id(key)
+        return shape
+
+    def encode(self, value):
+        out = self.values
+        if value is None:
+            out.append(TAG_NULL)
+        elif value is True:
+            out.append(TAG_TRUE)
+        elif value is False:
+            out.append(TAG_FALSE)
+        elif isinstance(value, int):
+            out.append(TAG_INT)
+            write_varint(out, zigzag(value))
+        elif isinstance(value, float):
+            if is_integral_float(value):
+                out.append(TAG_INT_FLOAT)
+                write_varint(out, zigzag(int(value)))
+            else:
+                out.append(TAG_FLOAT)
+                out += FLOAT64.pack(value)
+        elif isinstance(value, str):
+            out.append(TAG_STRING)
+            write_varint(out, self.string_id(value))
+        elif isinstance(value, (list, tuple)):
+            out.append(TAG_ARRAY)
+            write_varint(out, len(value))
+            for item in value:
+                self.encode(item)
+        elif isinstance(value, dict):
+            keys = tuple(str(key) for key in value)
+            out.append(TAG_OBJECT)
+            write_varint(out, self.shape_id(keys))
+            for item in value.values():
+                self.encode(item)
+        else:
+            raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+    def body(self):
+        out = bytearray()
+        write_varint(out, len(self.strings))
+        for text in self.strings:
+            data = text.encode("utf-8")
+            write_varint(out, len(data))
+            out += data
+        write_varint(out, len(self.shapes))
+        strings = self.strings
+        for keys in self.shapes:
+            write_varint(out, len(keys))
+            for key in keys:
+                write_varint(out, strings[key])
+        return bytes(out + self.values)
+
+def encode(value):
+    """Encode a JSON value into the compact binary format"""
+    encoder = Encoder()
+    encoder.encode(value)
+    return MAGIC + zlib.compress(encoder.body(), 9)
+
+class Decoder:
+    def __init__(self, body):
+        self.data = body
+        self.pos = 0
+
+    def varint(self):
+        result = shift = 0
+        data = self.data
+        while True:
+            byte = data[self.pos]
+            self.pos += 1
+            result |= (byte & 0x7F) << shift
+            if byte < 0x80:
+                return result
+            shift += 7
+
+    def tables(self):
+        self.strings = []
+        for _ in range(self.varint()):
+            size = self.varint()
+            self.strings.append(self.data[self.pos:self.pos + size].decode("utf-8"))
+            self.pos += size
+        self.shapes = []
+        for _ in range(self.varint()):
+            self.shapes.append(tuple(self.strings[self.varint()] for _ in range(self.varint())))
+
+    def value(self):
+        tag = self.data[self.pos]
+        self.pos += 1
+        if tag == TAG_OBJECT:
+            keys = self.shapes[self.varint()]
+            return {key: self.value() for key in keys}
+        if tag == TAG_ARRAY:
+            return [self.value() for _ in range(self.varint())]
+        if tag == TAG_STRING:
+            return self.strings[self.varint()]
+        if tag == TAG_INT_FLOAT:
+            return float(unzigzag(self.varint()))
+        if tag == TAG_INT:
+            return unzigzag(self.varint())
+        if tag == TAG_FLOAT:
+            value = FLOAT64.unpack_from(self.data, self.pos)[0]
+            self.pos += FLOAT64.size
+            return value
+        if tag == TAG_NULL:
+            return None
+        if tag == TAG_TRUE:
+            return True
+        if tag == TAG_FALSE:
+            return False
+        raise ValueError(f"Unknown tag {tag} at byte {self.pos - 1}")
+
+def decode(data):
+    """Decode the compact binary format back into the JSON value"""
+    if bytes(data[:len(MAGIC)]) != MAGIC:
+        raise ValueError("Not a compact binary output (bad magic)")
+    decoder = Decoder(zlib.decompress(data[len(MAGIC):]))
+    decoder.tables()
+    return decoder.value()
+
+def write_binary_output(output, path):
+    with open(path, "wb") as f:
+        f.write(encode(output))
+
+def read_binary_output(path):
+    with open(path, "rb") as f:
+        return decode(f.read())
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert outputs between JSON and the compact binary format")
+    parser.add_argument("command", choices=["encode", "decode"])
+    parser.add_argument("source")
+    parser.add_argument("target")
+    args = parser.parse_args()
+
+    if args.command == "encode":
+        with open(args.source, "r", encoding="utf-8") as f:
+            write_binary_output(json.load(f), args.target)
+    else:
+        # Same formatting as the engines use for their JSON output
+        with open(args.target, "w", encoding="utf-8") as f:
+            json.dump(read_binary_output(args.source), f, indent=2, ensure_ascii=False)
+
+if __name__ == "__main__":
+    main()
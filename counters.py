@@ -0,0 +1,58 @@
+import os
+from collections import Counter
+
+# ============================================================================
+# HOT-PATH COUNTERS - NO-OP UNLESS ENABLED
+# ============================================================================
+#
+# Engines call counters.count("hole_created", face_name) etc. on their hot paths.
+# By default `count` is a no-op; enable() swaps in the real implementation.
+# Counts are keyed by the current pipeline step (set_step) and the face type.
+# Set FURNITURE_COUNTERS=1 to enable them for a whole process.
+
+_counts = Counter()
+_step = None
+
+def _noop(event, face, amount=1):
+    pass
+
+def _count(event, face, amount=1):
+    if amount:
+        _counts[(_step, face, event)] += amount
+
+count = _noop
+
+def enable():
+    """Start counting (also clears previous counts)"""
+    global count
+    reset()
+    count = _count
+
+def disable():
+    """Stop counting; count() becomes a no-op again"""
+    global count
+    count = _noop
+
+def is_enabled():
+    return count is _count
+
+def set_step(name):
+    """Attribute following counts to a pipeline step"""
+    global _step
+    _step = name
+
+def reset():
+    """Clear all counts and the current step"""
+    global _step
+    _counts.clear()
+    _step = None
+
+def report():
+    """Counts as {step: {face: {event: n}}}, in first-seen order"""
+    result = {}
+    for (step, face, event), amount in _counts.items():
+        result.setdefault(str(step), {}).setdefault(str(face), {})[event] = amount
+    return result
+
+if os.environ.get("FURNITURE_COUNTERS"):
+    enable()
@@ -0,0 +1,130 @@
+import math
+import time
+
+# ============================================================================
+# DRILLING-PATH OPTIMIZER - ORDER HOLES PER FACE AND TOOL
+# ============================================================================
+#
+# The engines list holes per face in the order they were generated. optimize_drilling
+# reorders them in place so the spindle travels less: holes are grouped by tool
+# (diameter + ferragemSymbols, groups kept in first-seen order so tool changes stay the
+# same), each group is ordered nearest-neighbour first and then improved with 2-opt while
+# the time budget lasts. The spindle starts each face at the face origin and each tool
+# group starts where the previous one ended.
+
+# Default time budget for one output (seconds)
+DEFAULT_TIME_BUDGET = 1.0
+
+# Spindle start position on every face (face-local mm)
+FACE_ORIGIN = (0.0, 0.0)
+
+def tool_key(hole):
+    """Holes drilled with the same tool: same diameter and hardware"""
+    return (hole.get("diameter"), tuple(hole.get("ferragemSymbols", ())))
+
+def path_length(start, points):
+    """Travel from start through points in order"""
+    total = 0.0
+    x, y = start
+    for px, py in points:
+        total += math.hypot(px - x, py - y)
+        x, y = px, py
+    return total
+
+def nearest_neighbour(start, points):
+    """Indices of points in greedy nearest-neighbour order from start"""
+    remaining = list(range(len(points)))
+    order = []
+    x, y = start
+    while remaining:
+        best = min(remaining, key=lambda i: (points[i][0] - x) ** 2 + (points[i][1] - y) ** 2)
+        remaining.remove(best)
+        order.append(best)
+        x, y = points[best]
+    return order
+
+def two_opt(start, points, order, deadline):
+    """Improve an open path (fixed start, free end) by segment reversals until no gain or deadline
+
+    Returns (order, converged).
+    """
+    path = [start] + [points[i] for i in order]
+    order = [None] + list(order)
+    n = len(path)
+    dist = lambda a, b: math.hypot(a[0] - b[0], a[1] - b[1])
+    improved = True
+    while improved:
+        improved = False
+        for i in range(1, n - 1):
+            if time.perf_counter() > deadline:
+                return order[1:], False
+            a, b = path[i - 1], path[i]
+            for k in range(i + 1, n):
+                c = path[k]
+                if k + 1 < n:
+                    d = path[k + 1]
+                    delta = dist(a, c) + dist(b, d) - dist(a, b) - dist(c, d)
+                else:
+                    delta = dist(a, c) - dist(a, b)
+                if delta < -1e-9:
+                    path[i:k + 1] = path[i:k + 1][::-1]
+                    order[i:k + 1] = order[i:k + 1][::-1]
+                    b = path[i]
+                    improved = True
+    return order[1:], True
+
+def order_face_holes(holes, deadline):
+    """Reorder one face's holes by tool group; returns (holes, converged)"""
+    groups = {}
+    for hole in holes:
+        groups.setdefault(tool_key(hole), []).append(hole)
+
+    ordered = []
+    converged = True
+    position = FACE_ORIGIN
+    for group in groups.values():
+        points = [(hole["x"], hole["y"]) for hole in group]
+        order = nearest_neighbour(position, points)
+        order, done = two_opt(position, points, order, deadline)
+        converged = converged and done
+        ordered.extend(group[i] for i in order)
+        position = points[order[-1]]
+    return ordered, converged
+
+def optimize_drilling(output, time_budget=DEFAULT_TIME_BUDGET):
+    """Reorder the holes of every face of an engine output in place; returns the travel report
+
+    When the time budget runs out, the remaining groups keep their nearest-neighbour order
+    ("converged" is then False).
+    """
+    deadline = time.perf_counter() + time_budget
+    faces = holes = 0
+    travel_before = travel_after = 0.0
+    converged = True
+    for piece in output["pieces"]:
+        for face in piece["faces"]:
+            if len(face["holes"]) < 2:
+                continue
+            before = path_length(FACE_ORIGIN, [(hole["x"], hole["y"]) for hole in face["holes"]])
+            ordered, done = order_face_holes(face["holes"], deadline)
+            after = path_length(FACE_ORIGIN, [(hole["x"], hole["y"]) for hole in ordered])
+            if after < before:
+                face["holes"] = ordered
+            else:
+                after = before
+            faces += 1
+            holes += len(ordered)
+            travel_before += before
+            travel_after += after
+            converged = converged and done
+
+    saved = travel_before - travel_after
+    return {
+        "faces": faces,
+        "holes": holes,
+        "travel_before": round(travel_before, 1),
+        "travel_after": round(travel_after, 1),
+        "travel_saved": round(saved, 1),
+        "saved_percent": round(100.0 * saved / travel_before, 1) if travel_before else 0.0,
+        "converged": converged,
+    }
@@ -0,0 +1,185 @@
+import codecs
+import json
+import mmap
+import re
+from contextlib import contextmanager
+
+# ============================================================================
+# MEMORY-MAPPED INPUT WITH STREAMING ITEM EXTRACTION
+# ============================================================================
+#
+# Large exports carry much more than the engines read. map_file exposes the file as a
+# buffer without reading it into the heap, and parse_layers decodes it in chunks and walks the
+# JSON one item at a time, keeping only the fields the engines use, so neither the full text
+# nor the full parsed tree is built:
+#   {"layers": [{"name": ..., "items": [{"nome": ..., "posicao": ..., "dimensoes": ...}]}]}
+
+# Item fields read by app.py and legs.py
+ITEM_FIELDS = ("nome", "posicao", "dimensoes")
+
+WHITESPACE = re.compile(r"[ \t\n\r]*")
+_decoder = json.JSONDecoder()
+
+# Bytes decoded per read from a mapped buffer
+CHUNK_SIZE = 1 << 16
+
+@contextmanager
+def map_file(path):
+    """Read-only memory map of a file (an empty bytes object for empty files)"""
+    with open(path, "rb") as f:
+        if f.seek(0, 2) == 0:
+            yield b""
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            yield mapped
+
+class _Reader:
+    """Sliding window of decoded text over a str or a byte buffer
+
+    Positions are relative to the window. Buffers are decoded incrementally, CHUNK_SIZE bytes at a
+    time; the parser drops the text before each array element (discard), so only the element being
+    parsed is held as text.
+    """
+
+    def __init__(self, source, encoding=None, chunk_size=CHUNK_SIZE):
+        self.streaming = not isinstance(source, str)
+        if not self.streaming:
+            self.text = source
+            self.buffer = None
+        else:
+            self.text = ""
+            self.buffer = memoryview(source).cast("B")
+            self.decoder = codecs.getincrementaldecoder(encoding)()
+            self.read_pos = 0
+            self.chunk_size = chunk_size
+
+    def fill(self):
+        """Decode more of the buffer into the window (at least as much as it already holds, so
+        re-parsing a value that spans many chunks stays linear); False at the end of the buffer"""
+        if self.buffer is None:
+            return False
+        end = min(len(self.buffer), self.read_pos + max(self.chunk_size, len(self.text)))
+        final = end == len(self.buffer)
+        self.text += self.decoder.decode(self.buffer[self.read_pos:end].tobytes(), final)
+        self.read_pos = end
+        if final:
+            self.close()
+        return True
+
+    def close(self):
+        """Release the buffer (a mapped file can only be closed once no view of it is left)"""
+        if self.buffer is not None:
+            self.buffer.release()
+            self.buffer = None
+
+    def discard(self, pos):
+        """Drop the text before pos when streaming; returns the new position of pos"""
+        if not self.streaming:
+            return pos
+        self.text = self.text[pos:]
+        return 0
+
+    def skip(self, pos):
+        while True:
+            pos = WHITESPACE.match(self.text, pos).end()
+            if pos < len(self.text) or not self.fill():
+                return pos
+
+    def startswith(self, char, pos):
+        while pos >= len(self.text) and self.fill():
+            pass
+        return self.text.startswith(char, pos)
+
+    def value(self, pos):
+        """Decode the JSON value at pos; values reaching the end of the window (possibly cut, like
+        a number) are decoded again with more text"""
+        while True:
+            try:
+                value, end = _decoder.raw_decode(self.text, pos)
+            except json.JSONDecodeError:
+                if self.fill():
+                    continue
+                raise
+            if end < len(self.text) or not self.fill():
+                return value, end
+
+    def error(self, message, pos):
+        return json.JSONDecodeError(message, self.text, pos)
+
+def _expect(reader, pos, char):
+    pos = reader.skip(pos)
+    if not reader.startswith(char, pos):
+        raise reader.error(f"Expecting {char!r}", pos)
+    return reader.skip(pos + 1)
+
+def _parse_value(reader, pos):
+    return reader.value(pos)
+
+def _parse_object(reader, pos, members):
+    """Parse the object at pos; keys in members are parsed by their function, other values are skipped.
+
+    Returns ({key: value} for the handled keys, position after the object).
+    """
+    result = {}
+    pos = _expect(reader, pos, "{")
+    if reader.startswith("}", pos):
+        return result, pos + 1
+    while True:
+        if not reader.startswith('"', pos):
+            raise reader.error("Expecting property name enclosed in double quotes", pos)
+        key, pos = _parse_value(reader, pos)
+        pos = _expect(reader, pos, ":")
+        parse = members.get(key)
+        if parse:
+            result[key], pos = parse(reader, pos)
+        else:
+            _, pos = _parse_value(reader, pos)
+        pos = reader.skip(pos)
+        if reader.startswith("}", pos):
+            return result, pos + 1
+        pos = _expect(reader, pos, ",")
+
+def _parse_array(reader, pos, parse_element):
+    """Parse the array at pos element by element; returns (list, position after the array)"""
+    elements = []
+    pos = _expect(reader, pos, "[")
+    if reader.startswith("]", pos):
+        return elements, pos + 1
+    while True:
+        element, pos = parse_element(reader, reader.discard(pos))
+        elements.append(element)
+        pos = reader.skip(pos)
+        if reader.startswith("]", pos):
+            return elements, pos + 1
+        pos = _expect(reader, pos, ",")
+
+def _parse_item(reader, pos):
+    item, pos = _parse_value(reader, pos)
+    if isinstance(item, dict):
+        item = {key: item[key] for key in ITEM_FIELDS if key in item}
+    return item, pos
+
+def _parse_items(reader, pos):
+    return _parse_array(reader, pos, _parse_item)
+
+def _parse_layer(reader, pos):
+    return _parse_object(reader, pos, {"name": _parse_value, "items": _parse_items})
+
+def _parse_layers(reader, pos):
+    return _parse_array(reader, pos, _parse_layer)
+
+def parse_layers(source, encoding="utf-8"):
+    """Parse an export keeping only the layers and the item fields the engines use
+
+    source is the JSON text, or a byte buffer (bytes, mmap, memoryview) decoded incrementally with
+    encoding, so the full text of a mapped file is never held on the heap.
+    """
+    reader = _Reader(source, encoding)
+    try:
+        data, pos = _parse_object(reader, 0, {"layers": _parse_layers})
+        pos = reader.skip(pos)
+        if pos != len(reader.text):
+            raise reader.error("Extra data", pos)
+    finally:
+        reader.close()
+    return data
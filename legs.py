@@ -1,18 +1,63 @@
 import json
 import math
-from dataclasses import dataclass
+import os
+import re
+from bisect import bisect_left, bisect_right
+from dataclasses import dataclass, field
 from typing import Optional, Tuple, List, Dict
 from collections import Counter
 
-# Configurações (valores do guia)
-MARGIN = 1.0  # Margem em mm (página 4) - 1mm per side for symmetric margins
-HOLE_DIAMETER = 8.0  # Diâmetro dos furos (página 4)
-HOLE_DEPTH_MAIN = 10.0  # Profundidade para face main (página 4)
-HOLE_DEPTH_OTHER_MAIN = 40.0  # Profundidade para singer holes (página 4)
-HOLE_DEPTH_TOP = 20.0  # Profundidade para faces de espessura (página 4)
-MAX_HOLE_SPACING = 200.0  # Distância máxima entre furos (página 2)
-MIN_OVERLAP = 10.0  # Sobreposição mínima para conexão (página 2)
-SINGER_MIN_DISTANCE = 50.0  # Distância mínima para singer_central (página 3)
+import counters
+import memory_profile
+from input_stream import map_file, parse_layers
+from parallel import allocate_ids, map_chunks
+from profiling import design_hash, profiled
+from rules import DEFAULT_RULES, RuleProfile, resolve_rules
+from vocab import (CENTRAL_HOLE_TYPE, CORNER_HOLE_TYPE, EDGE_FACES, EDGE_HOLE_TYPE, FACE_CODES, FACE_NAMES,
+                   HARDWARE_NAMES, HOLE_TYPE_CODES, HOLE_TYPE_NAMES, HOLE_TYPE_SYMBOLS, LEFT_RIGHT_FACE_CODES,
+                   LEFT_RIGHT_FACES, MAIN_FACE_CODES, MAIN_FACES, OPPOSITE_FACE, TOP_BOTTOM_FACE_CODES,
+                   TOP_BOTTOM_FACES, TOP_HOLE_TYPES, Hardware, HoleType)
+
+# Configurações (valores do guia): margens, profundidades, espaçamentos e templates ficam no
+# perfil de regras (rules.RuleProfile), guardado em cada peça
+
+# Código do tipo de furo -> (ferragem, campo de profundidade do perfil) (página 4)
+HOLE_TYPE_SPECS = {
+    HoleType.FLAP_CORNER: (Hardware.DOWEL_M_WITH_GLUE, 'hole_depth_main'),
+    HoleType.FLAP_CENTRAL: (Hardware.DOWEL_M_WITH_GLUE, 'hole_depth_main'),
+    HoleType.FACE_CENTRAL: (Hardware.DOWEL_M_WITH_GLUE, 'hole_depth_top'),
+    HoleType.TOP_CORNER: (Hardware.GLUE, 'hole_depth_top'),
+    HoleType.TOP_CENTRAL: (Hardware.GLUE, 'hole_depth_top'),
+    HoleType.SINGER_FLAP: (Hardware.DOWEL_G_WITH_GLUE, 'hole_depth_other_main'),
+    HoleType.SINGER_CENTRAL: (Hardware.DOWEL_G_WITH_GLUE, 'hole_depth_other_main'),
+    HoleType.SINGER_CHANNEL: (Hardware.DOWEL_G_WITH_GLUE, 'hole_depth_other_main'),
+}
+
+_hole_specs = {}
+
+def hole_specs(rules: RuleProfile) -> dict:
+    """Tipo de furo -> (ferragem, profundidade padrão, diâmetro, símbolo) no perfil, com as strings
+    de saída do vocabulário; montada uma vez por perfil."""
+    specs = _hole_specs.get(rules)
+    if specs is None:
+        specs = _hole_specs[rules] = {
+            HOLE_TYPE_NAMES[hole_type]: (HARDWARE_NAMES[hardware], getattr(rules, depth_field), rules.hole_diameter,
+                                         HOLE_TYPE_SYMBOLS[hole_type])
+            for hole_type, (hardware, depth_field) in HOLE_TYPE_SPECS.items()
+        }
+    return specs
+
+# Furos top (TOP_HOLE_TYPES) nas faces de espessura (EDGE_FACES) votam na espessura do template (página 4)
+
+# Tipos de peça reconhecidos pelo nome, num único padrão compilado (o lookahead acha ocorrências
+# sobrepostas, então 'subtampo' também é 'tampo', como no teste de substring)
+PIECE_KINDS = ('perna', 'fundo', 'tampo')
+PIECE_KIND_MATCHER = re.compile('(?=({}))'.format('|'.join(PIECE_KINDS)))
+
+def classify_piece_name(name: str) -> Tuple[str, frozenset]:
+    """Nome normalizado e tipos de peça contidos nele, calculados uma vez por peça."""
+    name_key = name.lower()
+    return name_key, frozenset(PIECE_KIND_MATCHER.findall(name_key))
 
 @dataclass
 class Bounds3D:
@@ -32,6 +77,181 @@ class Piece:
     thickness: float
     quantity: int
     faces: list
+    # Índices em memória (não serializados)
+    face_lookup: dict = field(default_factory=dict, init=False, repr=False, compare=False)
+    area_index: dict = field(default_factory=dict, init=False, repr=False, compare=False)
+    hole_index: dict = field(default_factory=dict, init=False, repr=False, compare=False)
+    unassigned_index: dict = field(default_factory=dict, init=False, repr=False, compare=False)
+    # Furos top nas faces de espessura, mantido por add_hole e pelas limpezas
+    top_hole_votes: int = field(default=0, init=False, repr=False, compare=False)
+    # Classificação pelo nome (classify_piece_name), feita na construção
+    name_key: str = field(default='', init=False, repr=False, compare=False)
+    kinds: frozenset = field(default=frozenset(), init=False, repr=False, compare=False)
+    # Perfil de regras da execução
+    rules: RuleProfile = field(default=DEFAULT_RULES, repr=False, compare=False)
+
+    def __post_init__(self):
+        self.name_key, self.kinds = classify_piece_name(self.name)
+
+RUNTIME_FIELDS = ('face_lookup', 'area_index', 'hole_index', 'unassigned_index', 'top_hole_votes', 'name_key', 'kinds', 'rules')
+
+class HolePositionIndex:
+    """Furos de uma face indexados pela posição arredondada, para deduplicação em O(1)."""
+
+    def __init__(self, holes: list):
+        self.holes = holes
+        self._by_position = {}
+        for hole in holes:
+            self._by_position.setdefault((hole['x'], hole['y']), hole)
+        self._size = len(holes)
+
+    def is_stale(self, holes: list) -> bool:
+        """Indica se a lista da face foi trocada ou alterada fora do índice."""
+        return holes is not self.holes or len(holes) != self._size
+
+    def get(self, x: float, y: float) -> Optional[dict]:
+        """Primeiro furo nas coordenadas exatas, se houver."""
+        return self._by_position.get((x, y))
+
+    def add(self, hole: dict):
+        """Adiciona o furo à face e ao índice."""
+        self.holes.append(hole)
+        self._by_position.setdefault((hole['x'], hole['y']), hole)
+        self._size += 1
+
+class UnassignedHoleIndex:
+    """Furos de uma face ainda sem connectionId, ordenados por x.
+
+    Cada conexão só visita os furos na faixa x do seu retângulo; os furos atribuídos saem do
+    índice. Furos acrescentados à face entram na próxima consulta.
+    """
+
+    def __init__(self, holes: list):
+        self.holes = holes
+        self._size = 0
+        self._xs = []
+        self._entries = []  # (posição na face, furo)
+        self._extend()
+
+    def is_stale(self, holes: list) -> bool:
+        """Indica se a lista da face foi trocada ou encolheu fora do índice."""
+        return holes is not self.holes or len(holes) < self._size
+
+    def _extend(self):
+        for position in range(self._size, len(self.holes)):
+            hole = self.holes[position]
+            if 'connectionId' not in hole:
+                index = bisect_right(self._xs, hole['x'])
+                self._xs.insert(index, hole['x'])
+                self._entries.insert(index, (position, hole))
+        self._size = len(self.holes)
+
+    def assign(self, x_min: float, x_max: float, y_min: float, y_max: float, connection_id: int) -> List[dict]:
+        """Atribui connection_id aos furos livres no retângulo (bordas incluídas), devolvidos na ordem da face."""
+        self._extend()
+        start = bisect_left(self._xs, x_min)
+        end = bisect_right(self._xs, x_max)
+        assigned = []
+        kept = []
+        for entry in self._entries[start:end]:
+            hole = entry[1]
+            if 'connectionId' in hole:
+                continue  # Atribuído fora do índice (add_hole em furo existente)
+            if y_min <= hole['y'] <= y_max:
+                hole['connectionId'] = connection_id
+                assigned.append(entry)
+            else:
+                kept.append(entry)
+        if len(kept) != end - start:
+            self._entries[start:end] = kept
+            self._xs[start:end] = [hole['x'] for _, hole in kept]
+        assigned.sort(key=lambda entry: entry[0])
+        return [hole for _, hole in assigned]
+
+class ConnectionAreaIndex:
+    """Índice de varredura das áreas de conexão de uma face, ordenado por x_min.
+
+    Consultas de sobreposição e de ponto fazem busca binária em x_min e só visitam a janela
+    limitada pela maior largura indexada.
+    """
+
+    def __init__(self, areas: list):
+        self.areas = areas
+        self._x_mins = []
+        self._entries = []
+        self._max_width = 0.0
+        for area in areas:
+            self._insert(area)
+
+    def is_stale(self, areas: list) -> bool:
+        """Indica se a lista da face foi trocada ou alterada fora do índice."""
+        return areas is not self.areas or len(areas) != len(self._entries)
+
+    def _insert(self, area: dict):
+        position = bisect_right(self._x_mins, area['x_min'])
+        self._x_mins.insert(position, area['x_min'])
+        self._entries.insert(position, area)
+        self._max_width = max(self._max_width, area['x_max'] - area['x_min'])
+
+    def add(self, area: dict):
+        """Adiciona a área à face e ao índice."""
+        self.areas.append(area)
+        self._insert(area)
+
+    def _window(self, x_low: float, x_high: float, inclusive: bool):
+        start = bisect_left(self._x_mins, x_low - self._max_width - 1e-9)
+        end = bisect_right(self._x_mins, x_high) if inclusive else bisect_left(self._x_mins, x_high)
+        return self._entries[start:end]
+
+    def overlaps(self, x_min: float, x_max: float, y_min: float, y_max: float) -> bool:
+        """Sobreposição estrita de retângulos (bordas encostadas não contam)."""
+        for area in self._window(x_min, x_max, inclusive=False):
+            if (x_min < area['x_max'] and x_max > area['x_min'] and
+                y_min < area['y_max'] and y_max > area['y_min']):
+                return True
+        return False
+
+    def containing(self, x: float, y: float) -> List[dict]:
+        """Áreas que contêm o ponto, bordas incluídas."""
+        return [area for area in self._window(x, x, inclusive=True)
+                if area['x_min'] <= x <= area['x_max'] and area['y_min'] <= y <= area['y_max']]
+
+def get_face(piece: Piece, face_side: str, create: bool = False) -> Optional[dict]:
+    """Retorna a face pelo lado sem varrer piece.faces, criando-a se `create`."""
+    face = piece.face_lookup.get(face_side)
+    if face is None:
+        # Faces também são adicionadas diretamente em piece.faces
+        face = next((f for f in piece.faces if f['faceSide'] == face_side), None)
+        if face is None and create:
+            face = {'faceSide': face_side, 'holes': [], 'connectionAreas': []}
+            piece.faces.append(face)
+        if face is not None:
+            piece.face_lookup[face_side] = face
+    return face
+
+def get_area_index(piece: Piece, face: dict) -> ConnectionAreaIndex:
+    """Retorna o índice de áreas da face, reconstruindo-o se a lista foi substituída."""
+    index = piece.area_index.get(face['faceSide'])
+    if index is None or index.is_stale(face['connectionAreas']):
+        index = ConnectionAreaIndex(face['connectionAreas'])
+        piece.area_index[face['faceSide']] = index
+    return index
+
+def get_hole_index(piece: Piece, face: dict) -> HolePositionIndex:
+    """Retorna o índice de furos da face, reconstruindo-o se a lista foi substituída."""
+    index = piece.hole_index.get(face['faceSide'])
+    if index is None or index.is_stale(face['holes']):
+        index = HolePositionIndex(face['holes'])
+        piece.hole_index[face['faceSide']] = index
+    return index
+
+def get_unassigned_index(piece: Piece, face: dict) -> UnassignedHoleIndex:
+    """Retorna o índice de furos sem conexão da face, reconstruindo-o se a lista foi substituída."""
+    index = piece.unassigned_index.get(face['faceSide'])
+    if index is None or index.is_stale(face['holes']):
+        index = UnassignedHoleIndex(face['holes'])
+        piece.unassigned_index[face['faceSide']] = index
+    return index
 
 def round_to_one_decimal(value: float) -> float:
     """Arredonda para 1 casa decimal, ajustando para inteiro se próximo (página 1)."""
@@ -40,51 +260,103 @@ def round_to_one_decimal(value: float) -> float:
         rounded = float(round(rounded))
     return rounded
 
-def get_overlap(a_min: float, a_max: float, b_min: float, b_max: float) -> Optional[Tuple[float, float]]:
+def get_overlap(a_min: float, a_max: float, b_min: float, b_max: float,
+                min_overlap: float = DEFAULT_RULES.min_overlap) -> Optional[Tuple[float, float]]:
     """Calcula sobreposição com mínimo de 10mm (página 2)."""
     o_min = max(a_min, b_min)
     o_max = min(a_max, b_max)
-    if o_max - o_min >= MIN_OVERLAP:
+    if o_max - o_min >= min_overlap:
         return (round_to_one_decimal(o_min), round_to_one_decimal(o_max))
     return None
 
+# Tolerância para considerar peças encostadas (mm)
+CONTACT_TOLERANCE = 1.0
+
+# Ordem de prioridade dos eixos de contato por vista (eixo primário)
+AXIS_PRIORITY = {
+    'x': ('x', 'y', 'z'),  # Vista X: conexões laterais (left-right) primeiro
+    'y': ('y', 'x', 'z'),  # Vista Y: conexões verticais primeiro
+    'z': ('z', 'y', 'x'),  # Vista Z (padrão): conexões frente-trás primeiro
+}
+
+def classify_contacts(piece_1: Piece, piece_2: Piece, x_overlap, y_overlap, z_overlap, axes: str = 'xyz') -> dict:
+    """Contato do par em cada eixo (ou None), a partir das sobreposições já calculadas.
+
+    Só os eixos em `axes` são verificados; os demais já se sabem sem contato.
+    """
+    args = (piece_1, piece_2, x_overlap, y_overlap, z_overlap, CONTACT_TOLERANCE)
+    return {
+        'x': check_x_axis_connections(*args) if 'x' in axes else None,
+        'y': check_y_axis_connections(*args) if 'y' in axes else None,
+        'z': check_z_axis_connections(*args) if 'z' in axes else None,
+        'leg_fundo': is_leg_fundo_pair(piece_1, piece_2),
+    }
+
+def select_connection(contacts: dict, primary_axis: str = 'z') -> Optional[Tuple[str, str, str, float, float, float, float]]:
+    """Conexão da vista: o primeiro contato na prioridade do eixo primário (perna-fundo: Y sempre primeiro)."""
+    if contacts['leg_fundo'] and contacts['y']:
+        return contacts['y']
+    for axis in AXIS_PRIORITY.get(primary_axis, AXIS_PRIORITY['z']):
+        if contacts[axis]:
+            return contacts[axis]
+    return None
+
 def get_connection_faces(piece_1: Piece, piece_2: Piece, primary_axis: str = 'z') -> Optional[Tuple[str, str, str, float, float, float, float]]:
     """Identifica faces conectadas e limites da sobreposição (página 2)."""
-    x_overlap = get_overlap(piece_1.bounds.x_min, piece_1.bounds.x_max, piece_2.bounds.x_min, piece_2.bounds.x_max)
-    y_overlap = get_overlap(piece_1.bounds.y_min, piece_1.bounds.y_max, piece_2.bounds.y_min, piece_2.bounds.y_max)
-    z_overlap = get_overlap(piece_1.bounds.z_min, piece_1.bounds.z_max, piece_2.bounds.z_min, piece_2.bounds.z_max)
-    
-    
-    # Tolerance for considering pieces as touching  
-    tolerance = 1.0  # 1mm tolerance as originally specified
-    
-    # Enhanced logic: Always check Y-axis first for leg-to-fundo connections
-    piece1_name = piece_1.name.lower()
-    piece2_name = piece_2.name.lower()
-    is_leg_to_fundo = ('perna' in piece1_name and 'fundo' in piece2_name) or ('fundo' in piece1_name and 'perna' in piece2_name)
-    
-    if is_leg_to_fundo:
-        # For leg-to-fundo connections, always prioritize Y-axis detection first
-        y_connection = check_y_axis_connections(piece_1, piece_2, x_overlap, y_overlap, z_overlap, tolerance)
-        if y_connection:
-            return y_connection
-    
-    # Prioritize connection types based on primary_axis for multi-view processing
-    if primary_axis == 'x':
-        # X-axis primary: prioritize lateral (left-right) connections first
-        return check_x_axis_connections(piece_1, piece_2, x_overlap, y_overlap, z_overlap, tolerance) or \
-               check_y_axis_connections(piece_1, piece_2, x_overlap, y_overlap, z_overlap, tolerance) or \
-               check_z_axis_connections(piece_1, piece_2, x_overlap, y_overlap, z_overlap, tolerance)
-    elif primary_axis == 'y':
-        # Y-axis primary: prioritize vertical connections first  
-        return check_y_axis_connections(piece_1, piece_2, x_overlap, y_overlap, z_overlap, tolerance) or \
-               check_x_axis_connections(piece_1, piece_2, x_overlap, y_overlap, z_overlap, tolerance) or \
-               check_z_axis_connections(piece_1, piece_2, x_overlap, y_overlap, z_overlap, tolerance)
-    else:
-        # Z-axis primary (default): prioritize front-back connections first
-        return check_z_axis_connections(piece_1, piece_2, x_overlap, y_overlap, z_overlap, tolerance) or \
-               check_y_axis_connections(piece_1, piece_2, x_overlap, y_overlap, z_overlap, tolerance) or \
-               check_x_axis_connections(piece_1, piece_2, x_overlap, y_overlap, z_overlap, tolerance)
+    min_overlap = piece_1.rules.min_overlap
+    x_overlap = get_overlap(piece_1.bounds.x_min, piece_1.bounds.x_max, piece_2.bounds.x_min, piece_2.bounds.x_max, min_overlap)
+    y_overlap = get_overlap(piece_1.bounds.y_min, piece_1.bounds.y_max, piece_2.bounds.y_min, piece_2.bounds.y_max, min_overlap)
+    z_overlap = get_overlap(piece_1.bounds.z_min, piece_1.bounds.z_max, piece_2.bounds.z_min, piece_2.bounds.z_max, min_overlap)
+    return select_connection(classify_contacts(piece_1, piece_2, x_overlap, y_overlap, z_overlap), primary_axis)
+
+class ContactTable:
+    """Contatos de todos os pares candidatos, calculados numa única passada.
+
+    Para cada eixo, larguras de sobreposição e folgas de todos os pares saem de colunas de limites
+    (uma lista por eixo) de uma vez; só os pares com algum eixo em contato possível (sem
+    sobreposição e com folga dentro da tolerância) passam pela classificação de faces, e só nesses
+    eixos. As vistas (eixo primário) viram apenas uma seleção sobre o resultado (select).
+    """
+
+    def __init__(self, pieces: List[Piece], pairs: List[Tuple[int, int]]):
+        tolerance = CONTACT_TOLERANCE
+        min_overlaps = [piece.rules.min_overlap for piece in pieces]
+        touching = {}
+        for axis in 'xyz':
+            mins = [getattr(piece.bounds, axis + '_min') for piece in pieces]
+            maxs = [getattr(piece.bounds, axis + '_max') for piece in pieces]
+            if axis == 'y':
+                # Em Y também conta a peça 1 inteira acima da peça 2 (ver check_y_axis_connections)
+                touching[axis] = [
+                    min(maxs[i], maxs[j]) - max(mins[i], mins[j]) < min_overlaps[i] and
+                    (mins[i] >= maxs[j] or abs(maxs[i] - mins[j]) < tolerance or abs(maxs[j] - mins[i]) < tolerance)
+                    for i, j in pairs
+                ]
+            else:
+                touching[axis] = [
+                    min(maxs[i], maxs[j]) - max(mins[i], mins[j]) < min_overlaps[i] and
+                    (abs(maxs[i] - mins[j]) <= tolerance or abs(maxs[j] - mins[i]) <= tolerance)
+                    for i, j in pairs
+                ]
+        
+        self.contacts = {}
+        for pair, x_touching, y_touching, z_touching in zip(pairs, touching['x'], touching['y'], touching['z']):
+            if x_touching or y_touching or z_touching:
+                piece_1, piece_2 = pieces[pair[0]], pieces[pair[1]]
+                overlaps = [get_overlap(getattr(piece_1.bounds, axis + '_min'), getattr(piece_1.bounds, axis + '_max'),
+                                        getattr(piece_2.bounds, axis + '_min'), getattr(piece_2.bounds, axis + '_max'),
+                                        min_overlaps[pair[0]]) for axis in 'xyz']
+                axes = 'x' * x_touching + 'y' * y_touching + 'z' * z_touching
+                self.contacts[pair] = classify_contacts(piece_1, piece_2, *overlaps, axes)
+
+    def select(self, i: int, j: int, primary_axis: str = 'z'):
+        """Conexão do par (i, j) na vista do eixo primário (mesmo resultado de get_connection_faces)."""
+        contacts = self.contacts.get((i, j))
+        return select_connection(contacts, primary_axis) if contacts else None
+
+def is_leg_fundo_pair(piece_1: Piece, piece_2: Piece) -> bool:
+    """Par perna/fundo, em qualquer ordem."""
+    return ('perna' in piece_1.kinds and 'fundo' in piece_2.kinds) or ('fundo' in piece_1.kinds and 'perna' in piece_2.kinds)
 
 def check_y_axis_connections(piece_1: Piece, piece_2: Piece, x_overlap, y_overlap, z_overlap, tolerance):
     """Check for Y-axis connections (vertical - table top to leg)."""
@@ -100,11 +372,7 @@ def check_y_axis_connections(piece_1: Piece, piece_2: Piece, x_overlap, y_overla
         has_z_connection):
         
         # Check if this is a leg-to-fundo connection
-        piece1_name = piece_1.name.lower()
-        piece2_name = piece_2.name.lower()
-        is_leg_to_fundo = ('perna' in piece1_name and 'fundo' in piece2_name) or ('fundo' in piece1_name and 'perna' in piece2_name)
-        
-        if is_leg_to_fundo:
+        if is_leg_fundo_pair(piece_1, piece_2):
             # For leg-to-fundo connections, handle both X-axis and Z-axis oriented legs
             if x_overlap is not None:
                 # X-axis oriented leg (like Perna 4, 3)
@@ -246,37 +514,29 @@ def check_z_axis_connections(piece_1: Piece, piece_2: Piece, x_overlap, y_overla
 
 def add_connection_area(piece: Piece, face_side: str, x_min: float, x_max: float, y_min: float, y_max: float, connection_id: int):
     """Adiciona área de conexão com margem simétrica de 1mm em todos os lados. Permite múltiplas CAs por face."""
-    if face_side not in [face['faceSide'] for face in piece.faces]:
-        piece.faces.append({'faceSide': face_side, 'holes': [], 'connectionAreas': []})
-    
-    face_obj = next(face for face in piece.faces if face['faceSide'] == face_side)
+    face_obj = get_face(piece, face_side, create=True)
     
-    # Apply symmetric margins on all sides (inset by MARGIN on each side)
-    x_min += MARGIN
-    x_max -= MARGIN
-    y_min += MARGIN
-    y_max -= MARGIN
+    # Apply symmetric margins on all sides (inset by the profile margin on each side)
+    margin = piece.rules.margin
+    x_min += margin
+    x_max -= margin
+    y_min += margin
+    y_max -= margin
     
     # Ensure valid dimensions after margin application
     if x_max <= x_min or y_max <= y_min:
+        counters.count('area_invalid', face_side)
         return  # Invalid area after margins
     
-    # Check for overlaps with existing connection areas
-    new_area = {
-        'x_min': x_min,
-        'x_max': x_max, 
-        'y_min': y_min,
-        'y_max': y_max
-    }
-    
-    # Strict rectangle overlap detection
-    for existing_ca in face_obj['connectionAreas']:
-        if (new_area['x_min'] < existing_ca['x_max'] and new_area['x_max'] > existing_ca['x_min'] and
-            new_area['y_min'] < existing_ca['y_max'] and new_area['y_max'] > existing_ca['y_min']):
-            return  # Overlaps with existing CA - skip adding
+    # Strict rectangle overlap detection against existing connection areas
+    area_index = get_area_index(piece, face_obj)
+    if area_index.overlaps(x_min, x_max, y_min, y_max):
+        counters.count('area_rejected', face_side)
+        return  # Overlaps with existing CA - skip adding
     
     # Add connection area
-    face_obj['connectionAreas'].append({
+    counters.count('area_created', face_side)
+    area_index.add({
         'x_min': round_to_one_decimal(x_min),
         'y_min': round_to_one_decimal(y_min),
         'x_max': round_to_one_decimal(x_max),
@@ -286,93 +546,71 @@ def add_connection_area(piece: Piece, face_side: str, x_min: float, x_max: float
         'connectionId': connection_id
     })
 
-def add_initial_holes(piece: Piece, face_side: str):
-    """Adiciona furos objetivos iniciais em todas as faces (página 2)."""
-    half_thickness = piece.thickness / 2
-    depth = HOLE_DEPTH_MAIN if face_side in ['main', 'other_main'] else HOLE_DEPTH_TOP
-    hole_type_prefix = 'flap' if face_side in ['main', 'other_main'] else 'top'
-    
-    x_max = piece.length if face_side in ['main', 'other_main', 'top', 'bottom'] else piece.thickness
-    y_max = piece.height if face_side in ['main', 'other_main', 'left', 'right'] else piece.thickness
-    
-    # Furos nos cantos
-    corners = [
-        (half_thickness, half_thickness),
-        (half_thickness, y_max - half_thickness),
-        (x_max - half_thickness, half_thickness),
-        (x_max - half_thickness, y_max - half_thickness)
-    ]
-    for x, y in corners:
-        add_hole(piece, face_side, x, y, f'{hole_type_prefix}_corner', None, depth)
-    
-    # Furos intermediários se distância > 200mm
-    if x_max - 2 * half_thickness > MAX_HOLE_SPACING:
-        num_x_holes = int(math.ceil((x_max - 2 * half_thickness) / MAX_HOLE_SPACING)) + 1
-        step_x = (x_max - 2 * half_thickness) / (num_x_holes - 1)
-        for i in range(1, num_x_holes - 1):
-            x = half_thickness + i * step_x
-            add_hole(piece, face_side, x, half_thickness, f'{hole_type_prefix}_central', None, depth)
-            add_hole(piece, face_side, x, y_max - half_thickness, f'{hole_type_prefix}_central', None, depth)
-    
-    if y_max - 2 * half_thickness > MAX_HOLE_SPACING:
-        num_y_holes = int(math.ceil((y_max - 2 * half_thickness) / MAX_HOLE_SPACING)) + 1
-        step_y = (y_max - 2 * half_thickness) / (num_y_holes - 1)
-        for i in range(1, num_y_holes - 1):
-            y = half_thickness + i * step_y
-            add_hole(piece, face_side, half_thickness, y, f'{hole_type_prefix}_central', None, depth)
-            add_hole(piece, face_side, x_max - half_thickness, y, f'{hole_type_prefix}_central', None, depth)
+def get_hole_spec(hole_type: str, rules: RuleProfile = DEFAULT_RULES) -> Tuple[str, float, float, str]:
+    """Ferragem, profundidade, diâmetro e símbolo do tipo de furo (página 4)."""
+    spec = hole_specs(rules).get(hole_type)
+    if spec is None:
+        spec = ('glue', rules.hole_depth_top, rules.hole_diameter, hole_type.upper())
+    return spec
+
+def count_top_hole_votes(face_side: str, holes: List[Dict]) -> int:
+    """Quantos furos da lista votam na espessura do template (página 4)."""
+    if face_side not in EDGE_FACES:
+        return 0
+    return sum(1 for hole in holes if hole['type'] in TOP_HOLE_TYPES)
 
-def add_hole(piece: Piece, face_side: str, x: float, y: float, hole_type: str, connection_id: Optional[int], depth: float):
+def add_hole(piece: Piece, face_side: str, x: float, y: float, hole_type: str, connection_id: Optional[int], depth: Optional[float], target_type: str = '20'):
     """Adiciona um furo com hardware apropriado (página 4)."""
-    if face_side not in [face['faceSide'] for face in piece.faces]:
-        piece.faces.append({'faceSide': face_side, 'holes': [], 'connectionAreas': []})
+    face_obj = get_face(piece, face_side, create=True)
     
     # Prevent duplicate holes at the same coordinates
     rounded_x = round_to_one_decimal(x)
     rounded_y = round_to_one_decimal(y)
     
-    for face in piece.faces:
-        if face['faceSide'] == face_side:
-            # Check if hole already exists at these coordinates
-            for existing_hole in face['holes']:
-                if (existing_hole['x'] == rounded_x and 
-                    existing_hole['y'] == rounded_y):
-                    # Update existing hole with connection_id if needed
-                    if connection_id is not None and 'connectionId' not in existing_hole:
-                        existing_hole['connectionId'] = connection_id
-                    return  # Don't add duplicate hole
+    # Check if hole already exists at these coordinates
+    hole_index = get_hole_index(piece, face_obj)
+    existing_hole = hole_index.get(rounded_x, rounded_y)
+    if existing_hole is not None:
+        # Update existing hole with connection_id if needed
+        if connection_id is not None and 'connectionId' not in existing_hole:
+            existing_hole['connectionId'] = connection_id
+        counters.count('hole_deduped', face_side)
+        return  # Don't add duplicate hole
     
-    ferragem = 'dowel_M_with_glue' if hole_type in ['flap_corner', 'flap_central', 'face_central'] else \
-               'dowel_G_with_glue' if hole_type in ['singer_flap', 'singer_central', 'singer_channel'] else \
-               'glue'
+    ferragem, default_depth, diameter, symbol = get_hole_spec(hole_type, piece.rules)
     
     hole = {
         'x': rounded_x,
         'y': rounded_y,
         'type': hole_type,
-        'targetType': '20',
+        'targetType': target_type,
         'ferragemSymbols': [ferragem],
         'ring': True,
         'color': 'blue',
-        'symbol': hole_type.upper(),
-        'depth': depth,
-        'diameter': HOLE_DIAMETER
+        'symbol': symbol,
+        'depth': default_depth if depth is None else depth,
+        'diameter': diameter
     }
     if connection_id is not None:
         hole['connectionId'] = connection_id
     
-    for face in piece.faces:
-        if face['faceSide'] == face_side:
-            face['holes'].append(hole)
+    counters.count('hole_created', face_side)
+    hole_index.add(hole)
+    if face_side in EDGE_FACES and hole_type in TOP_HOLE_TYPES:
+        piece.top_hole_votes += 1
 
 def add_initial_holes(piece: Piece, face_side: str):
     """Adiciona furos objetivos iniciais em todas as faces (página 2)."""
     half_thickness = piece.thickness / 2
-    depth = HOLE_DEPTH_MAIN if face_side in ['main', 'other_main'] else HOLE_DEPTH_TOP
-    hole_type_prefix = 'flap' if face_side in ['main', 'other_main'] else 'top'
+    face = FACE_CODES[face_side]
+    is_main = face in MAIN_FACE_CODES
+    rules = piece.rules
+    depth = rules.hole_depth_main if is_main else rules.hole_depth_top
+    corner_type = HOLE_TYPE_NAMES[CORNER_HOLE_TYPE[face]]
+    central_type = HOLE_TYPE_NAMES[CENTRAL_HOLE_TYPE[face]]
     
-    x_max = piece.length if face_side in ['main', 'other_main', 'top', 'bottom'] else piece.thickness
-    y_max = piece.height if face_side in ['main', 'other_main', 'left', 'right'] else piece.thickness
+    x_max = piece.thickness if face in LEFT_RIGHT_FACE_CODES else piece.length
+    y_max = piece.thickness if face in TOP_BOTTOM_FACE_CODES else piece.height
     
     # Furos nos cantos
     corners = [
@@ -382,42 +620,41 @@ def add_initial_holes(piece: Piece, face_side: str):
         (x_max - half_thickness, y_max - half_thickness)
     ]
     for x, y in corners:
-        add_hole(piece, face_side, x, y, f'{hole_type_prefix}_corner', None, depth)
+        add_hole(piece, face_side, x, y, corner_type, None, depth)
     
     # Furos intermediários se distância > 200mm
-    if x_max - 2 * half_thickness > MAX_HOLE_SPACING:
-        num_x_holes = int(math.ceil((x_max - 2 * half_thickness) / MAX_HOLE_SPACING)) + 1
+    if x_max - 2 * half_thickness > rules.max_hole_spacing:
+        num_x_holes = int(math.ceil((x_max - 2 * half_thickness) / rules.max_hole_spacing)) + 1
         step_x = (x_max - 2 * half_thickness) / (num_x_holes - 1)
         for i in range(1, num_x_holes - 1):
             x = half_thickness + i * step_x
-            add_hole(piece, face_side, x, half_thickness, f'{hole_type_prefix}_central', None, depth)
-            add_hole(piece, face_side, x, y_max - half_thickness, f'{hole_type_prefix}_central', None, depth)
+            add_hole(piece, face_side, x, half_thickness, central_type, None, depth)
+            add_hole(piece, face_side, x, y_max - half_thickness, central_type, None, depth)
     
-    if y_max - 2 * half_thickness > MAX_HOLE_SPACING:
-        num_y_holes = int(math.ceil((y_max - 2 * half_thickness) / MAX_HOLE_SPACING)) + 1
+    if y_max - 2 * half_thickness > rules.max_hole_spacing:
+        num_y_holes = int(math.ceil((y_max - 2 * half_thickness) / rules.max_hole_spacing)) + 1
         step_y = (y_max - 2 * half_thickness) / (num_y_holes - 1)
         for i in range(1, num_y_holes - 1):
             y = half_thickness + i * step_y
-            add_hole(piece, face_side, half_thickness, y, f'{hole_type_prefix}_central', None, depth)
-            add_hole(piece, face_side, x_max - half_thickness, y, f'{hole_type_prefix}_central', None, depth)
+            add_hole(piece, face_side, half_thickness, y, central_type, None, depth)
+            add_hole(piece, face_side, x_max - half_thickness, y, central_type, None, depth)
 
 def clean_holes_outside_connection_areas(piece: Piece):
     """Remove furos objetivos fora das áreas de conexão (página 3)."""
     for face in piece.faces:
+        area_index = get_area_index(piece, face)
         valid_holes = []
         for hole in face['holes']:
             if 'connectionId' in hole:
-                in_area = False
-                for area in face['connectionAreas']:
-                    if (area['x_min'] <= hole['x'] <= area['x_max'] and
-                        area['y_min'] <= hole['y'] <= area['y_max'] and
-                        area['connectionId'] == hole['connectionId']):
-                        in_area = True
-                        break
+                in_area = any(area['connectionId'] == hole['connectionId']
+                              for area in area_index.containing(hole['x'], hole['y']))
                 if in_area:
                     valid_holes.append(hole)
             else:
                 valid_holes.append(hole)  # Manter furos sem connectionId (ex.: singer)
+        counters.count('hole_cleaned', face['faceSide'], len(face['holes']) - len(valid_holes))
+        if len(valid_holes) != len(face['holes']):
+            piece.top_hole_votes -= count_top_hole_votes(face['faceSide'], face['holes']) - count_top_hole_votes(face['faceSide'], valid_holes)
         face['holes'] = valid_holes
 
 def calculate_face_coordinates(piece: Piece, face_side: str, axis: str, min_1: float, max_1: float, min_2: float, max_2: float) -> Tuple[float, float, float, float]:
@@ -427,13 +664,13 @@ def calculate_face_coordinates(piece: Piece, face_side: str, axis: str, min_1: f
     # This positions CA at the real connection area, not face center
     
     if axis == 'y':  # Vertical connections (table top to leg)
-        if face_side in ['main', 'other_main']:
+        if face_side in MAIN_FACES:
             # For main faces: X overlap maps to X, Z overlap maps to Y
             x_min = max(0, min_1 - piece.bounds.x_min)
             x_max = min(piece.length, max_1 - piece.bounds.x_min)
             y_min = max(0, min_2 - piece.bounds.z_min)
             y_max = min(piece.height, max_2 - piece.bounds.z_min)
-        elif face_side in ['top', 'bottom']:
+        elif face_side in TOP_BOTTOM_FACES:
             # For top/bottom faces: X overlap maps to X, Z overlap maps to Y
             x_min = max(0, min_1 - piece.bounds.x_min)
             x_max = min(piece.length, max_1 - piece.bounds.x_min)
@@ -447,13 +684,13 @@ def calculate_face_coordinates(piece: Piece, face_side: str, axis: str, min_1: f
             y_max = min(piece.height, max_1 - piece.bounds.y_min)
                 
     elif axis == 'x':  # Lateral connections (left to right)
-        if face_side in ['main', 'other_main']:
+        if face_side in MAIN_FACES:
             # For main faces: Y overlap maps to X, Z overlap maps to Y
             x_min = max(0, min_1 - piece.bounds.y_min)
             x_max = min(piece.height, max_1 - piece.bounds.y_min)
             y_min = max(0, min_2 - piece.bounds.z_min)
             y_max = min(piece.length, max_2 - piece.bounds.z_min)
-        elif face_side in ['left', 'right']:
+        elif face_side in LEFT_RIGHT_FACES:
             # For left/right faces: Y overlap maps to X, Z overlap maps to Y
             x_min = max(0, min_1 - piece.bounds.y_min)
             x_max = min(piece.height, max_1 - piece.bounds.y_min)
@@ -467,13 +704,13 @@ def calculate_face_coordinates(piece: Piece, face_side: str, axis: str, min_1: f
             y_max = min(piece.thickness, max_2 - piece.bounds.z_min)
                 
     else:  # axis == 'z' - Front/back connections
-        if face_side in ['main', 'other_main']:
+        if face_side in MAIN_FACES:
             # For main faces: X overlap maps to X, Y overlap maps to Y
             x_min = max(0, min_1 - piece.bounds.x_min)
             x_max = min(piece.length, max_1 - piece.bounds.x_min)
             y_min = max(0, min_2 - piece.bounds.y_min)
             y_max = min(piece.height, max_2 - piece.bounds.y_min)
-        elif face_side in ['top', 'bottom']:
+        elif face_side in TOP_BOTTOM_FACES:
             # For top/bottom faces: X overlap maps to X, Y overlap maps to Y
             x_min = max(0, min_1 - piece.bounds.x_min)
             x_max = min(piece.length, max_1 - piece.bounds.x_min)
@@ -489,12 +726,12 @@ def calculate_face_coordinates(piece: Piece, face_side: str, axis: str, min_1: f
     # Ensure valid coordinates (all positive, x_min < x_max, y_min < y_max)
     if x_max <= x_min or y_max <= y_min or x_min < 0 or y_min < 0:
         # Fallback to edge-positioned small area (without margins - will be applied later)
-        if face_side in ['left', 'right']:
+        if face_side in LEFT_RIGHT_FACES:
             x_min = 0
             x_max = min(50.0, piece.thickness)
             y_min = 0
             y_max = min(20.0, piece.height)
-        elif face_side in ['top', 'bottom']:
+        elif face_side in TOP_BOTTOM_FACES:
             x_min = 0
             x_max = min(50.0, piece.length)
             y_min = 0
@@ -509,43 +746,51 @@ def calculate_face_coordinates(piece: Piece, face_side: str, axis: str, min_1: f
 
 def add_singer_holes(piece: Piece, main_holes: List[Dict], connection_id: int, face_side: str):
     """Adiciona furos singer na face oposta (página 3)."""
-    opposite_face = 'other_main' if face_side == 'main' else 'main'
-    for hole in main_holes:
-        x, y = hole['x'], piece.height - hole['y']  # Espelhar verticalmente
-        hole_type = 'singer_flap' if (abs(x - piece.thickness / 2) < 0.05 or abs(x - piece.length + piece.thickness / 2) < 0.05 or
-                                      abs(y - piece.thickness / 2) < 0.05 or abs(y - piece.height + piece.thickness / 2) < 0.05) else 'singer_central'
-        if hole_type == 'singer_central' and (min(x, piece.length - x, y, piece.height - y) < SINGER_MIN_DISTANCE):
+    opposite_face = FACE_NAMES[OPPOSITE_FACE[FACE_CODES[face_side]]]
+    half_thickness = piece.thickness / 2
+    
+    # Espelhar verticalmente e classificar todos os furos de uma vez
+    mirrored = [(hole['x'], piece.height - hole['y']) for hole in main_holes]
+    singer_holes = []
+    for x, y in mirrored:
+        is_flap = (abs(x - half_thickness) < 0.05 or abs(x - piece.length + half_thickness) < 0.05 or
+                   abs(y - half_thickness) < 0.05 or abs(y - piece.height + half_thickness) < 0.05)
+        if not is_flap and min(x, piece.length - x, y, piece.height - y) < piece.rules.singer_min_distance:
             continue
-        add_hole(piece, opposite_face, x, y, hole_type, None, HOLE_DEPTH_OTHER_MAIN)
-
-def map_holes_to_connection(piece_1: Piece, piece_2: Piece, connection_id: int, face_1: str, face_2: str, x_min: float, x_max: float, y_min_1: float, y_max_1: float, y_min_2: float, y_max_2: float):
-    """Mapeia furos subjetivos nas áreas de conexão pareadas (página 3)."""
-    holes_1 = []
-    for face in piece_1.faces:
-        if face['faceSide'] == face_1:
-            for hole in face['holes']:
-                if 'connectionId' in hole and hole['connectionId'] == connection_id:
-                    holes_1.append(hole)
+        singer_holes.append((x, y, 'singer_flap' if is_flap else 'singer_central'))
     
+    # Deduplicação na face oposta via índice de posições (add_hole)
+    for x, y, hole_type in singer_holes:
+        add_hole(piece, opposite_face, x, y, hole_type, None, piece.rules.hole_depth_other_main)
+
+def map_holes_to_connection(piece_1: Piece, piece_2: Piece, connection_id: int, face_1: str, face_2: str, x_min: float, x_max: float, y_min_1: float, y_max_1: float, y_min_2: float, y_max_2: float, holes_1: List[dict]):
+    """Mapeia furos subjetivos nas áreas de conexão pareadas (página 3).
+
+    `holes_1` são os furos da face 1 com o connectionId da conexão, na ordem da face.
+    """
     # Mapear furos subjetivos na peça secundária
     x_length = x_max - x_min
     y_length = y_max_2 - y_min_2
     for hole in holes_1:
         x = hole['x'] - x_min
         y = hole['y'] - y_min_1 + y_min_2
-        if face_2 in ['top', 'bottom']:
+        if face_2 in TOP_BOTTOM_FACES:
             y = (y_min_2 + y_max_2) / 2  # Centralizar na espessura
-        hole_type = 'top_corner' if hole['type'] == 'flap_corner' else 'top_central' if hole['type'] == 'flap_central' else 'face_central'
+        hole_type = HOLE_TYPE_NAMES[EDGE_HOLE_TYPE.get(HOLE_TYPE_CODES.get(hole['type']), HoleType.FACE_CENTRAL)]
         if 0 <= x <= x_length and 0 <= y <= y_length:
-            add_hole(piece_2, face_2, x, y, hole_type, connection_id, HOLE_DEPTH_TOP)
+            add_hole(piece_2, face_2, x, y, hole_type, connection_id, piece_2.rules.hole_depth_top)
     
     # Adicionar furos singer na face oposta da peça principal (se face-topo)
-    if face_1 in ['main', 'other_main'] and face_2 in ['top', 'bottom', 'left', 'right']:
+    if face_1 in MAIN_FACES and face_2 in EDGE_FACES:
         add_singer_holes(piece_1, holes_1, connection_id, face_1)
 
-def create_connection(piece_1: Piece, piece_2: Piece, connection_id: int):
-    """Cria conexão entre peças, com áreas e furos (páginas 2-4)."""
-    connection = get_connection_faces(piece_1, piece_2)
+def create_connection(piece_1: Piece, piece_2: Piece, connection_id: int, connection=None):
+    """Cria conexão entre peças, com áreas e furos (páginas 2-4).
+
+    `connection` é a conexão do par na vista Z, se já calculada (ContactTable.select).
+    """
+    if connection is None:
+        connection = get_connection_faces(piece_1, piece_2)
     if not connection:
         return
     
@@ -559,107 +804,86 @@ def create_connection(piece_1: Piece, piece_2: Piece, connection_id: int):
     add_connection_area(piece_1, face_1, x_min_1, x_max_1, y_min_1, y_max_1, connection_id)
     add_connection_area(piece_2, face_2, x_min_2, x_max_2, y_min_2, y_max_2, connection_id)
     
-    # Atribuir connectionId aos furos objetivos dentro da área
-    for face in piece_1.faces:
-        if face['faceSide'] == face_1:
-            for hole in face['holes']:
-                if ('connectionId' not in hole and
-                    x_min_1 <= hole['x'] <= x_max_1 and
-                    y_min_1 <= hole['y'] <= y_max_1):
-                    hole['connectionId'] = connection_id
-    
-    for face in piece_2.faces:
-        if face['faceSide'] == face_2:
-            for hole in face['holes']:
-                if ('connectionId' not in hole and
-                    x_min_2 <= hole['x'] <= x_max_2 and
-                    y_min_2 <= hole['y'] <= y_max_2):
-                    hole['connectionId'] = connection_id
+    # Atribuir connectionId aos furos objetivos dentro da área (só os furos ainda livres na faixa)
+    holes_1 = get_unassigned_index(piece_1, get_face(piece_1, face_1)).assign(x_min_1, x_max_1, y_min_1, y_max_1, connection_id)
+    get_unassigned_index(piece_2, get_face(piece_2, face_2)).assign(x_min_2, x_max_2, y_min_2, y_max_2, connection_id)
     
     # Mapear furos subjetivos
-    map_holes_to_connection(piece_1, piece_2, connection_id, face_1, face_2, x_min_1, x_max_1, y_min_1, y_max_1, x_min_2, y_max_2)
+    map_holes_to_connection(piece_1, piece_2, connection_id, face_1, face_2, x_min_1, x_max_1, y_min_1, y_max_1, x_min_2, y_max_2, holes_1)
+
+# Passos da detecção; a chave (passo, i, j) de cada par define a ordem dos ids
+PRIMARY_PASS, SECONDARY_PASS, FUNDO_PASS = range(3)
 
-def process_single_axis_connections(pieces: List[Piece], main_piece: Piece) -> int:
-    """Process connections primarily from Z-axis with targeted Y-axis for leg-to-fundo connections."""
-    connection_id = 1
-    all_connections = []  # Store all detected connections to avoid duplicates
+def detect_pair_connections(keyed_pairs: List[Tuple[int, int, int]], pieces: List[Piece], contacts: ContactTable) -> List[tuple]:
+    """Conexões candidatas de um lote de pares (passo, i, j), sem efeitos colaterais.
+
+    Retorna (chave do par, chave da conexão, conexão a criar) para os pares com contato.
+    """
+    detected = []
+    for pair_key in keyed_pairs:
+        step, i, j = pair_key
+        connection = contacts.select(i, j, 'y' if step == FUNDO_PASS else 'z')
+        if not connection:
+            continue
+        axis, face_1, face_2 = connection[:3]
+        if step == SECONDARY_PASS and not should_allow_secondary_connection(pieces[i], pieces[j], axis):
+            continue
+        # Leg-to-fundo: a conexão é criada com a geometria da vista Z do mesmo par
+        build = contacts.select(i, j, 'z') if step == FUNDO_PASS else connection
+        detected.append((pair_key, (pieces[i].name, pieces[j].name, axis, face_1, face_2), build))
+    return detected
+
+def process_single_axis_connections(pieces: List[Piece], main_piece: Piece, first_connection_id: int = 1,
+                                    workers: Optional[int] = None, parallel_mode: str = 'thread') -> int:
+    """Process connections primarily from Z-axis with targeted Y-axis for leg-to-fundo connections.
+
+    Os pares são detectados em lotes (map_chunks) e os ids saem da ordem das chaves (passo, i, j)
+    por soma de prefixos, então são os mesmos em execuções seriais e paralelas. Retorna o próximo id livre.
+    """
+    all_connections = set()  # Store all detected connections to avoid duplicates
     
     print("Single-axis connection processing:")
     
-    # Primary Z-axis processing (this was working well)
-    connections_z = 0
+    # Candidate pairs of both views, classified once in a single pass
+    main_index = next(i for i, piece in enumerate(pieces) if piece is main_piece)
+    others = [i for i in range(len(pieces)) if i != main_index]
+    primary_pairs = [(main_index, j) for j in others]
+    secondary_pairs = [(i, j) for position, i in enumerate(others) for j in others[position + 1:]]
+    fundo_index = next((i for i, piece in enumerate(pieces) if 'fundo' in piece.kinds), None)
+    fundo_pairs = [] if fundo_index is None else [(i, fundo_index) for i, piece in enumerate(pieces) if 'perna' in piece.kinds]
+    contacts = ContactTable(pieces, list(dict.fromkeys(primary_pairs + secondary_pairs + fundo_pairs)))
+    
+    # Primary connections: main piece to others (Z-axis); secondary: piece to piece (Z-axis only,
+    # selective); targeted Y-axis for leg-to-fundo connections only
+    keyed_pairs = ([(PRIMARY_PASS, i, j) for i, j in primary_pairs] +
+                   [(SECONDARY_PASS, i, j) for i, j in secondary_pairs] +
+                   [(FUNDO_PASS, i, j) for i, j in fundo_pairs])
+    detected = map_chunks(detect_pair_connections, keyed_pairs, pieces, contacts, workers=workers, mode=parallel_mode)
+    
+    # A primeira ocorrência de cada conexão, na ordem das chaves, fica com ela
+    planned = []
+    for pair_key, connection_key, connection in sorted(detected, key=lambda entry: entry[0]):
+        if connection_key not in all_connections:
+            all_connections.add(connection_key)
+            planned.append((pair_key, connection))
+    first_ids, next_connection_id = allocate_ids([1] * len(planned), first_connection_id)
+    
+    for ((step, i, j), connection), connection_id in zip(planned, first_ids):
+        create_connection(pieces[i], pieces[j], connection_id, connection)
+    
+    connections_y = sum(1 for (step, _, _), _ in planned if step == FUNDO_PASS)
     print(f"  Processing Z-axis primary view...")
-    
-    # Primary connections: main piece to others (Z-axis)
-    for piece in pieces:
-        if piece != main_piece:
-            connection = get_connection_faces(main_piece, piece, 'z')
-            if connection:
-                axis, face_1, face_2, min_1, max_1, min_2, max_2 = connection
-                connection_key = (main_piece.name, piece.name, axis, face_1, face_2)
-                
-                if connection_key not in all_connections:
-                    create_connection(main_piece, piece, connection_id)
-                    all_connections.append(connection_key)
-                    connection_id += 1
-                    connections_z += 1
-    
-    # Secondary connections: piece to piece (Z-axis only, selective)
-    for i, piece1 in enumerate(pieces):
-        for j, piece2 in enumerate(pieces):
-            if i < j and piece1 != main_piece and piece2 != main_piece:
-                connection = get_connection_faces(piece1, piece2, 'z')
-                if connection:
-                    axis, face_1, face_2, min_1, max_1, min_2, max_2 = connection
-                    connection_key = (piece1.name, piece2.name, axis, face_1, face_2)
-                    
-                    # Apply selective filtering for secondary connections
-                    if connection_key not in all_connections and should_allow_secondary_connection(piece1, piece2, axis):
-                        create_connection(piece1, piece2, connection_id)
-                        all_connections.append(connection_key)
-                        connection_id += 1
-                        connections_z += 1
-    
-    print(f"    Found {connections_z} connections from Z-axis view")
-    
-    # Targeted Y-axis processing for leg-to-fundo connections only
-    connections_y = 0
+    print(f"    Found {len(planned) - connections_y} connections from Z-axis view")
     print(f"  Processing targeted Y-axis for leg-to-fundo connections...")
-    
-    # Find fundo piece
-    fundo_piece = None
-    for piece in pieces:
-        if 'fundo' in piece.name.lower():
-            fundo_piece = piece
-            break
-    
-    if fundo_piece:
-        # Check each leg for Y-axis connection to fundo
-        for piece in pieces:
-            if 'perna' in piece.name.lower():
-                connection = get_connection_faces(piece, fundo_piece, 'y')
-                if connection:
-                    axis, face_1, face_2, min_1, max_1, min_2, max_2 = connection
-                    connection_key = (piece.name, fundo_piece.name, axis, face_1, face_2)
-                    
-                    if connection_key not in all_connections:
-                        create_connection(piece, fundo_piece, connection_id)
-                        all_connections.append(connection_key)
-                        connection_id += 1
-                        connections_y += 1
-    
     print(f"    Found {connections_y} leg-to-fundo connections from Y-axis view")
     print(f"  Single-axis processing complete: {len(all_connections)} unique connections found")
-    return connection_id
+    return next_connection_id
 
 def should_allow_secondary_connection(piece1: Piece, piece2: Piece, axis: str) -> bool:
     """Determine if a secondary connection should be allowed based on piece types and axis."""
     # Prevent leg-to-leg connections (they should only connect to fundo, tampo, subtampo)
-    piece1_name = piece1.name.lower()
-    piece2_name = piece2.name.lower()
-    
     # If both pieces are legs, don't allow connection
-    if 'perna' in piece1_name and 'perna' in piece2_name:
+    if 'perna' in piece1.kinds and 'perna' in piece2.kinds:
         return False
     
     # Allow X and Z axis connections (lateral and front-back)
@@ -684,12 +908,32 @@ def should_allow_secondary_connection(piece1: Piece, piece2: Piece, axis: str) -
     
     return False
 
-def create_systematic_connection_areas(pieces: List[Piece], next_connection_id: int):
-    """Create connection areas based on systematic pattern - preserve multi-view CAs and add systematic ones."""
-    connection_id = next_connection_id
+# Systematic CAs per piece type: one per edge face on the fundo, and per face on legs
+FUNDO_EDGE_AREA_FACES = ('top', 'bottom', 'left', 'right')
+LEG_AREA_COUNTS = {'top': 1, 'main': 2}
+
+def systematic_area_count(piece: Piece) -> int:
+    """Connection ids the systematic connection areas of a piece take (same branches as create_systematic_connection_areas)."""
+    if piece.name_key in ('tampo', 'subtampo'):
+        return 1
+    if piece.name_key == 'fundo':
+        return len(FUNDO_EDGE_AREA_FACES)
+    if 'perna' in piece.name_key:
+        return sum(LEG_AREA_COUNTS.values())
+    return 1
+
+def create_systematic_connection_areas(pieces: List[Piece], next_connection_id: int) -> int:
+    """Create connection areas based on systematic pattern - preserve multi-view CAs and add systematic ones.
+
+    Each piece's ids come from a prefix sum of systematic_area_count in piece order, so they do not
+    depend on the order the pieces are processed in. The creators return the next id they would
+    use, which is checked against the allocation. Returns the next free connection id.
+    """
+    counts = [systematic_area_count(piece) for piece in pieces]
+    first_ids, next_free_id = allocate_ids(counts, next_connection_id)
     
     # Calculate reference size for identical tampo/subtampo CAs from actual piece data
-    tampo_subtampo_pieces = [p for p in pieces if 'tampo' in p.name.lower()]
+    tampo_subtampo_pieces = [p for p in pieces if 'tampo' in p.kinds]
     if tampo_subtampo_pieces:
         # Use the smallest dimension from tampo/subtampo pieces as reference
         # This ensures both tampo and subtampo get identical CA dimensions
@@ -697,34 +941,30 @@ def create_systematic_connection_areas(pieces: List[Piece], next_connection_id:
     else:
         reference_size = None
     
-    for piece in pieces:
+    for piece, connection_id, count in zip(pieces, first_ids, counts):
         # Determine piece type and create appropriate systematic connection areas
-        piece_name_lower = piece.name.lower()
+        piece_name_lower = piece.name_key
         
         if piece_name_lower == 'tampo':
             # Clear existing CAs for tampo and create identical CA
             for face in piece.faces:
                 if face['faceSide'] == 'main':
                     face['connectionAreas'] = []
-            create_identical_connection_area(piece, 'main', connection_id, reference_size)
-            connection_id += 1
+            end_id = create_identical_connection_area(piece, 'main', connection_id, reference_size)
         elif piece_name_lower == 'subtampo':
             # Clear ALL CAs for subtampo (multi-view may add unwanted CAs to other faces)
             for face in piece.faces:
                 face['connectionAreas'] = []
-            create_identical_connection_area(piece, 'main', connection_id, reference_size)
-            connection_id += 1
+            end_id = create_identical_connection_area(piece, 'main', connection_id, reference_size)
         elif piece_name_lower == 'fundo':
             # For fundo: clear ALL CAs and ensure we have ONLY 4 edge CAs (no main face CA)
             for face in piece.faces:
                 face['connectionAreas'] = []
-            connection_id = create_fundo_edge_only_connection_areas(piece, connection_id)
+            end_id = create_fundo_edge_only_connection_areas(piece, connection_id)
         elif 'perna' in piece_name_lower:
             # For legs: clear systematic CAs and preserve only necessary detected CAs
-            if 'top' not in [face['faceSide'] for face in piece.faces]:
-                piece.faces.append({'faceSide': 'top', 'holes': [], 'connectionAreas': []})
-            if 'main' not in [face['faceSide'] for face in piece.faces]:
-                piece.faces.append({'faceSide': 'main', 'holes': [], 'connectionAreas': []})
+            get_face(piece, 'top', create=True)
+            get_face(piece, 'main', create=True)
             
             # Clear systematic CAs from top and main faces only (preserve edge face CAs from detection)
             for face in piece.faces:
@@ -756,22 +996,27 @@ def create_systematic_connection_areas(pieces: List[Piece], next_connection_id:
                     face['connectionAreas'] = valid_cas
             
             # Add 1 CA on top face and 2 CAs on main face for legs
-            connection_id = create_leg_multiple_connection_areas(piece, 'top', connection_id, pieces)
-            connection_id = create_leg_multiple_connection_areas(piece, 'main', connection_id, pieces)
+            end_id = connection_id
+            for face_side in LEG_AREA_COUNTS:
+                end_id = create_leg_multiple_connection_areas(piece, face_side, end_id, pieces)
         else:
             # Default - clear main face and create central CA
             for face in piece.faces:
                 if face['faceSide'] == 'main':
                     face['connectionAreas'] = []
-            create_central_connection_area(piece, 'main', connection_id)
-            connection_id += 1
+            end_id = create_central_connection_area(piece, 'main', connection_id)
+        
+        if end_id != connection_id + count:
+            raise RuntimeError(f"{piece.name}: systematic CAs used ids {connection_id}-{end_id - 1}, "
+                               f"but systematic_area_count allocated {count}")
+    
+    return next_free_id
 
-def create_central_connection_area(piece: Piece, face_side: str, connection_id: int):
-    """Create a central connection area on the specified face."""
-    if face_side in ['main', 'other_main']:
+def create_central_connection_area(piece: Piece, face_side: str, connection_id: int) -> int:
+    """Create a central connection area on the specified face. Returns the next connection id."""
+    if face_side in MAIN_FACES:
         # Ensure the face exists before adding CA
-        if face_side not in [face['faceSide'] for face in piece.faces]:
-            piece.faces.append({'faceSide': face_side, 'holes': [], 'connectionAreas': []})
+        get_face(piece, face_side, create=True)
         
         # Calculate central area (50% of piece dimensions)
         center_x = piece.length / 2
@@ -784,13 +1029,13 @@ def create_central_connection_area(piece: Piece, face_side: str, connection_id:
         y_max = center_y + area_size / 2
         
         add_connection_area(piece, face_side, x_min, x_max, y_min, y_max, connection_id)
+    return connection_id + 1
 
 def create_large_central_connection_area(piece: Piece, face_side: str, connection_id: int):
     """Create a large central connection area covering the whole main face (like subtampo)."""
-    if face_side in ['main', 'other_main']:
+    if face_side in MAIN_FACES:
         # Ensure the face exists before adding CA
-        if face_side not in [face['faceSide'] for face in piece.faces]:
-            piece.faces.append({'faceSide': face_side, 'holes': [], 'connectionAreas': []})
+        get_face(piece, face_side, create=True)
         
         # Create CA covering the WHOLE face with minimal margins (just for the 1mm symmetric margin that gets applied)
         # The add_connection_area function will apply 1mm margins automatically
@@ -803,10 +1048,9 @@ def create_large_central_connection_area(piece: Piece, face_side: str, connectio
 
 def create_corner_connection_areas(piece: Piece, face_side: str):
     """Create 4 corner connection areas on the specified face."""
-    if face_side in ['main', 'other_main']:
+    if face_side in MAIN_FACES:
         # Ensure the face exists before adding CAs
-        if face_side not in [face['faceSide'] for face in piece.faces]:
-            piece.faces.append({'faceSide': face_side, 'holes': [], 'connectionAreas': []})
+        get_face(piece, face_side, create=True)
         
         # Calculate corner positions
         margin = min(piece.length, piece.height) * 0.1  # 10% margin
@@ -839,13 +1083,12 @@ def create_fundo_edge_only_connection_areas(piece: Piece, start_connection_id: i
     connection_id = start_connection_id
     
     # Ensure all edge faces exist
-    for face_side in ['top', 'bottom', 'left', 'right']:
-        if face_side not in [face['faceSide'] for face in piece.faces]:
-            piece.faces.append({'faceSide': face_side, 'holes': [], 'connectionAreas': []})
+    for face_side in FUNDO_EDGE_AREA_FACES:
+        get_face(piece, face_side, create=True)
     
     # Create exactly 4 CAs - one on each edge face only
-    for face_side in ['top', 'bottom', 'left', 'right']:
-        if face_side in ['top', 'bottom']:
+    for face_side in FUNDO_EDGE_AREA_FACES:
+        if face_side in TOP_BOTTOM_FACES:
             # Top and bottom faces: full length x thickness
             add_connection_area(piece, face_side, 0, piece.length, 0, piece.thickness, connection_id)
         else:  # left, right
@@ -859,8 +1102,7 @@ def create_full_coverage_connection_area(piece: Piece, face_side: str, connectio
     """Create a full coverage connection area on the specified face."""
     if face_side == 'top':
         # Ensure the face exists before adding CA
-        if face_side not in [face['faceSide'] for face in piece.faces]:
-            piece.faces.append({'faceSide': face_side, 'holes': [], 'connectionAreas': []})
+        get_face(piece, face_side, create=True)
         
         # Full coverage for leg top faces with proper dimensions
         # Use the actual piece dimensions for accurate positioning
@@ -877,8 +1119,7 @@ def create_leg_multiple_connection_areas(piece: Piece, face_side: str, start_con
     
     if face_side == 'top':
         # Ensure the face exists before adding CAs
-        if face_side not in [face['faceSide'] for face in piece.faces]:
-            piece.faces.append({'faceSide': face_side, 'holes': [], 'connectionAreas': []})
+        get_face(piece, face_side, create=True)
         
         # Create 1 CA on the top face of legs (full coverage)
         add_connection_area(piece, face_side, 0, piece.length, 0, piece.thickness, connection_id)
@@ -886,8 +1127,7 @@ def create_leg_multiple_connection_areas(piece: Piece, face_side: str, start_con
     
     elif face_side == 'main':
         # Ensure the face exists before adding CAs
-        if face_side not in [face['faceSide'] for face in piece.faces]:
-            piece.faces.append({'faceSide': face_side, 'holes': [], 'connectionAreas': []})
+        get_face(piece, face_side, create=True)
         
         # Create 2 CAs on the main face of legs:
         # 1. Horizontal CA (existing - for leg-to-fundo connections)
@@ -910,12 +1150,12 @@ def create_leg_multiple_connection_areas(piece: Piece, face_side: str, start_con
         # Use a more robust approach to ensure ALL legs get the same dimensions
         fundo_found = False
         for other_piece in pieces:
-            if 'fundo' in other_piece.name.lower():
+            if 'fundo' in other_piece.kinds:
                 # Find the tallest edge CA (this will be the main edge CA we need)
                 best_ca = None
                 best_height = 0
                 for face in other_piece.faces:
-                    if face['faceSide'] in ['left', 'right'] and face['connectionAreas']:
+                    if face['faceSide'] in LEFT_RIGHT_FACES and face['connectionAreas']:
                         for ca in face['connectionAreas']:
                             ca_height = ca['y_max'] - ca['y_min']
                             # Look for the tallest edge CA (should be ~177.6mm)
@@ -962,12 +1202,11 @@ def create_leg_multiple_connection_areas(piece: Piece, face_side: str, start_con
     
     return connection_id
 
-def create_identical_connection_area(piece: Piece, face_side: str, connection_id: int, reference_size: float = None):
-    """Create identical connection area coordinates for tampo and subtampo (same measures)."""
-    if face_side in ['main', 'other_main']:
+def create_identical_connection_area(piece: Piece, face_side: str, connection_id: int, reference_size: float = None) -> int:
+    """Create identical connection area coordinates for tampo and subtampo (same measures). Returns the next connection id."""
+    if face_side in MAIN_FACES:
         # Ensure the face exists before adding CA
-        if face_side not in [face['faceSide'] for face in piece.faces]:
-            piece.faces.append({'faceSide': face_side, 'holes': [], 'connectionAreas': []})
+        get_face(piece, face_side, create=True)
         
         # Calculate target CA size - use reference_size for identical measures across pieces
         if reference_size is not None:
@@ -995,100 +1234,218 @@ def create_identical_connection_area(piece: Piece, face_side: str, connection_id
         y_max = min(piece.height, y_max)
         
         add_connection_area(piece, face_side, x_min, x_max, y_min, y_max, connection_id)
+    return connection_id + 1
 
 
 
-def select_model_template(pieces: List[Piece]) -> str:
-    """Seleciona template com base na espessura com mais furos top (página 4)."""
+def select_model_template(pieces: List[Piece], rules: RuleProfile = DEFAULT_RULES) -> str:
+    """Seleciona template com base na espessura com mais furos top (página 4).
+
+    Usa a contagem de furos top mantida incrementalmente em cada peça.
+    """
     thickness_counts = Counter()
     for piece in pieces:
-        for face in piece.faces:
-            if face['faceSide'] in ['top', 'bottom', 'left', 'right']:
-                for hole in face['holes']:
-                    if hole['type'] in ['top_corner', 'top_central']:
-                        thickness_counts[piece.thickness] += 1
+        if piece.top_hole_votes:
+            thickness_counts[piece.thickness] += piece.top_hole_votes
     
     if not thickness_counts:
-        return '20'
+        return format_template(rules.default_template_thickness)
     
     max_count = max(thickness_counts.values())
     candidates = [t for t, c in thickness_counts.items() if c == max_count]
-    return str(min([17, 20, 25, 30], key=lambda x: abs(x - min(candidates))))
+    return format_template(min(rules.template_thicknesses, key=lambda x: abs(x - min(candidates))))
+
+def format_template(thickness: float) -> str:
+    """Espessura do template como no targetType ('20', '17.5')."""
+    return str(int(thickness)) if thickness == int(thickness) else str(thickness)
 
 def adjust_holes_for_template(pieces: List[Piece], template_thickness: str):
-    """Ajusta furos para o template selecionado (página 4)."""
-    template_thickness = float(template_thickness)
+    """Ajusta furos para o template selecionado e grava o targetType em uma única passada (página 4)."""
+    template_value = float(template_thickness)
     for piece in pieces:
-        if piece.thickness > template_thickness + 0.05:
-            for face in piece.faces:
-                if face['faceSide'] in ['top', 'bottom', 'left', 'right']:
-                    new_holes = []
-                    for hole in face['holes']:
-                        if hole['type'] in ['top_corner', 'top_central']:
-                            x, y = hole['x'], piece.height / 2
-                            for main_face in ['main', 'other_main']:
-                                add_hole(piece, main_face, x, y, 'flap_central', hole.get('connectionId'), HOLE_DEPTH_MAIN)
-                        else:
-                            new_holes.append(hole)
-                    face['holes'] = new_holes
-
-def process_illustrator_data(data: dict) -> dict:
-    """Processa dados de entrada conforme o guia (páginas 1-6)."""
+        is_thicker = piece.thickness > template_value + 0.05
+        for face in piece.faces:
+            if is_thicker and face['faceSide'] in EDGE_FACES:
+                new_holes = []
+                for hole in face['holes']:
+                    if hole['type'] in TOP_HOLE_TYPES:
+                        x, y = hole['x'], piece.height / 2
+                        for main_face in ['main', 'other_main']:
+                            add_hole(piece, main_face, x, y, 'flap_central', hole.get('connectionId'), piece.rules.hole_depth_main, template_thickness)
+                    else:
+                        hole['targetType'] = template_thickness
+                        new_holes.append(hole)
+                counters.count('hole_cleaned', face['faceSide'], len(face['holes']) - len(new_holes))
+                piece.top_hole_votes -= len(face['holes']) - len(new_holes)
+                face['holes'] = new_holes
+            else:
+                for hole in face['holes']:
+                    hole['targetType'] = template_thickness
+
+def round_to_whole_number(value: float) -> float:
+    """Arredonda para 1 casa decimal, ajustando para inteiro até 0.15 de distância (regra do app.py)."""
+    rounded = round(value, 1)
+    if abs(rounded - round(rounded)) <= 0.15:
+        rounded = float(round(rounded))
+    return rounded
+
+def normalize_view_rows(view_rows: List[Tuple[float, ...]], snap=round_to_one_decimal) -> Tuple[List[Tuple[float, float, float]], List[Tuple[float, ...]], Optional[int]]:
+    """Converte cm para mm, arredonda e desloca todas as peças para a origem da peça principal em lote (página 1).
+
+    Cada linha traz os valores brutos das vistas em cm:
+    (top_x, top_y, top_width, top_height, front_y, front_width, front_height, side_width, side_height).
+    Retorna as dimensões (length, height, thickness), os limites (x_min, x_max, y_min, y_max, z_min, z_max)
+    já deslocados e o índice da peça principal (maior área = tampo), ou None se não houver peças.
+    """
+    dimensions = []
+    raw_bounds = []
+    main_index = None
+    main_area = None
+    for index, row in enumerate(view_rows):
+        top_x, top_y, top_width, top_height, front_y, front_width, front_height, side_width, side_height = [snap(value * 10) for value in row]
+        
+        dim_x = max(top_width, front_width)
+        dim_y = max(front_height, side_height)
+        dim_z = max(top_height, side_width)
+        height, length, thickness = sorted((dim_x, dim_y, dim_z), reverse=True)
+        length, height, thickness = snap(length), snap(height), snap(thickness)
+        dimensions.append((length, height, thickness))
+        
+        raw_bounds.append((top_x, snap(top_x + dim_x), snap(front_y - dim_y), front_y, snap(top_y - dim_z), top_y))
+        
+        if main_area is None or length * height > main_area:
+            main_index, main_area = index, length * height
+    
+    if main_index is None:
+        return dimensions, [], None
+    
+    # Ajustar coordenadas para peça principal na origem
+    shift_x, _, shift_y, _, shift_z, _ = raw_bounds[main_index]
+    bounds = [
+        (snap(x_min - shift_x), snap(x_max - shift_x),
+         snap(y_min - shift_y), snap(y_max - shift_y),
+         snap(z_min - shift_z), snap(z_max - shift_z))
+        for x_min, x_max, y_min, y_max, z_min, z_max in raw_bounds
+    ]
+    return dimensions, bounds, main_index
+
+def parse_input_data(raw, source: str = '<bytes>', compact: bool = False) -> dict:
+    """Interpreta o JSON de entrada a partir de bytes (ou qualquer buffer), tentando as codificações comuns dos exportadores.
+
+    Com `compact`, o buffer é decodificado em blocos e os itens são extraídos um a um só com os campos
+    usados (input_stream.parse_layers), sem decodificar o texto inteiro.
+    """
+    def parse(encoding):
+        return parse_layers(raw, encoding) if compact else json.loads(str(raw, encoding))
+    try:
+        return parse('utf-8')
+    except UnicodeDecodeError:
+        # Try different encodings
+        for encoding in ['latin-1', 'cp1252', 'utf-8-sig']:
+            try:
+                input_data = parse(encoding)
+                print(f"File loaded with {encoding} encoding")
+                return input_data
+            except (UnicodeDecodeError, UnicodeError):
+                continue
+        raise Exception(f"Could not decode {source} with any common encoding")
+
+def load_input_data(path: str, mapped: bool = False) -> dict:
+    """Carrega o arquivo JSON de entrada.
+
+    Com `mapped`, o arquivo é mapeado em memória, decodificado em blocos e lido com extração de itens
+    em fluxo, sem manter os bytes, o texto nem a árvore JSON completa (exportações grandes de projetos inteiros).
+    """
+    if mapped:
+        with map_file(path) as buffer:
+            return parse_input_data(buffer, path, compact=True)
+    with open(path, 'rb') as f:
+        return parse_input_data(f.read(), path)
+
+def clean_pieces(pieces: List[Piece]) -> List[Piece]:
+    """Limpa os furos de um lote de peças e devolve o lote (etapa por peça, paralelizável)."""
+    for piece in pieces:
+        clean_holes_outside_connection_areas(piece)
+    return pieces
+
+def finish_pieces(pieces: List[Piece], template_thickness: str) -> List[dict]:
+    """Ajusta um lote de peças ao template e devolve sua forma serializável (etapa por peça, paralelizável)."""
+    adjust_holes_for_template(pieces, template_thickness)
+    serializable_pieces = []
+    for piece in pieces:
+        piece_dict = {key: value for key, value in vars(piece).items() if key not in RUNTIME_FIELDS}
+        piece_dict['bounds'] = vars(piece.bounds)  # Convert Bounds3D to dict
+        serializable_pieces.append(piece_dict)
+    return serializable_pieces
+
+def process_illustrator_data(data: dict, snap=round_to_one_decimal, profile_dir: Optional[str] = None,
+                             workers: Optional[int] = None, parallel_mode: str = 'thread', rules=None) -> dict:
+    """Processa dados de entrada conforme o guia (páginas 1-6).
+
+    `snap` define o arredondamento das coordenadas de entrada: round_to_one_decimal (padrão)
+    ou round_to_whole_number para a regra de 0.15 do app.py.
+    Com `profile_dir`, a execução é perfilada e salva nesse diretório com o hash do design.
+    Com `workers` > 1, a detecção de conexões e as etapas por peça seguintes rodam em lotes num pool de threads ou
+    processos (`parallel_mode`) e são reunidas na ordem das peças (mesma saída da execução serial).
+    `rules` é o perfil de regras (RuleProfile ou caminho do arquivo; padrão: valores do guia).
+    """
+    rules = resolve_rules(rules)
+    if profile_dir:
+        with profiled(f"legs-{design_hash(data)}", profile_dir):
+            return process_illustrator_data(data, snap, workers=workers, parallel_mode=parallel_mode, rules=rules)
+    
+    counters.reset()
+    memory_profile.reset()
+    memory_profile.mark('read_views')
     pieces_dict = {}
     for layer in data['layers']:
         layer_name = layer['name'].lower()
         for item in layer['items']:
             piece_name = item['nome']
             if piece_name not in pieces_dict:
-                pieces_dict[piece_name] = {'vista de cima': {}, 'frontal': {}, 'vista lateral': {}}
-            pieces_dict[piece_name][layer_name] = {
-                'x': round_to_one_decimal(item['posicao']['x'] * 10),
-                'y': round_to_one_decimal(item['posicao']['y'] * 10),
-                'width': round_to_one_decimal(item['dimensoes']['largura'] * 10),
-                'height': round_to_one_decimal(item['dimensoes']['altura'] * 10)
-            }
+                pieces_dict[piece_name] = {'vista de cima': None, 'frontal': None, 'vista lateral': None}
+            pieces_dict[piece_name][layer_name] = item
     
-    pieces = []
+    # Valores brutos (cm) das vistas de cada peça completa
+    piece_names = []
+    view_rows = []
     for piece_name, views in pieces_dict.items():
-        top = views.get('vista de cima', {})
-        front = views.get('frontal', {})
-        side = views.get('vista lateral', {})
+        top = views.get('vista de cima')
+        front = views.get('frontal')
+        side = views.get('vista lateral')
         
         if not (top and front and side):
             continue
         
-        dim_x = max(top.get('width', 0), front.get('width', 0))
-        dim_y = max(front.get('height', 0), side.get('height', 0))
-        dim_z = max(top.get('height', 0), side.get('width', 0))
-        
-        dimensions = sorted([dim_x, dim_y, dim_z], reverse=True)
-        height, length, thickness = dimensions
-        
-        x_min = top.get('x', 0)
-        y_max = front.get('y', 0)
-        z_max = top.get('y', 0)
-        
-        bounds = Bounds3D(
-            x_min=round_to_one_decimal(x_min),
-            x_max=round_to_one_decimal(x_min + dim_x),
-            y_min=round_to_one_decimal(y_max - dim_y),
-            y_max=round_to_one_decimal(y_max),
-            z_min=round_to_one_decimal(z_max - dim_z),
-            z_max=round_to_one_decimal(z_max)
-        )
-        
+        piece_names.append(piece_name)
+        view_rows.append((
+            top['posicao']['x'], top['posicao']['y'],
+            top['dimensoes']['largura'], top['dimensoes']['altura'],
+            front['posicao']['y'], front['dimensoes']['largura'], front['dimensoes']['altura'],
+            side['dimensoes']['largura'], side['dimensoes']['altura']
+        ))
+    
+    dimensions, bounds, main_index = normalize_view_rows(view_rows, snap)
+    if main_index is None:
+        return {'pieces': []}
+    
+    counters.set_step('initial_holes')
+    memory_profile.mark('initial_holes')
+    pieces = []
+    for piece_name, (length, height, thickness), piece_bounds in zip(piece_names, dimensions, bounds):
         piece = Piece(
             name=piece_name,
-            bounds=bounds,
-            length=round_to_one_decimal(length),
-            height=round_to_one_decimal(height),
-            thickness=round_to_one_decimal(thickness),
+            bounds=Bounds3D(*piece_bounds),
+            length=length,
+            height=height,
+            thickness=thickness,
             quantity=1,
-            faces=[]
+            faces=[],
+            rules=rules
         )
         
         # Adicionar furos objetivos - skip main faces for fundo piece (only connects via edges)
-        if piece_name.lower() == 'fundo':
+        if piece.name_key == 'fundo':
             # Fundo only gets holes on edge faces, not main faces
             for face_side in ['top', 'bottom', 'left', 'right']:
                 add_initial_holes(piece, face_side)
@@ -1099,61 +1456,38 @@ def process_illustrator_data(data: dict) -> dict:
         
         pieces.append(piece)
     
-    # Identificar peça principal (maior área = tampo)
-    main_piece = max(pieces, key=lambda p: p.length * p.height) if pieces else None
-    if not main_piece:
-        return {'pieces': []}
-    
-
-    
-    # Ajustar coordenadas para peça principal na origem
-    shift_x = main_piece.bounds.x_min
-    shift_y = main_piece.bounds.y_min
-    shift_z = main_piece.bounds.z_min
-    for piece in pieces:
-        piece.bounds.x_min -= shift_x
-        piece.bounds.x_max -= shift_x
-        piece.bounds.y_min -= shift_y
-        piece.bounds.y_max -= shift_y
-        piece.bounds.z_min -= shift_z
-        piece.bounds.z_max -= shift_z
-        piece.bounds = Bounds3D(
-            x_min=round_to_one_decimal(piece.bounds.x_min),
-            x_max=round_to_one_decimal(piece.bounds.x_max),
-            y_min=round_to_one_decimal(piece.bounds.y_min),
-            y_max=round_to_one_decimal(piece.bounds.y_max),
-            z_min=round_to_one_decimal(piece.bounds.z_min),
-            z_max=round_to_one_decimal(piece.bounds.z_max)
-        )
+    main_piece = pieces[main_index]
     
     # Single-axis connection processing: primarily Z-axis with targeted Y-axis for leg-to-fundo
-    connection_id = process_single_axis_connections(pieces, main_piece)
+    counters.set_step('connections')
+    memory_profile.mark('connections', pieces)
+    connection_id = process_single_axis_connections(pieces, main_piece, workers=workers, parallel_mode=parallel_mode)
     
     # Create systematic connection areas based on piece type and position
+    counters.set_step('systematic_areas')
+    memory_profile.mark('systematic_areas', pieces)
     create_systematic_connection_areas(pieces, connection_id)
     
     # Limpar furos fora das áreas de conexão
-    for piece in pieces:
-        clean_holes_outside_connection_areas(piece)
-    
-    # Selecionar e ajustar template
-    template_thickness = select_model_template(pieces)
-    adjust_holes_for_template(pieces, template_thickness)
-    
-    # Atualizar targetType
-    for piece in pieces:
-        for face in piece.faces:
-            for hole in face['holes']:
-                hole['targetType'] = template_thickness
-    
-    # Convert pieces to serializable format
-    serializable_pieces = []
-    for piece in pieces:
-        piece_dict = vars(piece)
-        piece_dict['bounds'] = vars(piece.bounds)  # Convert Bounds3D to dict
-        serializable_pieces.append(piece_dict)
-    
-    return {'pieces': serializable_pieces}
+    counters.set_step('clean_holes')
+    memory_profile.mark('clean_holes', pieces)
+    pieces = map_chunks(clean_pieces, pieces, workers=workers, mode=parallel_mode)
+    
+    # Selecionar e ajustar template (a seleção precisa de todas as peças; o ajuste é por peça)
+    counters.set_step('template')
+    memory_profile.mark('template', pieces)
+    template_thickness = select_model_template(pieces, rules)
+    # Ajuste, targetType e serialização na mesma passada
+    serializable_pieces = map_chunks(finish_pieces, pieces, template_thickness, workers=workers, mode=parallel_mode)
+    
+    memory_profile.mark(None, serializable_pieces)
+    
+    result = {'pieces': serializable_pieces}
+    if counters.is_enabled():
+        result['counters'] = counters.report()
+    if memory_profile.is_enabled():
+        result['memory'] = memory_profile.report()
+    return result
 
 if __name__ == "__main__":
     try:
@@ -1163,25 +1497,14 @@ if __name__ == "__main__":
         
         # Load input data
         print("Loading input file: illustrator_positions.json")
-        try:
-            with open('illustrator_positions.json', 'r', encoding='utf-8') as f:
-                input_data = json.load(f)
-        except UnicodeDecodeError:
-            # Try different encodings
-            for encoding in ['latin-1', 'cp1252', 'utf-8-sig']:
-                try:
-                    with open('illustrator_positions.json', 'r', encoding=encoding) as f:
-                        input_data = json.load(f)
-                    print(f"File loaded with {encoding} encoding")
-                    break
-                except (UnicodeDecodeError, UnicodeError):
-                    continue
-            else:
-                raise Exception("Could not decode file with any common encoding")
+        input_data = load_input_data('illustrator_positions.json', mapped=True)
         
         # Process the data
         print("Processing furniture data...")
-        result = process_illustrator_data(input_data)
+        # Set FURNITURE_PROFILE_DIR to capture a cProfile/flamegraph profile of the run
+        # and FURNITURE_RULES to a rule profile file to override the guide's values
+        result = process_illustrator_data(input_data, profile_dir=os.environ.get('FURNITURE_PROFILE_DIR'),
+                                          rules=os.environ.get('FURNITURE_RULES'))
         
         # Save output
         print("Saving output to: output_illustrator.json")
@@ -0,0 +1,136 @@
+import os
+import tracemalloc
+
+try:
+    import resource
+except ImportError:  # Not available on Windows
+    resource = None
+
+# ============================================================================
+# MEMORY PROFILING MODE - PER-STEP PEAKS, ALLOCATION SITES AND OBJECT COUNTS
+# ============================================================================
+#
+# Engines call memory_profile.mark("connections", pieces) at each pipeline step boundary.
+# By default `mark` is a no-op; enable() swaps in the real implementation, which traces
+# allocations with tracemalloc and, at every boundary, closes the running step with:
+#   peak_kb       highest traced memory while the step ran
+#   current_kb    traced memory when it ended, allocated_kb the change over the step
+#   rss_max_kb    process peak RSS so far (high-water mark, never goes down)
+#   top_sites     source lines that allocated the most memory kept at the end of the step
+#   objects       pieces / faces / holes / connection areas at the end of the step
+# mark(None, pieces) closes the last step. Steps run on other processes (process pools) are
+# not traced. Set FURNITURE_MEMORY=1 to enable it for a whole process.
+
+# Allocation sites reported per step
+TOP_SITES = 10
+
+# Stack frames kept per traced allocation (1 = the allocating line)
+TRACE_FRAMES = 1
+
+# Allocations made by tracemalloc itself (snapshots) are left out of the sites
+SNAPSHOT_FILTERS = (tracemalloc.Filter(False, tracemalloc.__file__), tracemalloc.Filter(False, __file__))
+
+_steps = []
+_started_tracing = False  # enable() started tracemalloc (so disable() stops it)
+_running = None  # (step name, snapshot, traced bytes at its start, snapshot size) of the step being measured
+
+def count_objects(pieces):
+    """Pieces, faces, holes and connection areas of engine pieces (dicts or legs Piece objects)"""
+    counts = {"pieces": 0, "faces": 0, "holes": 0, "areas": 0}
+    for piece in pieces:
+        faces = piece["faces"] if isinstance(piece, dict) else piece.faces
+        if isinstance(faces, dict):
+            faces = faces.values()
+        counts["pieces"] += 1
+        for face in faces:
+            counts["faces"] += 1
+            counts["holes"] += len(face["holes"])
+            counts["areas"] += len(face["connectionAreas"])
+    return counts
+
+def rss_max_kb():
+    """Peak resident set size of this process in KB (None where unavailable)"""
+    if resource is None:
+        return None
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+def top_sites(snapshot, previous):
+    """Lines that allocated the most memory still held at snapshot since previous"""
+    sites = []
+    for stat in snapshot.compare_to(previous, "lineno")[:TOP_SITES]:
+        if stat.size_diff <= 0:
+            break
+        frame = stat.traceback[0]
+        sites.append({
+            "site": f"{os.path.basename(frame.filename)}:{frame.lineno}",
+            "size_kb": round(stat.size_diff / 1024, 1),
+            "count": stat.count_diff,
+        })
+    return sites
+
+def _noop(step, pieces=()):
+    pass
+
+def _mark(step, pieces=()):
+    global _running
+    # The snapshot held for the running step is traced memory too; sizes leave it out
+    held = _running[3] if _running else 0
+    current, peak = tracemalloc.get_traced_memory()
+    current, peak = current - held, peak - held
+    snapshot = tracemalloc.take_snapshot().filter_traces(SNAPSHOT_FILTERS)
+    snapshot_size = tracemalloc.get_traced_memory()[0] - held - current
+    if _running is not None:
+        name, previous, started, _ = _running
+        _steps.append({
+            "step": name,
+            "peak_kb": round(peak / 1024, 1),
+            "current_kb": round(current / 1024, 1),
+            "allocated_kb": round((current - started) / 1024, 1),
+            "rss_max_kb": rss_max_kb(),
+            "top_sites": top_sites(snapshot, previous),
+            "objects": count_objects(pieces),
+        })
+        del previous
+    _running = (step, snapshot, current, snapshot_size) if step else None
+    tracemalloc.reset_peak()
+
+mark = _noop
+
+def enable():
+    """Start tracing allocations (also clears previous steps); tracing already started by the caller is reused"""
+    global mark, _started_tracing
+    reset()
+    if not tracemalloc.is_tracing():
+        tracemalloc.start(TRACE_FRAMES)
+        _started_tracing = True
+    mark = _mark
+
+def disable():
+    """mark() becomes a no-op again; tracing stops only if enable() started it"""
+    global mark, _started_tracing
+    mark = _noop
+    reset()
+    if _started_tracing:
+        tracemalloc.stop()
+        _started_tracing = False
+
+def is_enabled():
+    return mark is _mark
+
+def reset():
+    """Clear recorded steps and the running step"""
+    global _running
+    _steps.clear()
+    _running = None
+
+def report():
+    """Recorded steps in order, with the overall peak and the step it happened in"""
+    peak = max(_steps, key=lambda step: step["peak_kb"], default=None)
+    return {
+        "peak_kb": peak["peak_kb"] if peak else 0.0,
+        "peak_step": peak["step"] if peak else None,
+        "steps": list(_steps),
+    }
+
+if os.environ.get("FURNITURE_MEMORY"):
+    enable()
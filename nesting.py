@@ -0,0 +1,181 @@
+import argparse
+import json
+import time
+from collections import defaultdict
+
+from app import get_template_thickness
+from rules import load_rule_profile, resolve_rules
+
+# ============================================================================
+# PANEL NESTING - PACK PIECES ONTO STOCK SHEETS
+# ============================================================================
+#
+# Pieces from processed outputs are grouped by template thickness (the rule profile's
+# template_thicknesses) and packed onto stock sheets with a shelf (guillotine) heuristic:
+# parts are sorted, laid on horizontal strips, each strip cut across the sheet, so every
+# plan can be cut on a panel saw. The first ordering always runs; other orderings are tried
+# while the job's time limit lasts and the plan with the fewest sheets (then most compact
+# last sheet) is kept.
+
+# Stock sheet (length x width, mm) and saw kerf (mm)
+DEFAULT_SHEET = (2750.0, 1830.0)
+DEFAULT_KERF = 4.0
+DEFAULT_TIME_LIMIT = 2.0
+
+# Part orderings tried in turn (first one always runs)
+ORDERINGS = {
+    "height": lambda part: (-part[1], -part[0]),
+    "area": lambda part: (-part[0] * part[1], -part[1]),
+    "length": lambda part: (-part[0], -part[1]),
+}
+
+def collect_parts(outputs, rules):
+    """Parts per thickness bucket: {thickness: [(length, height, name), ...]} (quantity expanded)"""
+    buckets = defaultdict(list)
+    for output in outputs:
+        for piece in output["pieces"]:
+            part = (float(piece["length"]), float(piece["height"]), piece["name"])
+            buckets[get_template_thickness(float(piece["thickness"]), rules)].extend([part] * int(piece.get("quantity", 1)))
+    return buckets
+
+def orient(part, sheet, allow_rotation):
+    """Part as (length, height, name, rotated) with its longer side along the sheet length when allowed, or None if it never fits"""
+    length, height, name = part
+    fits = length <= sheet[0] and height <= sheet[1]
+    fits_rotated = allow_rotation and height <= sheet[0] and length <= sheet[1]
+    if fits_rotated and (not fits or height > length):
+        return (height, length, name, True)
+    return (length, height, name, False) if fits else None
+
+def pack_shelves(parts, sheet, kerf):
+    """First-fit decreasing shelf packing of oriented parts; returns placements [(sheet, x, y, part)]"""
+    sheets = []  # per sheet: {"used": height used by shelves, "shelves": [[y, height, x_used]]}
+    placements = []
+    for part in parts:
+        length, height = part[0], part[1]
+        placed = False
+        for index, current in enumerate(sheets):
+            for shelf in current["shelves"]:
+                if height <= shelf[1] and shelf[2] + length <= sheet[0]:
+                    placements.append((index, shelf[2], shelf[0], part))
+                    shelf[2] += length + kerf
+                    placed = True
+                    break
+            if placed:
+                break
+            if current["used"] + height <= sheet[1]:
+                current["shelves"].append([current["used"], height, length + kerf])
+                placements.append((index, 0.0, current["used"], part))
+                current["used"] += height + kerf
+                placed = True
+                break
+        if not placed:
+            sheets.append({"used": height + kerf, "shelves": [[0.0, height, length + kerf]]})
+            placements.append((len(sheets) - 1, 0.0, 0.0, part))
+    return placements
+
+def plan_score(placements):
+    """Fewer sheets first, then the least height used on the last sheet"""
+    last_sheet = max(index for index, _, _, _ in placements)
+    last_height = max(y + part[1] for index, _, y, part in placements if index == last_sheet)
+    return (last_sheet, last_height)
+
+def nest_bucket(parts, sheet, kerf, allow_rotation, deadline):
+    """Best shelf plan for one thickness bucket within the deadline; returns (placements, unplaced, orderings tried)"""
+    oriented = []
+    unplaced = []
+    for part in parts:
+        fitted = orient(part, sheet, allow_rotation)
+        if fitted:
+            oriented.append(fitted)
+        else:
+            unplaced.append(part[2])
+    if not oriented:
+        return [], unplaced, 0
+
+    best = None
+    tried = 0
+    for key in ORDERINGS.values():
+        if tried and time.perf_counter() > deadline:
+            break
+        placements = pack_shelves(sorted(oriented, key=key), sheet, kerf)
+        tried += 1
+        if best is None or plan_score(placements) < plan_score(best):
+            best = placements
+    return best, unplaced, tried
+
+def nest_outputs(outputs, sheet=DEFAULT_SHEET, sheets=None, kerf=DEFAULT_KERF, allow_rotation=True, time_limit=DEFAULT_TIME_LIMIT,
+                 rules=None):
+    """Nest all pieces of the outputs; sheets maps thickness -> (length, width) overriding sheet
+
+    rules is the rule profile whose template thicknesses define the buckets (default: the guide's).
+
+    Returns {"buckets": [...], "yield": overall %, "sheets": total, "elapsed_ms": ...}.
+    """
+    start = time.perf_counter()
+    deadline = start + time_limit
+    sheets = sheets or {}
+    buckets = []
+    total_sheets = 0
+    part_area = sheet_area = 0.0
+    for thickness, parts in sorted(collect_parts(outputs, resolve_rules(rules)).items()):
+        bucket_sheet = tuple(sheets.get(thickness, sheet))
+        placements, unplaced, tried = nest_bucket(parts, bucket_sheet, kerf, allow_rotation, deadline)
+        used_sheets = max((index for index, _, _, _ in placements), default=-1) + 1
+        area = sum(part[0] * part[1] for _, _, _, part in placements)
+        total_sheets += used_sheets
+        part_area += area
+        sheet_area += used_sheets * bucket_sheet[0] * bucket_sheet[1]
+        buckets.append({
+            "thickness": thickness,
+            "sheet": list(bucket_sheet),
+            "parts": len(placements),
+            "sheets": used_sheets,
+            "yield": round(100.0 * area / (used_sheets * bucket_sheet[0] * bucket_sheet[1]), 1) if used_sheets else 0.0,
+            "orderings_tried": tried,
+            "unplaced": unplaced,
+            "placements": [
+                {"sheet": index, "piece": part[2], "x": x, "y": y, "length": part[0], "height": part[1], "rotated": part[3]}
+                for index, x, y, part in placements
+            ],
+        })
+    return {
+        "buckets": buckets,
+        "sheets": total_sheets,
+        "yield": round(100.0 * part_area / sheet_area, 1) if sheet_area else 0.0,
+        "elapsed_ms": round((time.perf_counter() - start) * 1000, 1),
+    }
+
+def parse_sheet(text):
+    """'2750x1830' -> (2750.0, 1830.0)"""
+    length, width = text.lower().split("x")
+    return (float(length), float(width))
+
+def main():
+    parser = argparse.ArgumentParser(description="Nest the pieces of processed outputs onto stock sheets")
+    parser.add_argument("outputs", nargs="+", help="processed output JSON files")
+    parser.add_argument("--sheet", type=parse_sheet, default=DEFAULT_SHEET, help="sheet size as LENGTHxWIDTH in mm")
+    parser.add_argument("--kerf", type=float, default=DEFAULT_KERF)
+    parser.add_argument("--no-rotation", action="store_true", help="keep every part in its original orientation (grain)")
+    parser.add_argument("--time-limit", type=float, default=DEFAULT_TIME_LIMIT, help="seconds for the whole nesting job")
+    parser.add_argument("--plan-out", help="write the full nesting plan here")
+    parser.add_argument("--rules", type=load_rule_profile, help="rule profile file (template thickness buckets)")
+    args = parser.parse_args()
+
+    outputs = []
+    for path in args.outputs:
+        with open(path, "r", encoding="utf-8") as f:
+            outputs.append(json.load(f))
+    plan = nest_outputs(outputs, args.sheet, kerf=args.kerf, allow_rotation=not args.no_rotation, time_limit=args.time_limit,
+                       rules=args.rules)
+
+    if args.plan_out:
+        with open(args.plan_out, "w", encoding="utf-8") as f:
+            json.dump(plan, f, indent=2, ensure_ascii=False)
+    for bucket in plan["buckets"]:
+        print(f"{bucket['thickness']}mm: {bucket['parts']} parts on {bucket['sheets']} sheets, yield {bucket['yield']}%"
+              + (f", {len(bucket['unplaced'])} unplaced" if bucket["unplaced"] else ""))
+    print(f"Total: {plan['sheets']} sheets, yield {plan['yield']}%, {plan['elapsed_ms']}ms")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,49 @@
+import math
+from itertools import accumulate
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+# ============================================================================
+# CHUNKED PER-PIECE STAGES ACROSS A THREAD OR PROCESS POOL
+# ============================================================================
+
+PARALLEL_MODES = ("thread", "process")
+
+# Chunks per worker when no chunk size is given (smooths out uneven pieces)
+CHUNKS_PER_WORKER = 4
+
+def split_chunks(items, chunk_size):
+    """Split a list into contiguous chunks of at most chunk_size items"""
+    return [items[i:i + chunk_size] for i in range(0, len(items), chunk_size)]
+
+def map_chunks(func, items, *args, workers=None, mode="thread", chunk_size=None):
+    """Run func(chunk, *args) over contiguous chunks and concatenate the returned lists in input order
+
+    func must return a list for its chunk. With workers unset (or 1) it runs once over all items in
+    the calling thread, so serial and pooled runs produce the same merged result. In "process" mode
+    chunks are pickled to the workers and their results pickled back, so func must return everything
+    the caller needs (in-place changes to the caller's objects are not visible).
+    """
+    if mode not in PARALLEL_MODES:
+        raise ValueError(f"Unknown parallel mode {mode!r}, expected one of {PARALLEL_MODES}")
+    if not workers or workers <= 1 or len(items) <= 1:
+        return func(items, *args)
+
+    if not chunk_size:
+        chunk_size = max(1, math.ceil(len(items) / (workers * CHUNKS_PER_WORKER)))
+    chunks = split_chunks(items, chunk_size)
+    executor_class = ProcessPoolExecutor if mode == "process" else ThreadPoolExecutor
+    with executor_class(max_workers=workers) as executor:
+        futures = [executor.submit(func, chunk, *args) for chunk in chunks]
+        merged = []
+        for future in futures:
+            merged.extend(future.result())
+    return merged
+
+def allocate_ids(counts, start=1):
+    """First id of each item from how many ids each one takes (exclusive prefix sum), and the next free id
+
+    Items are allocated in list order, so ids only depend on that order and the counts, not on which
+    chunk or worker produced them.
+    """
+    bounds = list(accumulate(counts, initial=start))
+    return bounds[:-1], bounds[-1]
@@ -0,0 +1,81 @@
+import cProfile
+import hashlib
+import json
+import os
+import sys
+import threading
+from collections import Counter
+from contextlib import contextmanager
+
+# ============================================================================
+# OPT-IN PROFILING FOR PIPELINE RUNS
+# ============================================================================
+
+# Interval between stack samples for the collapsed (flamegraph) output, in seconds
+SAMPLE_INTERVAL = 0.001
+
+def design_hash(design):
+    """Stable short hash identifying a design (raw input bytes or parsed JSON data)"""
+    if isinstance(design, (bytes, bytearray, memoryview)):
+        payload = bytes(design)
+    else:
+        payload = json.dumps(design, sort_keys=True, ensure_ascii=False).encode("utf-8")
+    return hashlib.sha256(payload).hexdigest()[:16]
+
+def frame_label(frame):
+    """Flamegraph frame name: function (file:line)"""
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+class StackSampler:
+    """Samples the call stack of one thread from a background thread and counts collapsed stacks"""
+
+    def __init__(self, thread_id, interval=SAMPLE_INTERVAL):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                stack.append(frame_label(frame))
+                frame = frame.f_back
+            if stack:
+                self.stacks[";".join(reversed(stack))] += 1
+
+    def write_collapsed(self, path):
+        """Write stacks in collapsed format (one 'frame;frame;frame count' line per stack)"""
+        with open(path, "w", encoding="utf-8") as f:
+            for stack, count in sorted(self.stacks.items()):
+                f.write(f"{stack} {count}\n")
+
+@contextmanager
+def profiled(tag, output_dir):
+    """Profile the enclosed block and write <tag>.prof (cProfile) and <tag>.collapsed (sampled stacks)"""
+    os.makedirs(output_dir, exist_ok=True)
+    prof_path = os.path.join(output_dir, f"{tag}.prof")
+    collapsed_path = os.path.join(output_dir, f"{tag}.collapsed")
+
+    sampler = StackSampler(threading.get_ident())
+    profiler = cProfile.Profile()
+    sampler.start()
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        sampler.stop()
+        profiler.dump_stats(prof_path)
+        sampler.write_collapsed(collapsed_path)
+        print(f"Profile written to {prof_path} and {collapsed_path}")
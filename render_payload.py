@@ -0,0 +1,121 @@
+import json
+import math
+
+# ============================================================================
+# COMPACT RENDER PAYLOAD FOR assembled_view.html
+# ============================================================================
+#
+# Converts an engine output ({"pieces": [...]}, app.py or legs.py) into pre-projected 2D
+# geometry: every face with content becomes a "view" placed on one layout plane (faces of a
+# piece side by side, pieces shelf-packed into a roughly square layout), and all rectangles
+# and hole points are stored in absolute layout coordinates (mm, y down) in flat parallel
+# arrays, ready for typed arrays:
+#
+#   views.rect   [x, y, w, h, ...]    face outline      views.piece / views.face  labels
+#   areas.rect   [x, y, w, h, ...]    connection areas  areas.view / areas.connectionId (0 = none)
+#   holes.xy     [x, y, ...]          hole centers      holes.view / holes.connected (0/1) / holes.type
+#
+# holes.type indexes into holeTypes. The viewer draws these directly with one transform.
+
+RENDER_FORMAT = "furniture-render-1"
+
+# Gap between views in the layout (mm)
+VIEW_GAP = 40.0
+
+# Piece dimensions spanning each face's local x and y axes
+FACE_EXTENTS = {
+    "main": ("length", "height"),
+    "other_main": ("length", "height"),
+    "top": ("length", "thickness"),
+    "bottom": ("length", "thickness"),
+    "left": ("height", "thickness"),
+    "right": ("height", "thickness"),
+}
+
+def face_extent(piece, face):
+    """Width and height of a face's view: its nominal size, grown to contain all its holes and areas"""
+    width_key, height_key = FACE_EXTENTS.get(face["faceSide"], ("length", "height"))
+    width, height = float(piece[width_key]), float(piece[height_key])
+    for area in face["connectionAreas"]:
+        width = max(width, area["x_max"])
+        height = max(height, area["y_max"])
+    for hole in face["holes"]:
+        width = max(width, hole["x"])
+        height = max(height, hole["y"])
+    return width, height
+
+def piece_views(piece):
+    """(face, width, height) for each face of a piece with holes or connection areas"""
+    return [(face, *face_extent(piece, face)) for face in piece["faces"] if face["holes"] or face["connectionAreas"]]
+
+def layout_pieces(blocks):
+    """Shelf-pack piece blocks (width, height) into rows about as wide as the layout is tall
+
+    Returns the (x, y) origin of each block and the layout width and height.
+    """
+    total_area = sum((w + VIEW_GAP) * (h + VIEW_GAP) for w, h in blocks)
+    row_limit = max([math.sqrt(total_area)] + [w for w, h in blocks])
+    origins = []
+    x = y = row_height = width = 0.0
+    for w, h in blocks:
+        if x and x + w > row_limit:
+            y += row_height + VIEW_GAP
+            x = row_height = 0.0
+        origins.append((x, y))
+        width = max(width, x + w)
+        row_height = max(row_height, h)
+        x += w + VIEW_GAP
+    return origins, width, y + row_height
+
+def build_render_payload(output):
+    """Build the compact render payload for an engine output"""
+    views = {"piece": [], "face": [], "rect": []}
+    areas = {"rect": [], "view": [], "connectionId": []}
+    holes = {"xy": [], "view": [], "connected": [], "type": []}
+    hole_types = {}
+
+    pieces = [(piece, piece_views(piece)) for piece in output["pieces"]]
+    pieces = [(piece, faces) for piece, faces in pieces if faces]
+    blocks = [(sum(w for _, w, _ in faces) + VIEW_GAP * (len(faces) - 1), max(h for _, _, h in faces))
+              for _, faces in pieces]
+    origins, layout_width, layout_height = layout_pieces(blocks)
+
+    for (piece, faces), (x, y) in zip(pieces, origins):
+        for face, width, height in faces:
+            view_index = len(views["piece"])
+            views["piece"].append(piece["name"])
+            views["face"].append(face["faceSide"])
+            views["rect"].extend((x, y, width, height))
+
+            for area in face["connectionAreas"]:
+                areas["rect"].extend((x + area["x_min"], y + area["y_min"],
+                                      area["x_max"] - area["x_min"], area["y_max"] - area["y_min"]))
+                areas["view"].append(view_index)
+                areas["connectionId"].append(area.get("connectionId") or 0)
+
+            for hole in face["holes"]:
+                holes["xy"].extend((x + hole["x"], y + hole["y"]))
+                holes["view"].append(view_index)
+                holes["connected"].append(1 if hole.get("connectionId") else 0)
+                holes["type"].append(hole_types.setdefault(hole["type"], len(hole_types)))
+
+            x += width + VIEW_GAP
+
+    return {
+        "format": RENDER_FORMAT,
+        "units": "mm",
+        "bounds": [0.0, 0.0, layout_width, layout_height],
+        "views": views,
+        "areas": areas,
+        "holes": holes,
+        "holeTypes": list(hole_types),
+    }
+
+def encode_render_payload(payload):
+    """Payload as compact JSON bytes"""
+    return json.dumps(payload, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+
+def write_render_payload(output, path):
+    """Build the render payload for an engine output and write it to path"""
+    with open(path, "wb") as f:
+        f.write(encode_render_payload(build_render_payload(output)))
@@ -0,0 +1,116 @@
+import dataclasses
+import hashlib
+import json
+import os
+from dataclasses import dataclass
+
+# ============================================================================
+# RULE PROFILES - PER CUSTOMER / FACTORY MANUFACTURING RULES
+# ============================================================================
+#
+# The numbers from the process guide (margins, hole depths, spacing, template thicknesses...)
+# live in one frozen RuleProfile instead of module globals in each engine. DEFAULT_RULES holds
+# the guide's values; a customer or factory overrides any of them in a JSON file:
+#   {"name": "factory-b", "max_hole_spacing": 150, "template_thicknesses": [15, 18, 25]}
+# load_rule_profile reads, validates and freezes a file once per path. The engines take the
+# profile as an argument and keep it on each piece, so one process can run designs with
+# different profiles side by side. profile_hash() identifies the rule values (not the name)
+# for keying cached results.
+
+@dataclass(frozen=True)
+class RuleProfile:
+    name: str = "default"
+    # Connection areas and holes (guide pages 2-4)
+    margin: float = 1.0                        # Connection area inset per side (mm)
+    hole_diameter: float = 8.0
+    hole_depth_main: float = 10.0              # Flap holes on main faces
+    hole_depth_other_main: float = 40.0        # Singer holes
+    hole_depth_top: float = 20.0               # Holes on thickness faces
+    max_hole_spacing: float = 200.0            # Maximum distance between holes
+    min_overlap: float = 10.0                  # Minimum overlap for a connection
+    singer_min_distance: float = 50.0          # Minimum edge distance for singer_central
+    # Templates
+    template_thicknesses: tuple = (17, 20, 25, 30)
+    default_template_thickness: float = 20
+    # app.py connection areas and hole spacing
+    default_connection_area_width: float = 20
+    default_connection_area_height: float = 200
+    singer_hole_min_distance: float = 8.0      # Mirrored singer hole vs existing holes
+    hole_dedup_distance: float = 8.0           # Systematic hole vs holes already placed (per axis)
+    hole_depth_singer_dowel: float = 30.0      # Singer dowel holes mirrored across a panel
+    mapped_hole_dedup_distance: float = 5.0    # Mapped leg hole vs existing holes (per axis)
+
+    def values(self):
+        """Rule values without the name, in field order"""
+        return {f.name: getattr(self, f.name) for f in dataclasses.fields(self) if f.name != "name"}
+
+    def profile_hash(self):
+        """Stable short hash of the rule values (two profiles with the same rules share it)"""
+        payload = json.dumps(self.values(), sort_keys=True, separators=(",", ":")).encode("utf-8")
+        return hashlib.sha256(payload).hexdigest()[:16]
+
+DEFAULT_RULES = RuleProfile()
+
+RULE_FIELDS = {f.name: f for f in dataclasses.fields(RuleProfile)}
+
+# Rules used as divisors, grid cell sizes or hole sizes; 0 would divide by zero or drill nothing
+POSITIVE_RULES = {
+    "hole_diameter", "hole_depth_main", "hole_depth_other_main", "hole_depth_top",
+    "hole_depth_singer_dowel", "max_hole_spacing", "min_overlap", "singer_hole_min_distance",
+    "hole_dedup_distance", "mapped_hole_dedup_distance",
+}
+
+def is_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+def validate_rules(values, source="<rules>"):
+    """Check a mapping of rule overrides; raises ValueError naming the source and the bad key"""
+    unknown = sorted(set(values) - set(RULE_FIELDS))
+    if unknown:
+        raise ValueError(f"{source}: unknown rules {unknown}")
+    for key, value in values.items():
+        if key == "name":
+            if not isinstance(value, str) or not value:
+                raise ValueError(f"{source}: 'name' must be a non-empty string")
+        elif key == "template_thicknesses":
+            if not isinstance(value, (list, tuple)) or not value or not all(is_number(v) and v > 0 for v in value):
+                raise ValueError(f"{source}: 'template_thicknesses' must be a non-empty list of positive numbers")
+        elif key in POSITIVE_RULES:
+            if not is_number(value) or value <= 0:
+                raise ValueError(f"{source}: '{key}' must be a positive number, got {value!r}")
+        elif not is_number(value) or value < 0:
+            raise ValueError(f"{source}: '{key}' must be a non-negative number, got {value!r}")
+
+def make_rule_profile(values, source="<rules>"):
+    """Validated RuleProfile from overrides of DEFAULT_RULES"""
+    validate_rules(values, source)
+    values = dict(values)
+    if "template_thicknesses" in values:
+        values["template_thicknesses"] = tuple(values["template_thicknesses"])
+    profile = dataclasses.replace(DEFAULT_RULES, **values)
+    if profile.margin * 2 >= profile.min_overlap:
+        raise ValueError(f"{source}: 'margin' must leave part of a 'min_overlap' connection area (2 * margin < min_overlap)")
+    return profile
+
+_loaded = {}
+
+def load_rule_profile(path):
+    """Rule profile from a JSON file, read and validated once per path (name defaults to the file name)"""
+    key = os.path.abspath(path)
+    profile = _loaded.get(key)
+    if profile is None:
+        with open(path, "r", encoding="utf-8") as f:
+            values = json.load(f)
+        if not isinstance(values, dict):
+            raise ValueError(f"{path}: a rule profile must be a JSON object")
+        values.setdefault("name", os.path.splitext(os.path.basename(path))[0])
+        profile = _loaded[key] = make_rule_profile(values, path)
+    return profile
+
+def resolve_rules(rules):
+    """Engine argument -> RuleProfile: None (defaults), a RuleProfile, or a profile file path"""
+    if rules is None:
+        return DEFAULT_RULES
+    if isinstance(rules, RuleProfile):
+        return rules
+    return load_rule_profile(rules)
@@ -0,0 +1,164 @@
+import argparse
+import json
+import time
+from collections import Counter, defaultdict
+
+# ============================================================================
+# DRILLING OPERATION SCHEDULER ACROSS A PRODUCTION BATCH
+# ============================================================================
+#
+# Takes many processed outputs and builds one machine job list. A "setup" is one face of one
+# piece clamped on the machine; a "tool" is a diameter + hardware pair. Each step of the job
+# list drills all holes of one setup with one tool at one depth. Changing setup is a piece
+# flip, changing tool is a tool change. Two strategies are scheduled and the cheaper one
+# (by the configured change costs) is kept:
+#   face-major: every setup is clamped once; setups are chained so the next one starts with
+#               the tool the previous one ended with
+#   tool-major: every tool is loaded once; setups are revisited per tool
+# The report compares both counts with the naive order (outputs, faces and holes as listed).
+
+# Machine time per change (seconds)
+TOOL_CHANGE_SECONDS = 20.0
+FLIP_SECONDS = 45.0
+
+def hole_tool(hole):
+    """Tool for a hole: (diameter, hardware symbols)"""
+    return (hole.get("diameter"), tuple(hole.get("ferragemSymbols", ())))
+
+def collect_setups(outputs):
+    """Setups in listed order: (job, piece, face) -> {tool: {depth: [(x, y), ...]}} (insertion ordered)"""
+    setups = {}
+    for job, output in enumerate(outputs):
+        for piece in output["pieces"]:
+            for face in piece["faces"]:
+                for hole in face["holes"]:
+                    tools = setups.setdefault((job, piece["name"], face["faceSide"]), {})
+                    tools.setdefault(hole_tool(hole), {}).setdefault(hole.get("depth"), []).append((hole["x"], hole["y"]))
+    return setups
+
+def naive_changes(outputs):
+    """(tool changes, flips) when holes are drilled exactly as listed"""
+    tool_changes = flips = 0
+    last_tool = last_setup = None
+    for job, output in enumerate(outputs):
+        for piece in output["pieces"]:
+            for face in piece["faces"]:
+                for hole in face["holes"]:
+                    setup, tool = (job, piece["name"], face["faceSide"]), hole_tool(hole)
+                    flips += last_setup is not None and setup != last_setup
+                    tool_changes += last_tool is not None and tool != last_tool
+                    last_setup, last_tool = setup, tool
+    return tool_changes, flips
+
+def face_major(setups):
+    """Visit every setup once, chaining setups through a shared tool; returns [(setup, tool)]"""
+    remaining = dict.fromkeys(setups)
+    tool_count = Counter(tool for tools in setups.values() for tool in tools)
+    by_tool = defaultdict(list)
+    for setup, tools in setups.items():
+        for tool in tools:
+            by_tool[tool].append(setup)
+    tool_rank = {tool: rank for rank, tool in enumerate(tool_count)}
+
+    cursors = defaultdict(int)  # Per tool: setups before this index in by_tool[tool] are done
+
+    sequence = []
+    current = None
+    while remaining:
+        # Next setup: the first remaining one that uses the current tool, else the first remaining one
+        candidates = by_tool.get(current, ())
+        position = cursors[current]
+        while position < len(candidates) and candidates[position] not in remaining:
+            position += 1
+        cursors[current] = position
+        if position < len(candidates):
+            setup = candidates[position]
+        else:
+            setup = next(iter(remaining))
+        del remaining[setup]
+        tools = list(setups[setup])
+        for tool in tools:
+            tool_count[tool] -= 1
+
+        # Current tool first, the tool most used by the remaining setups last
+        middle = sorted((tool for tool in tools if tool != current), key=lambda tool: (tool_count[tool], -tool_rank[tool]))
+        ordered = ([current] if current in setups[setup] else []) + middle
+        sequence.extend((setup, tool) for tool in ordered)
+        current = ordered[-1]
+    return sequence
+
+def tool_major(setups):
+    """Load every tool once and visit the setups that use it; returns [(setup, tool)]"""
+    by_tool = defaultdict(list)
+    for setup, tools in setups.items():
+        for tool in tools:
+            by_tool[tool].append(setup)
+    return [(setup, tool) for tool, tool_setups in by_tool.items() for setup in tool_setups]
+
+def count_changes(sequence):
+    """(tool changes, flips) of a [(setup, tool)] sequence"""
+    tool_changes = sum(a[1] != b[1] for a, b in zip(sequence, sequence[1:]))
+    flips = sum(a[0] != b[0] for a, b in zip(sequence, sequence[1:]))
+    return tool_changes, flips
+
+def change_cost(changes, tool_change_seconds, flip_seconds):
+    return changes[0] * tool_change_seconds + changes[1] * flip_seconds
+
+def schedule_batch(outputs, tool_change_seconds=TOOL_CHANGE_SECONDS, flip_seconds=FLIP_SECONDS):
+    """Schedule the drilling of all outputs; returns (job list, report)"""
+    start = time.perf_counter()
+    setups = collect_setups(outputs)
+    candidates = {"face-major": face_major(setups), "tool-major": tool_major(setups)}
+    strategy, sequence = min(candidates.items(),
+                             key=lambda item: change_cost(count_changes(item[1]), tool_change_seconds, flip_seconds))
+
+    job_list = []
+    for (job, piece, face), tool in sequence:
+        for depth, holes in sorted(setups[(job, piece, face)][tool].items(), key=lambda item: (item[0] is None, item[0])):
+            job_list.append({
+                "job": job,
+                "piece": piece,
+                "face": face,
+                "tool": {"diameter": tool[0], "hardware": list(tool[1])},
+                "depth": depth,
+                "holes": [list(point) for point in holes],
+            })
+
+    naive = naive_changes(outputs)
+    scheduled = count_changes(sequence)
+    report = {
+        "strategy": strategy,
+        "setups": len(setups),
+        "steps": len(job_list),
+        "holes": sum(len(step["holes"]) for step in job_list),
+        "tool_changes": {"naive": naive[0], "scheduled": scheduled[0], "avoided": naive[0] - scheduled[0]},
+        "flips": {"naive": naive[1], "scheduled": scheduled[1], "avoided": naive[1] - scheduled[1]},
+        "change_seconds": {
+            "naive": change_cost(naive, tool_change_seconds, flip_seconds),
+            "scheduled": change_cost(scheduled, tool_change_seconds, flip_seconds),
+        },
+        "schedule_ms": round((time.perf_counter() - start) * 1000, 1),
+    }
+    return job_list, report
+
+def main():
+    parser = argparse.ArgumentParser(description="Schedule the drilling of processed outputs as one machine job list")
+    parser.add_argument("outputs", nargs="+", help="processed output JSON files")
+    parser.add_argument("--jobs-out", help="write the machine job list here")
+    parser.add_argument("--tool-change-seconds", type=float, default=TOOL_CHANGE_SECONDS)
+    parser.add_argument("--flip-seconds", type=float, default=FLIP_SECONDS)
+    args = parser.parse_args()
+
+    outputs = []
+    for path in args.outputs:
+        with open(path, "r", encoding="utf-8") as f:
+            outputs.append(json.load(f))
+    job_list, report = schedule_batch(outputs, args.tool_change_seconds, args.flip_seconds)
+
+    if args.jobs_out:
+        with open(args.jobs_out, "w", encoding="utf-8") as f:
+            json.dump({"outputs": args.outputs, "steps": job_list}, f, indent=2, ensure_ascii=False)
+    print(json.dumps(report, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,29 @@
+import json
+import os
+
+import pytest
+
+import batch
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.mark.parametrize("runner", [batch.run_batch, batch.run_batch_shared])
+def test_bad_jobs_fail_alone(runner, tmp_path, capsys):
+    bad_rules = tmp_path / "bad_rules.json"
+    bad_rules.write_text(json.dumps({"max_hole_spacing": 0}), encoding="utf-8")
+    jobs = [
+        {"engine": "app", "input": os.path.join(ROOT, "input1.json"), "output": str(tmp_path / "app1.json")},
+        {"engine": "app", "input": str(tmp_path / "missing.json"), "output": str(tmp_path / "missing_out.json")},
+        {"engine": "legs", "input": os.path.join(ROOT, "input3.json"), "output": str(tmp_path / "legs3_bad.json"),
+         "rules": str(bad_rules)},
+        {"engine": "legs", "input": os.path.join(ROOT, "input3.json"), "output": str(tmp_path / "legs3.json")},
+    ]
+
+    results = runner(jobs, workers=1, profile_dir=str(tmp_path / "profiles"))
+
+    assert [r["ok"] for r in results] == [True, False, False, True]
+    assert "max_hole_spacing" in results[2]["error"]
+    assert "rules" not in results[2]
+    assert os.path.exists(jobs[0]["output"]) and os.path.exists(jobs[3]["output"])
+    assert not os.path.exists(jobs[1]["output"]) and not os.path.exists(jobs[2]["output"])
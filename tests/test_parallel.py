@@ -0,0 +1,21 @@
+import contextlib
+import io
+import json
+import os
+
+import pytest
+
+import app
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def run_app(input_name, **kwargs):
+    with contextlib.redirect_stdout(io.StringIO()):
+        data = app.carregar_json_entrada(os.path.join(ROOT, input_name))
+        return json.dumps(app.processar_dados(data, **kwargs), sort_keys=True)
+
+
+@pytest.mark.parametrize("mode", ["thread", "process"])
+def test_app_pooled_output_matches_serial_on_input2(mode):
+    assert run_app("input2.json", workers=2, parallel_mode=mode) == run_app("input2.json")
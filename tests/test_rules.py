@@ -0,0 +1,13 @@
+import pytest
+
+from rules import POSITIVE_RULES, make_rule_profile
+
+
+@pytest.mark.parametrize("key", sorted(POSITIVE_RULES))
+def test_zero_is_rejected_for_positive_rules(key):
+    with pytest.raises(ValueError, match=key):
+        make_rule_profile({key: 0})
+
+
+def test_zero_margin_is_allowed():
+    assert make_rule_profile({"margin": 0}).margin == 0
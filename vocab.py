@@ -0,0 +1,81 @@
+from enum import IntEnum
+
+# ============================================================================
+# SHARED VOCABULARIES - FACES, HOLE TYPES, HARDWARE
+# ============================================================================
+#
+# Integer codes for the strings both engines use. Groups, dispatch tables and hole specs are
+# defined over the codes; the *_NAMES tables hold the single string object written to the
+# output for each code, so no hole or face string is built at runtime. The name-level
+# frozensets below are derived from the code groups for membership tests on data that is
+# already keyed by name (face dicts, hole["type"]).
+
+class Face(IntEnum):
+    MAIN = 0
+    OTHER_MAIN = 1
+    TOP = 2
+    BOTTOM = 3
+    LEFT = 4
+    RIGHT = 5
+
+class HoleType(IntEnum):
+    FLAP_CORNER = 0
+    FLAP_CENTRAL = 1
+    TOP_CORNER = 2
+    TOP_CENTRAL = 3
+    FACE_CENTRAL = 4
+    SINGER_FLAP = 5
+    SINGER_CENTRAL = 6
+    SINGER_CHANNEL = 7
+    SINGER_DOWEL = 8
+
+class Hardware(IntEnum):
+    GLUE = 0
+    DOWEL_M_WITH_GLUE = 1
+    DOWEL_G_WITH_GLUE = 2
+
+FACE_NAMES = tuple(face.name.lower() for face in Face)
+HOLE_TYPE_NAMES = tuple(hole_type.name.lower() for hole_type in HoleType)
+HOLE_TYPE_SYMBOLS = tuple(hole_type.name for hole_type in HoleType)
+HARDWARE_NAMES = ("glue", "dowel_M_with_glue", "dowel_G_with_glue")
+
+FACE_CODES = {name: Face(code) for code, name in enumerate(FACE_NAMES)}
+HOLE_TYPE_CODES = {name: HoleType(code) for code, name in enumerate(HOLE_TYPE_NAMES)}
+HARDWARE_CODES = {name: Hardware(code) for code, name in enumerate(HARDWARE_NAMES)}
+
+# Face groups
+MAIN_FACE_CODES = frozenset({Face.MAIN, Face.OTHER_MAIN})
+TOP_BOTTOM_FACE_CODES = frozenset({Face.TOP, Face.BOTTOM})
+LEFT_RIGHT_FACE_CODES = frozenset({Face.LEFT, Face.RIGHT})
+EDGE_FACE_CODES = TOP_BOTTOM_FACE_CODES | LEFT_RIGHT_FACE_CODES
+
+# Hole type groups
+SYSTEMATIC_HOLE_TYPE_CODES = frozenset({HoleType.FLAP_CORNER, HoleType.FLAP_CENTRAL, HoleType.TOP_CORNER,
+                                        HoleType.TOP_CENTRAL, HoleType.FACE_CENTRAL})
+TOP_HOLE_TYPE_CODES = frozenset({HoleType.TOP_CORNER, HoleType.TOP_CENTRAL})
+
+def face_names(codes):
+    return frozenset(FACE_NAMES[code] for code in codes)
+
+def hole_type_names(codes):
+    return frozenset(HOLE_TYPE_NAMES[code] for code in codes)
+
+MAIN_FACES = face_names(MAIN_FACE_CODES)
+TOP_BOTTOM_FACES = face_names(TOP_BOTTOM_FACE_CODES)
+LEFT_RIGHT_FACES = face_names(LEFT_RIGHT_FACE_CODES)
+EDGE_FACES = face_names(EDGE_FACE_CODES)
+SYSTEMATIC_HOLE_TYPES = hole_type_names(SYSTEMATIC_HOLE_TYPE_CODES)
+TOP_HOLE_TYPES = hole_type_names(TOP_HOLE_TYPE_CODES)
+
+# Objective hole types per face: main faces get flap holes, edge faces get top holes
+CORNER_HOLE_TYPE = {face: HoleType.FLAP_CORNER if face in MAIN_FACE_CODES else HoleType.TOP_CORNER for face in Face}
+CENTRAL_HOLE_TYPE = {face: HoleType.FLAP_CENTRAL if face in MAIN_FACE_CODES else HoleType.TOP_CENTRAL for face in Face}
+
+# Hole type mapped onto an edge face from a main face (flap holes become top holes)
+EDGE_HOLE_TYPE = {HoleType.FLAP_CORNER: HoleType.TOP_CORNER, HoleType.FLAP_CENTRAL: HoleType.TOP_CENTRAL}
+
+OPPOSITE_FACE = {
+    Face.MAIN: Face.OTHER_MAIN, Face.OTHER_MAIN: Face.MAIN,
+    Face.TOP: Face.BOTTOM, Face.BOTTOM: Face.TOP,
+    Face.LEFT: Face.RIGHT, Face.RIGHT: Face.LEFT,
+}